@@ -5,83 +5,68 @@ import numpy as np
 from typing import Dict, Any, Optional, List, Tuple
 
 from app.infrastructure.storage.file_io import load_trades_from_file
-from app.core.analysis.session import AnalysisSession
+from app.core.analysis.metrics import BenchmarkMetricsCalculator, calculate_batch_metrics
 from app.shared.config import config
 
 PATH_CONFIG = config.PATH_CONFIG
 BACKTEST_CONFIG = config.BACKTEST_CONFIG
+EXCHANGE_SPECIFIC_CONFIG = config.EXCHANGE_SPECIFIC_CONFIG
 
-def _process_single_backtest_file(file_path: str) -> Optional[Dict[str, Any]]:
+def _load_backtest_file(file_path: str) -> Optional[Tuple[Dict[str, Any], pd.DataFrame]]:
     """
-    Обрабатывает один .jsonl файл с результатами бэктеста.
-
-    Эта функция является сердцем загрузчика. Она:
-    1. Загружает сделки.
-    2. Находит и загружает соответствующие исторические данные.
-    3. Запускает новый `AnalysisSession` для выполнения всех расчетов.
-    4. Собирает ключевые метрики в единый словарь (строку для итоговой таблицы).
-    5. Грациозно обрабатывает ошибки (например, отсутствие файла данных).
+    Загружает один .jsonl файл с результатами бэктеста и извлекает его метаданные.
 
     :param file_path: Полный путь к файлу лога сделок (_trades.jsonl).
-    :return: Словарь с ключевыми метриками или словарь с ошибкой.
+    :return: Кортеж (метаданные для итоговой таблицы, сделки) или None, если сделок нет.
+    """
+    trades_df = load_trades_from_file(file_path)
+    if trades_df.empty:
+        return None  # Пропускаем файлы без сделок
+
+    first_trade = trades_df.iloc[0]
+    meta = {
+        "File Path": file_path,
+        "File": os.path.basename(file_path),
+        "Exchange": first_trade['exchange'],
+        "Strategy": first_trade['strategy_name'],
+        "Instrument": first_trade['instrument'],
+        "Interval": first_trade['interval'],
+        "Risk Manager": first_trade['risk_manager'],
+    }
+    return meta, trades_df
+
+
+def _benchmark_pnl_pct(meta: Dict[str, Any]) -> float:
+    """
+    Доходность Buy & Hold по историческим данным инструмента.
+
+    :raises FileNotFoundError: Если файл исторических данных не найден.
     """
-    try:
-        # --- 1. Загрузка сделок ---
-        filename = os.path.basename(file_path)
-        trades_df = load_trades_from_file(file_path)
-        if trades_df.empty:
-            return None  # Пропускаем файлы без сделок
-
-        # --- 2. Извлечение метаданных и поиск исторических данных ---
-        first_trade = trades_df.iloc[0]
-        strategy_name = first_trade['strategy_name']
-        exchange = first_trade['exchange']
-        instrument = first_trade['instrument']
-        interval = first_trade['interval']
-        risk_manager = first_trade['risk_manager']
-
-        data_path = os.path.join(PATH_CONFIG["DATA_DIR"], exchange, interval, f"{instrument.upper()}.parquet")
-        if not os.path.exists(data_path):
-            raise FileNotFoundError(f"Файл исторических данных не найден: {data_path}")
-
-        historical_data = pd.read_parquet(data_path)
-
-        # --- 3. Запуск сессии анализа (использование нашего нового модуля) ---
-        analysis = AnalysisSession(
-            trades_df=trades_df,
-            historical_data=historical_data,
-            initial_capital=BACKTEST_CONFIG["INITIAL_CAPITAL"],
-            exchange=exchange,
-            interval=interval,
-            risk_manager_type=risk_manager,
-            strategy_name=strategy_name
-        )
-
-        portfolio_metrics = analysis.portfolio_metrics
-        benchmark_metrics = analysis.benchmark_metrics
-
-        # --- 4. Сборка итогового словаря ---
-        profit_factor = portfolio_metrics.get("profit_factor", 0)
-
-        return {
-            "File Path": file_path,
-            "File": filename,
-            "Exchange": exchange,
-            "Strategy": strategy_name,
-            "Instrument": instrument,
-            "Interval": interval,
-            "Risk Manager": risk_manager,
-            "PnL (Strategy %)": portfolio_metrics.get("pnl_pct", 0),
-            "PnL (B&H %)": benchmark_metrics.get("pnl_pct", 0),
-            "Win Rate (%)": portfolio_metrics.get("win_rate", 0) * 100,
-            "Max Drawdown (%)": portfolio_metrics.get("max_drawdown", 0) * 100,
-            "Profit Factor": float(profit_factor) if np.isfinite(profit_factor) else np.inf,
-            "Sharpe Ratio": portfolio_metrics.get("sharpe_ratio", 0),
-            "Total Trades": int(portfolio_metrics.get("total_trades", 0)),
-        }
-    except Exception as e:
-        # Возвращаем ошибку в структурированном виде для отображения в UI
-        return {"error": f"Не удалось обработать файл {os.path.basename(file_path)}: {e}"}
+    data_path = os.path.join(PATH_CONFIG["DATA_DIR"], meta["Exchange"], meta["Interval"],
+                             f"{meta['Instrument'].upper()}.parquet")
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"Файл исторических данных не найден: {data_path}")
+
+    # Бенчмарку нужны только цены: остальные колонки не читаются
+    historical_data = pd.read_parquet(data_path, columns=['time', 'open', 'close'])
+    annual_factor = EXCHANGE_SPECIFIC_CONFIG.get(meta["Exchange"], {}).get("SHARPE_ANNUALIZATION_FACTOR", 252)
+    benchmark_calc = BenchmarkMetricsCalculator(historical_data, BACKTEST_CONFIG["INITIAL_CAPITAL"], annual_factor)
+    return benchmark_calc.calculate_all().get("pnl_pct", 0)
+
+
+def _summary_row(meta: Dict[str, Any], portfolio_metrics: Dict[str, Any], benchmark_pnl_pct: float) -> Dict[str, Any]:
+    """Собирает строку итоговой таблицы из метаданных и метрик."""
+    profit_factor = portfolio_metrics.get("profit_factor", 0)
+    return {
+        **meta,
+        "PnL (Strategy %)": portfolio_metrics.get("pnl_pct", 0),
+        "PnL (B&H %)": benchmark_pnl_pct,
+        "Win Rate (%)": portfolio_metrics.get("win_rate", 0) * 100,
+        "Max Drawdown (%)": portfolio_metrics.get("max_drawdown", 0) * 100,
+        "Profit Factor": float(profit_factor) if np.isfinite(profit_factor) else np.inf,
+        "Sharpe Ratio": portfolio_metrics.get("sharpe_ratio", 0),
+        "Total Trades": int(portfolio_metrics.get("total_trades", 0)),
+    }
 
 
 @st.cache_data
@@ -90,6 +75,10 @@ def load_all_backtests(logs_dir: str) -> Tuple[pd.DataFrame, List[str]]:
     Сканирует директорию с логами, обрабатывает каждый файл и возвращает
     итоговый DataFrame со сводкой, а также список файлов, которые не удалось обработать.
 
+    Метрики стратегий считаются одним вызовом `calculate_batch_metrics` по общей
+    таблице сделок всех файлов (по биржам, так как коэффициент годовой нормализации у них свой),
+    а не отдельным калькулятором на каждый файл.
+
     Ключевой элемент здесь - декоратор @st.cache_data. Он кэширует результат
     выполнения этой функции. Streamlit будет выполнять ее только один раз.
     При последующих взаимодействиях с виджетами (фильтрами, кнопками) результат
@@ -98,7 +87,6 @@ def load_all_backtests(logs_dir: str) -> Tuple[pd.DataFrame, List[str]]:
     :param logs_dir: Путь к папке с логами (например, 'logs/backtests').
     :return: Кортеж, содержащий (pd.DataFrame со сводкой, список строк с ошибками).
     """
-    all_results = []
     failed_files = []
 
     if not os.path.isdir(logs_dir):
@@ -115,21 +103,40 @@ def load_all_backtests(logs_dir: str) -> Tuple[pd.DataFrame, List[str]]:
     # Используем st.progress для наглядности, если файлов много
     progress_bar = st.progress(0, text="Загрузка и обработка результатов бэктестов...")
 
+    # --- 1. Загрузка сделок и Buy & Hold по каждому файлу ---
+    loaded: List[Tuple[Dict[str, Any], float]] = []
+    trades_frames = []
     for i, file_path in enumerate(log_files):
-        result_row = _process_single_backtest_file(file_path)
-
-        if result_row and "error" in result_row:
-            failed_files.append(result_row["error"])
-        elif result_row:
-            all_results.append(result_row)
+        try:
+            result = _load_backtest_file(file_path)
+            if result is not None:
+                meta, trades_df = result
+                loaded.append((meta, _benchmark_pnl_pct(meta)))
+                trades_frames.append(trades_df[['pnl', 'entry_timestamp_utc', 'exit_timestamp_utc']]
+                                     .assign(run_id=file_path, exchange=meta["Exchange"]))
+        except Exception as e:
+            # Сохраняем ошибку в структурированном виде для отображения в UI
+            failed_files.append(f"Не удалось обработать файл {os.path.basename(file_path)}: {e}")
 
         # Обновляем прогресс-бар
         progress_bar.progress((i + 1) / len(log_files), text=f"Обработка файла: {os.path.basename(file_path)}")
 
     progress_bar.empty()  # Убираем прогресс-бар после завершения
 
-    if not all_results:
+    if not loaded:
         return pd.DataFrame(), failed_files
 
+    # --- 2. Метрики всех прогонов одним пакетом ---
+    all_trades = pd.concat(trades_frames, ignore_index=True)
+    metrics_parts = []
+    for exchange, exchange_trades in all_trades.groupby('exchange', sort=False):
+        annual_factor = EXCHANGE_SPECIFIC_CONFIG.get(exchange, {}).get("SHARPE_ANNUALIZATION_FACTOR", 252)
+        metrics_parts.append(calculate_batch_metrics(exchange_trades, BACKTEST_CONFIG["INITIAL_CAPITAL"], annual_factor))
+    metrics_df = pd.concat(metrics_parts)
+
+    all_results = [
+        _summary_row(meta, metrics_df.loc[meta["File Path"]].to_dict(), benchmark_pnl_pct)
+        for meta, benchmark_pnl_pct in loaded
+    ]
     summary_df = pd.DataFrame(all_results)
-    return summary_df, failed_files
\ No newline at end of file
+    return summary_df, failed_files
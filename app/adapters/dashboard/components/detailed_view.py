@@ -20,24 +20,38 @@ from datetime import timedelta
 from app.shared.time_helper import parse_interval_to_timedelta
 from app.infrastructure.storage.file_io import load_trades_from_file
 from app.core.analysis.metrics import PortfolioMetricsCalculator, BenchmarkMetricsCalculator
+from app.core.analysis.monte_carlo import MonteCarloSimulator
+from app.core.analysis.rolling import rolling_trade_metrics
+from app.core.analysis.downsample import aggregate_ohlc, downsample_indices, downsample_series
 from app.shared.primitives import TradeDirection
 from app.shared.config import config
 
 PATH_CONFIG = config.PATH_CONFIG
 BACKTEST_CONFIG = config.BACKTEST_CONFIG
 EXCHANGE_SPECIFIC_CONFIG = config.EXCHANGE_SPECIFIC_CONFIG
+CHARTS_CONFIG = BACKTEST_CONFIG["CHARTS"]
 
 def plot_equity_and_drawdown(
         portfolio_equity: pd.Series,
         drawdown_percent: pd.Series,
         benchmark_equity: pd.Series
 ):
-    """Строит график кривой капитала и просадок."""
+    """
+    Строит график кривой капитала и просадок.
+
+    Длинные ряды прореживаются до CHARTS.MAX_POINTS точек с сохранением экстремумов,
+    а линии рисуются через WebGL (Scattergl), чтобы график не тормозил браузер.
+    """
+    max_points, method = CHARTS_CONFIG["MAX_POINTS"], CHARTS_CONFIG["METHOD"]
+    n_trades_points = len(portfolio_equity)
+    portfolio_equity = downsample_series(portfolio_equity, max_points, method)
+    drawdown_percent = downsample_series(drawdown_percent, max_points, method)
+
     fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05,
                         row_heights=[0.7, 0.3])
 
     # График капитала стратегии
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=portfolio_equity.index, y=portfolio_equity,
         mode='lines', name='Кривая капитала'
     ), row=1, col=1)
@@ -45,14 +59,15 @@ def plot_equity_and_drawdown(
     # График Buy & Hold
     if not benchmark_equity.empty:
         # Выравниваем индекс бенчмарка по количеству сделок для визуального сопоставления
-        resampled_index = np.linspace(0, len(portfolio_equity) - 1, len(benchmark_equity))
-        fig.add_trace(go.Scatter(
-            x=resampled_index, y=benchmark_equity.values,
+        resampled_index = np.linspace(0, n_trades_points - 1, len(benchmark_equity))
+        kept = downsample_indices(benchmark_equity.values, max_points, method, x=resampled_index)
+        fig.add_trace(go.Scattergl(
+            x=resampled_index[kept], y=benchmark_equity.values[kept],
             mode='lines', name='Buy & Hold', line=dict(dash='dash', color='grey')
         ), row=1, col=1)
 
-    # График просадки
-    fig.add_trace(go.Scatter(
+    # График просадки (fill='tozeroy' WebGL-трейсы тоже поддерживают)
+    fig.add_trace(go.Scattergl(
         x=drawdown_percent.index, y=drawdown_percent,
         mode='lines', name='Просадка', fill='tozeroy', line_color='red'
     ), row=2, col=1)
@@ -64,6 +79,37 @@ def plot_equity_and_drawdown(
     st.plotly_chart(fig, use_container_width=True)
 
 
+def plot_rolling_metrics(trades_df: pd.DataFrame, initial_capital: float, annual_factor: int):
+    """Строит скользящие Sharpe, win rate и просадку по сделкам для анализа режимов."""
+    window = st.text_input("Окно скользящих метрик (число сделок или длительность, например 30D)",
+                           value=str(BACKTEST_CONFIG["ROLLING_WINDOW"]))
+    try:
+        rolling = rolling_trade_metrics(trades_df, initial_capital, window=window, annualization_factor=annual_factor)
+    except ValueError as e:
+        st.error(f"Некорректное окно: {e}")
+        return
+
+    max_points, method = CHARTS_CONFIG["MAX_POINTS"], CHARTS_CONFIG["METHOD"]
+    sharpe = downsample_series(rolling['sharpe_ratio'], max_points, method)
+    win_rate = downsample_series(rolling['win_rate'] * 100, max_points, method)
+    drawdown = downsample_series(-rolling['drawdown'] * 100, max_points, method)
+
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.05)
+    fig.add_trace(go.Scattergl(x=sharpe.index, y=sharpe, mode='lines',
+                               name='Sharpe', line_color='purple'), row=1, col=1)
+    fig.add_trace(go.Scattergl(x=win_rate.index, y=win_rate, mode='lines',
+                               name='Win Rate', line_color='orange'), row=2, col=1)
+    fig.add_trace(go.Scattergl(x=drawdown.index, y=drawdown, mode='lines',
+                               name='Просадка', fill='tozeroy', line_color='red'), row=3, col=1)
+
+    fig.update_layout(title_text=f"Скользящие метрики (окно: {window})", height=600,
+                      legend_orientation="h", legend_y=1.1)
+    fig.update_yaxes(title_text="Sharpe", row=1, col=1)
+    fig.update_yaxes(title_text="Win Rate (%)", row=2, col=1)
+    fig.update_yaxes(title_text="Просадка (%)", row=3, col=1)
+    st.plotly_chart(fig, use_container_width=True)
+
+
 def plot_pnl_distribution(trades_df: pd.DataFrame):
     """Строит гистограмму распределения PnL по сделкам."""
     fig = px.histogram(trades_df, x="pnl", nbins=50,
@@ -92,14 +138,18 @@ def plot_trades_on_chart(historical_data: pd.DataFrame, trades_df: pd.DataFrame,
     """
     Отображает сделки на свечном графике.
 
+    Если свечей больше CHARTS.MAX_CANDLES, соседние свечи укрупняются (экстремумы цены сохраняются),
+    а маркеры сделок рисуются по точному времени и цене через WebGL (Scattergl).
+
     Args:
         historical_data: DataFrame со свечами.
         trades_df: DataFrame со сделками.
         interval_str: Строка интервала (например, '5min') для коррекции времени.
     """
+    candles = aggregate_ohlc(historical_data, CHARTS_CONFIG["MAX_CANDLES"])
     fig = go.Figure(data=go.Candlestick(
-        x=historical_data['time'], open=historical_data['open'], high=historical_data['high'],
-        low=historical_data['low'], close=historical_data['close'], name='Свечи'
+        x=candles['time'], open=candles['open'], high=candles['high'],
+        low=candles['low'], close=candles['close'], name='Свечи'
     ))
 
     # Преобразуем время в datetime
@@ -119,11 +169,11 @@ def plot_trades_on_chart(historical_data: pd.DataFrame, trades_df: pd.DataFrame,
     long_entries = trades_df[trades_df['direction'] == TradeDirection.BUY]
     short_entries = trades_df[trades_df['direction'] == TradeDirection.SELL]
 
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=long_entries['plot_entry_time'], y=long_entries['entry_price'], mode='markers',
         marker=dict(symbol='triangle-up', color='green', size=12), name='Вход в Лонг'
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=short_entries['plot_entry_time'], y=short_entries['entry_price'], mode='markers',
         marker=dict(symbol='triangle-down', color='red', size=12), name='Вход в Шорт'
     ))
@@ -135,7 +185,7 @@ def plot_trades_on_chart(historical_data: pd.DataFrame, trades_df: pd.DataFrame,
         ('Signal', 'x', 'orange')
     ]:
         exits = trades_df[trades_df['exit_reason'] == reason]
-        fig.add_trace(go.Scatter(
+        fig.add_trace(go.Scattergl(
             x=exits['plot_exit_time'], y=exits['exit_price'], mode='markers',
             marker=dict(symbol=symbol, color=color, size=10, line=dict(width=2, color='DarkSlateGrey')),
             name=f'Выход ({reason})'
@@ -147,6 +197,41 @@ def plot_trades_on_chart(historical_data: pd.DataFrame, trades_df: pd.DataFrame,
     )
     st.plotly_chart(fig, use_container_width=True)
 
+def render_monte_carlo(trades_df: pd.DataFrame, initial_capital: float, annual_factor: int):
+    """Строит распределения Монте-Карло по сделкам и таблицу доверительных интервалов."""
+    mc_config = BACKTEST_CONFIG["MONTE_CARLO"]
+    col1, col2 = st.columns(2)
+    n_simulations = col1.number_input("Число симуляций", min_value=100, max_value=200_000,
+                                      value=mc_config["SIMULATIONS"] or 10_000, step=1000)
+    method = col2.selectbox("Метод", ["bootstrap", "shuffle"],
+                            index=0 if mc_config["METHOD"] == "bootstrap" else 1)
+
+    simulator = MonteCarloSimulator.from_trades(
+        trades_df, initial_capital,
+        annualization_factor=annual_factor,
+        n_simulations=int(n_simulations),
+        method=method,
+        max_chunk_elements=mc_config["MAX_CHUNK_ELEMENTS"],
+        seed=mc_config["SEED"]
+    )
+    if not simulator.is_valid:
+        st.info("Для Монте-Карло нужно минимум две сделки.")
+        return
+
+    distribution = simulator.run()
+    summary = simulator.summary(distribution, confidence=mc_config["CONFIDENCE"])
+    st.metric("Вероятность убытка", f"{summary.attrs['probability_of_loss'] * 100:.2f}%")
+
+    titles = {"final_pnl": "Итоговый PnL", "max_drawdown": "Макс. просадка", "sharpe_ratio": "Sharpe"}
+    for metric, title in titles.items():
+        fig = px.histogram(distribution, x=metric, nbins=80, title=f"Распределение: {title}")
+        for column, dash in (("lower", "dash"), ("upper", "dash"), ("observed", "solid")):
+            fig.add_vline(x=summary.loc[metric, column], line_dash=dash, line_color="red" if column == "observed" else "grey")
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(summary.rename(index=titles), use_container_width=True)
+
+
 def render_detailed_view(filtered_df: pd.DataFrame):
     """
     Отрисовывает всю секцию детального анализа одного бэктеста.
@@ -195,14 +280,18 @@ def render_detailed_view(filtered_df: pd.DataFrame):
         benchmark_equity = benchmark_calc.equity_curve if benchmark_calc.is_valid else pd.Series()
 
         # --- 3. Отрисовка вкладок и графиков ---
-        tab1, tab2, tab3 = st.tabs(["📈 Кривая капитала", "📊 Анализ PnL", "🕯️ График сделок"])
+        tab1, tab2, tab3, tab4 = st.tabs(["📈 Кривая капитала", "📊 Анализ PnL", "🕯️ График сделок", "🎲 Монте-Карло"])
 
         with tab1:
             plot_equity_and_drawdown(portfolio_equity, drawdown_percent, benchmark_equity)
+            plot_rolling_metrics(trades_df, BACKTEST_CONFIG["INITIAL_CAPITAL"], annual_factor)
 
         with tab2:
             plot_pnl_distribution(trades_df)
             plot_monthly_pnl(trades_df)
 
         with tab3:
-            plot_trades_on_chart(historical_data, trades_df, row["Interval"])
\ No newline at end of file
+            plot_trades_on_chart(historical_data, trades_df, row["Interval"])
+
+        with tab4:
+            render_monte_carlo(trades_df, BACKTEST_CONFIG["INITIAL_CAPITAL"], annual_factor)
@@ -0,0 +1,72 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, Any, Iterator, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResultsAggregator:
+    """
+    Инкрементальный сборщик результатов пакетного тестирования.
+
+    Вместо того чтобы держать в памяти полный результат каждого инструмента
+    (сделки, свечи, кривые капитала), сохраняет только строку сводки со скалярными
+    метриками, а сделки сразу сбрасывает на диск (по одному Parquet-файлу на инструмент).
+    Пиковое потребление памяти не зависит от размера вселенной инструментов.
+    """
+
+    def __init__(self, spill_dir: Optional[str] = None):
+        """
+        :param spill_dir: Папка для сделок. Если не указана, создается временная папка,
+                          которая удаляется в `cleanup()`.
+        """
+        self._owns_dir = spill_dir is None
+        self.trades_dir = spill_dir or tempfile.mkdtemp(prefix="batch_trades_")
+        os.makedirs(self.trades_dir, exist_ok=True)
+
+        self._rows: List[Dict[str, Any]] = []
+        self._trade_files: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, instrument: str, result: Dict[str, Any]) -> None:
+        """
+        Принимает результат одного инструмента и сразу освобождает тяжелые части.
+
+        :param instrument: Тикер инструмента.
+        :param result: Словарь от `_run_and_analyze_single_instrument`.
+        """
+        # В сводку попадают только скаляры: DataFrame и вложенные словари отбрасываются
+        row = {
+            key: value for key, value in result.items()
+            if not isinstance(value, (pd.DataFrame, pd.Series, dict, list)) and value is not None
+        }
+        row['instrument'] = instrument
+        self._rows.append(row)
+
+        trades_df = result.get("trades_df")
+        if trades_df is not None and not trades_df.empty:
+            safe_name = re.sub(r'[^\w\-.]', '_', instrument)
+            path = os.path.join(self.trades_dir, f"{safe_name}.parquet")
+            trades_df.assign(instrument=instrument).to_parquet(path, index=False)
+            self._trade_files.append(path)
+
+    def summary_df(self) -> pd.DataFrame:
+        """Таблица сводки (одна строка на инструмент) для ExcelReportGenerator."""
+        return pd.DataFrame(self._rows)
+
+    def iter_trades(self) -> Iterator[pd.DataFrame]:
+        """Построчно (по инструментам) читает сброшенные на диск сделки."""
+        for path in self._trade_files:
+            yield pd.read_parquet(path)
+
+    def cleanup(self) -> None:
+        """Удаляет временную папку со сделками, если она была создана агрегатором."""
+        if self._owns_dir and os.path.isdir(self.trades_dir):
+            shutil.rmtree(self.trades_dir, ignore_errors=True)
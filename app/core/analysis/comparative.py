@@ -1,9 +1,10 @@
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Tuple, Optional
 
 from app.infrastructure.storage.file_io import load_trades_from_file
 from app.shared.config import config
-from app.core.analysis.metrics import PortfolioMetricsCalculator
+from app.core.analysis.metrics import PortfolioMetricsCalculator, calculate_batch_metrics
 
 PATH_CONFIG = config.PATH_CONFIG
 BACKTEST_CONFIG = config.BACKTEST_CONFIG
@@ -31,6 +32,18 @@ class ComparativeAnalyzer:
         # В будущем можно сделать это поле более динамическим.
         self.annualization_factor = EXCHANGE_SPECIFIC_CONFIG.get("tinkoff", {}).get("SHARPE_ANNUALIZATION_FACTOR", 252)
 
+    @staticmethod
+    def _format_portfolio_metrics(all_metrics: Dict) -> pd.Series:
+        """Собирает только те метрики, которые нужны для сводной таблицы."""
+        return pd.Series({
+            'PnL, %': all_metrics.get('pnl_pct', 0.0),
+            'Win Rate, %': all_metrics.get('win_rate', 0.0) * 100,
+            'Max Drawdown, %': all_metrics.get('max_drawdown', 0.0) * 100,
+            'Profit Factor': all_metrics.get('profit_factor', 0.0),
+            'Sharpe Ratio': all_metrics.get('sharpe_ratio', 0.0),
+            'Total Trades': all_metrics.get('total_trades', 0)
+        })
+
     # <<< ИЗМЕНЕНИЕ 3: Полностью переписанный метод. Теперь он - тонкая обертка.
     def _calculate_portfolio_metrics(self, portfolio_trades_df: pd.DataFrame,
                                      total_initial_capital: float) -> pd.Series:
@@ -50,17 +63,37 @@ class ComparativeAnalyzer:
         if not calculator.is_valid:
             return pd.Series(dtype=float)
 
-        all_metrics = calculator.calculate_all()
+        return self._format_portfolio_metrics(calculator.calculate_all())
 
-        # Собираем только те метрики, которые нам нужны для сводной таблицы
-        return pd.Series({
-            'PnL, %': all_metrics.get('pnl_pct', 0.0),
-            'Win Rate, %': all_metrics.get('win_rate', 0.0) * 100,
-            'Max Drawdown, %': all_metrics.get('max_drawdown', 0.0) * 100,
-            'Profit Factor': all_metrics.get('profit_factor', 0.0),
-            'Sharpe Ratio': all_metrics.get('sharpe_ratio', 0.0),
-            'Total Trades': all_metrics.get('total_trades', 0)
-        })
+    def _filter_portfolio(self, strategy_name: str, instruments: List[str],
+                          interval: str, risk_manager: str) -> pd.DataFrame:
+        return self.summary_df[
+            (self.summary_df['Strategy'] == strategy_name) &
+            (self.summary_df['Instrument'].isin(instruments)) &
+            (self.summary_df['Interval'] == interval) &
+            (self.summary_df['Risk Manager'] == risk_manager)
+            ]
+
+    @staticmethod
+    def _load_portfolio_trades(filtered_summary: pd.DataFrame) -> pd.DataFrame:
+        """Загружает и объединяет сделки всех бэктестов портфеля в порядке выхода."""
+        all_trades_list = []
+        for _, row in filtered_summary.iterrows():
+            try:
+                trades_df = load_trades_from_file(row['File Path'])
+                if not trades_df.empty:
+                    all_trades_list.append(trades_df)
+            except Exception as e:
+                print(f"Ошибка при загрузке файла {row['File']}: {e}")
+
+        if not all_trades_list:
+            return pd.DataFrame()
+
+        all_trades_df = pd.concat(all_trades_list, ignore_index=True)
+        all_trades_df['exit_timestamp_utc'] = pd.to_datetime(all_trades_df['exit_timestamp_utc'])
+        all_trades_df.sort_values(by='exit_timestamp_utc', inplace=True)
+        all_trades_df.reset_index(drop=True, inplace=True)
+        return all_trades_df
 
     def compare_strategies_on_instrument(
             self,
@@ -111,33 +144,15 @@ class ComparativeAnalyzer:
         Анализирует устойчивость одной стратегии на множестве инструментов.
         (Метод обновлен для использования нового калькулятора)
         """
-        filtered_summary = self.summary_df[
-            (self.summary_df['Strategy'] == strategy_name) &
-            (self.summary_df['Instrument'].isin(instruments)) &
-            (self.summary_df['Interval'] == interval) &
-            (self.summary_df['Risk Manager'] == risk_manager)
-            ]
+        filtered_summary = self._filter_portfolio(strategy_name, instruments, interval, risk_manager)
 
         if filtered_summary.empty:
             return pd.DataFrame(), None
 
-        all_trades_list = []
-        for _, row in filtered_summary.iterrows():
-            try:
-                trades_df = load_trades_from_file(row['File Path'])
-                if not trades_df.empty:
-                    all_trades_list.append(trades_df)
-            except Exception as e:
-                print(f"Ошибка при загрузке файла {row['File']}: {e}")
-
-        if not all_trades_list:
+        all_trades_df = self._load_portfolio_trades(filtered_summary)
+        if all_trades_df.empty:
             return pd.DataFrame(), None
 
-        all_trades_df = pd.concat(all_trades_list, ignore_index=True)
-        all_trades_df['exit_timestamp_utc'] = pd.to_datetime(all_trades_df['exit_timestamp_utc'])
-        all_trades_df.sort_values(by='exit_timestamp_utc', inplace=True)
-        all_trades_df.reset_index(drop=True, inplace=True)
-
         num_instruments = len(filtered_summary)
         portfolio_initial_capital = self.initial_capital_per_instrument * num_instruments
 
@@ -166,31 +181,48 @@ class ComparativeAnalyzer:
     ) -> Tuple[pd.DataFrame, Dict[str, pd.Series]]:
         """
         Сравнивает агрегированные (портфельные) результаты нескольких стратегий.
-        (Этот метод автоматически начинает работать правильно после рефакторинга
-         analyze_instrument_robustness, поэтому здесь изменений нет)
+
+        Сделки всех портфелей собираются в одну длинную таблицу, и метрики считаются
+        одним вызовом `calculate_batch_metrics`, без калькулятора на каждую стратегию.
         """
-        aggregated_metrics_list = []
+        portfolio_frames = []
+        capitals = {}
         equity_curves = {}
 
         for strategy_name in strategy_names:
             try:
-                metrics_df, equity_curve = self.analyze_instrument_robustness(
-                    strategy_name=strategy_name,
-                    instruments=instruments,
-                    interval=interval,
-                    risk_manager=risk_manager
-                )
-                if metrics_df.empty or equity_curve is None:
+                filtered_summary = self._filter_portfolio(strategy_name, instruments, interval, risk_manager)
+                if filtered_summary.empty:
+                    continue
+                all_trades_df = self._load_portfolio_trades(filtered_summary)
+                if all_trades_df.empty:
                     continue
 
-                portfolio_summary = metrics_df.loc['ИТОГО (портфель)'].copy()
-                portfolio_summary.name = strategy_name
-                aggregated_metrics_list.append(portfolio_summary)
-                equity_curves[strategy_name] = equity_curve
+                capitals[strategy_name] = self.initial_capital_per_instrument * len(filtered_summary)
+                portfolio_frames.append(all_trades_df.assign(run_id=strategy_name))
+                equity_curves[strategy_name] = capitals[strategy_name] + all_trades_df['pnl'].cumsum()
 
             except Exception as e:
                 print(f"Ошибка при агрегации результатов для стратегии '{strategy_name}': {e}")
 
+        if not portfolio_frames:
+            return pd.DataFrame(), {}
+
+        batch_metrics = calculate_batch_metrics(
+            pd.concat(portfolio_frames, ignore_index=True),
+            initial_capital=pd.Series(capitals),
+            annualization_factor=self.annualization_factor
+        )
+
+        aggregated_metrics_list = []
+        for strategy_name, all_metrics in batch_metrics.iterrows():
+            portfolio_summary = self._format_portfolio_metrics(all_metrics.to_dict())
+            if all_metrics['total_trades'] < 2:
+                # Как и в analyze_instrument_robustness: метрики не определены, строка остается пустой
+                portfolio_summary[:] = np.nan
+            portfolio_summary.name = strategy_name
+            aggregated_metrics_list.append(portfolio_summary)
+
         if not aggregated_metrics_list:
             return pd.DataFrame(), {}
 
@@ -0,0 +1,147 @@
+import logging
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DOWNSAMPLE_METHODS = ("minmax", "lttb")
+
+
+def _bucket_starts(n: int, n_buckets: int) -> np.ndarray:
+    """Начала n_buckets почти равных корзин для n точек."""
+    return np.unique(np.linspace(0, n, n_buckets + 1, dtype=np.int64)[:-1])
+
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """
+    Номера точек для прореживания min/max: из каждой корзины берутся первая и последняя точки,
+    минимум и максимум. Все экстремумы ряда сохраняются точно, расчет векторный — O(n).
+
+    :param y: Значения ряда.
+    :param n_buckets: Число корзин (в результате не больше 4 точек на корзину).
+    :return: Возрастающий массив номеров точек.
+    """
+    n = len(y)
+    starts = _bucket_starts(n, n_buckets)
+    ends = np.append(starts[1:], n)
+    sizes = ends - starts
+    bucket = np.repeat(np.arange(len(starts)), sizes)
+
+    with np.errstate(invalid='ignore'):
+        bucket_min = np.fmin.reduceat(y, starts)
+        bucket_max = np.fmax.reduceat(y, starts)
+    picks = [starts, ends - 1]
+    for extreme in (bucket_min, bucket_max):
+        # Первая точка корзины, равная ее экстремуму (корзины из одних NaN пропускаются)
+        hits = np.flatnonzero(y == extreme[bucket])
+        first_hit = np.searchsorted(hits, starts)
+        valid = first_hit < len(hits)
+        valid[valid] = hits[first_hit[valid]] < ends[valid]
+        picks.append(hits[first_hit[valid]])
+    return np.unique(np.concatenate(picks))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Номера точек по алгоритму Largest-Triangle-Three-Buckets (Steinarsson, 2013).
+
+    Из каждой корзины выбирается точка, образующая треугольник наибольшей площади
+    с выбранной точкой предыдущей корзины и средней точкой следующей. Хорошо сохраняет
+    визуальную форму ряда; цикл идет по корзинам, а не по точкам.
+
+    :param x: Координаты по оси X (числа, по возрастанию).
+    :param y: Значения ряда (без NaN).
+    :param n_out: Число точек на выходе (включая первую и последнюю).
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1, dtype=np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample_indices(y: Sequence[float],
+                       max_points: int,
+                       method: str = "minmax",
+                       x: Optional[Sequence[float]] = None,
+                       keep: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Номера точек ряда, которых достаточно для отрисовки без потери формы.
+
+    Глобальные минимум и максимум ряда и точки из keep (например, бары сделок)
+    всегда попадают в результат, поэтому экстремумы и маркеры на графике точные.
+
+    :param y: Значения ряда.
+    :param max_points: Целевое число точек (0 — без прореживания).
+    :param method: 'minmax' (min/max по корзинам) или 'lttb'.
+    :param x: Координаты по оси X для 'lttb' (по умолчанию — номера точек).
+    :param keep: Номера точек, которые нужно сохранить обязательно.
+    :return: Возрастающий массив номеров точек.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Неизвестный метод прореживания: {method}")
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if not max_points or n <= max_points:
+        return np.arange(n)
+
+    if method == "minmax":
+        indices = minmax_indices(y, max(1, max_points // 4))
+    else:
+        x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+        finite = np.flatnonzero(np.isfinite(y))
+        indices = finite[lttb_indices(x[finite], y[finite], max_points)] if len(finite) else np.arange(0)
+        if len(finite):
+            indices = np.concatenate((indices, [finite[np.argmin(y[finite])], finite[np.argmax(y[finite])]]))
+
+    if keep is not None and len(keep):
+        keep = np.asarray(keep, dtype=np.int64)
+        indices = np.concatenate((indices, keep[(keep >= 0) & (keep < n)]))
+    return np.unique(indices)
+
+
+def downsample_series(series: pd.Series, max_points: int, method: str = "minmax",
+                      keep: Optional[Sequence[int]] = None) -> pd.Series:
+    """Прореженная копия ряда (индекс сохраняется), см. `downsample_indices`."""
+    if not max_points or len(series) <= max_points:
+        return series
+    return series.iloc[downsample_indices(series.to_numpy(dtype=np.float64), max_points, method, keep=keep)]
+
+
+def aggregate_ohlc(data: pd.DataFrame, max_candles: int) -> pd.DataFrame:
+    """
+    Укрупняет свечи до не более чем max_candles: соседние бары объединяются по k штук
+    (open первого, close последнего, high — максимум, low — минимум, время — первого бара).
+    Максимумы и минимумы цены за весь период сохраняются точно.
+
+    :param data: Свечи с колонками time, open, high, low, close (остальные колонки отбрасываются).
+    :param max_candles: Лимит свечей на графике (0 — без укрупнения).
+    """
+    n = len(data)
+    if not max_candles or n <= max_candles:
+        return data
+    starts = np.arange(0, n, int(np.ceil(n / max_candles)))
+    ends = np.append(starts[1:], n)
+    return pd.DataFrame({
+        'time': data['time'].to_numpy()[starts],
+        'open': data['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(data['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(data['low'].to_numpy(), starts),
+        'close': data['close'].to_numpy()[ends - 1],
+    })
@@ -1,4 +1,7 @@
-from typing import Dict, Any
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -6,138 +9,626 @@ import pandas as pd
 from app.core.analysis.constants import METRIC_CONFIG
 
 
+def _metrics_from_aggregates(agg: Dict[str, Any], initial_capital: float, annualization_factor: int) -> Dict[str, Any]:
+    """
+    Собирает итоговый словарь метрик из заранее посчитанных агрегатов.
+
+    Единая точка с формулами метрик: ее используют и PortfolioMetricsCalculator
+    (агрегаты по DataFrame сделок), и OnlineMetricsAccumulator (агрегаты,
+    накопленные по ходу бэктеста). Порядок ключей совпадает с METRIC_CONFIG.
+
+    :param agg: Словарь агрегатов (n_trades, total_pnl, final_cumulative_pnl, win_count,
+                gross_profit, gross_loss, pnl_mean, pnl_std, returns_mean, returns_std,
+                downside_count, downside_std, max_drawdown, num_days).
+    :param initial_capital: Начальный капитал.
+    :param annualization_factor: Коэффициент годовой нормализации.
+    """
+    sqrt_factor = np.sqrt(annualization_factor)
+    max_drawdown = agg['max_drawdown']
+    returns_mean = agg['returns_mean']
+
+    # Sharpe
+    if agg['returns_std'] == 0:
+        sharpe = 0.0
+    else:
+        sharpe = (returns_mean / agg['returns_std']) * sqrt_factor
+
+    # Sortino
+    if agg['downside_count'] == 0 or agg['downside_std'] == 0:
+        # Если нет убыточных сделок, волатильность убытков равна 0.
+        # Возвращаем большое число, если доходность положительная, иначе 0.
+        sortino = 9999.0 if returns_mean > 0 else 0.0
+    else:
+        sortino = (returns_mean / agg['downside_std']) * sqrt_factor
+
+    # Calmar
+    total_return = np.float64(agg['final_cumulative_pnl'] / initial_capital)
+    num_days = agg['num_days']
+    annualized_return = ((1 + total_return) ** (365.0 / num_days)) - 1 if num_days > 0 else 0.0
+    if max_drawdown == 0:
+        # Если просадки не было, это идеальный результат.
+        # Возвращаем большое число, если была прибыль, иначе 0.
+        calmar = 9999.0 if annualized_return > 0 else 0.0
+    else:
+        calmar = annualized_return / max_drawdown
+
+    # Profit Factor
+    if agg['gross_loss'] == 0:
+        # Если убытков не было, это идеальный результат.
+        # Возвращаем большое число, если была прибыль, иначе 1 (нейтрально).
+        profit_factor = 9999.0 if agg['gross_profit'] > 0 else 1.0
+    else:
+        profit_factor = agg['gross_profit'] / agg['gross_loss']
+
+    # PnL / Max Drawdown
+    if max_drawdown == 0:
+        pnl_to_drawdown = 9999.0 if agg['total_pnl'] > 0 else 0.0
+    else:
+        pnl_to_drawdown = agg['final_cumulative_pnl'] / (max_drawdown * initial_capital)
+
+    # SQN
+    if agg['pnl_std'] == 0:
+        sqn = 0.0
+    else:
+        sqn = np.sqrt(agg['n_trades']) * (agg['pnl_mean'] / agg['pnl_std'])
+
+    # Custom (PF * WR / MDD)
+    win_rate = agg['win_count'] / agg['n_trades']
+    if max_drawdown == 0:
+        custom = 9999.0 if profit_factor > 1 and win_rate > 0 else 0.0
+    else:
+        # Нормализуем PF, чтобы он не доминировал слишком сильно
+        # (например, ограничиваем сверху значением 10)
+        custom = (min(profit_factor, 10.0) * win_rate) / max_drawdown
+
+    values = {
+        "calmar_ratio": calmar,
+        "sharpe_ratio": sharpe,
+        "sortino_ratio": sortino,
+        "profit_factor": profit_factor,
+        "pnl_to_drawdown": pnl_to_drawdown,
+        "sqn": sqn,
+        "pnl": agg['total_pnl'],
+        "win_rate": win_rate,
+        "max_drawdown": max_drawdown,
+        "custom_metric": custom,
+    }
+    results = {key: values[key] for key in METRIC_CONFIG.keys()}
+
+    # Добавляем базовые метрики, которые не входят в основной конфиг
+    results['pnl_abs'] = results['pnl']
+    results['pnl_pct'] = (results['pnl'] / initial_capital) * 100 if initial_capital > 0 else 0.0
+    results['total_trades'] = agg['n_trades']
+    return results
+
+
+def _empty_metrics() -> Dict[str, Any]:
+    """Словарь с нулевыми значениями для случая, когда метрики посчитать нельзя."""
+    all_metrics = {key: 0.0 for key in METRIC_CONFIG.keys()}
+    all_metrics['pnl_abs'] = 0.0
+    all_metrics['pnl_pct'] = 0.0
+    all_metrics['total_trades'] = 0
+    return all_metrics
+
+
+def _sample_std(values: np.ndarray) -> float:
+    """
+    Выборочное СКО (ddof=1) тем же двухпроходным алгоритмом, что и pandas.Series.std,
+    чтобы результат совпадал побитно. Для менее чем двух значений — NaN.
+    """
+    count = len(values)
+    if count < 2:
+        return np.nan
+    avg = values.sum(dtype=np.float64) / count
+    return np.sqrt(((avg - values) ** 2).sum(dtype=np.float64) / (count - 1))
+
+
+def trade_aggregates(pnl: np.ndarray, first_entry: Any, last_exit: Any,
+                     initial_capital: float) -> Optional[Dict[str, Any]]:
+    """
+    Считает все агрегаты для `_metrics_from_aggregates` за один проход по массиву PnL сделок.
+
+    Повторяет операции pandas, которые раньше выполнял PortfolioMetricsCalculator
+    (cumsum, pct_change, cummax, маски прибыли/убытка), но над сырыми массивами numpy,
+    без копирования DataFrame и разбора колонок времени.
+
+    :param pnl: PnL сделок в порядке выхода (float64).
+    :param first_entry: Время входа первой сделки.
+    :param last_exit: Время выхода последней сделки.
+    :param initial_capital: Начальный капитал.
+    :return: Словарь агрегатов или None, если сделок меньше двух.
+    """
+    n_trades = len(pnl)
+    if n_trades < 2:
+        return None
+
+    cumulative_pnl = np.cumsum(pnl)
+    equity = initial_capital + cumulative_pnl
+    returns = equity[1:] / equity[:-1] - 1
+    returns = returns[~np.isnan(returns)]
+    if len(returns) == 0:
+        return None
+
+    high_water_mark = np.maximum.accumulate(equity)
+    max_drawdown = abs(((equity - high_water_mark) / high_water_mark).min())
+
+    wins = pnl > 0
+    downside_returns = returns[returns < 0]
+    days = (pd.to_datetime(last_exit) - pd.to_datetime(first_entry)).days
+
+    total_pnl = pnl.sum(dtype=np.float64)
+    return {
+        'n_trades': n_trades,
+        'total_pnl': total_pnl,
+        'final_cumulative_pnl': cumulative_pnl[-1],
+        'win_count': wins.sum(),
+        'gross_profit': pnl[wins].sum(dtype=np.float64),
+        'gross_loss': abs(pnl[pnl < 0].sum(dtype=np.float64)),
+        'pnl_mean': total_pnl / n_trades,
+        'pnl_std': _sample_std(pnl),
+        'returns_mean': returns.sum(dtype=np.float64) / len(returns),
+        'returns_std': _sample_std(returns),
+        'downside_count': len(downside_returns),
+        'downside_std': _sample_std(downside_returns),
+        'max_drawdown': max_drawdown,
+        'num_days': days if days > 1 else 1,
+    }
+
+
 class PortfolioMetricsCalculator:
     """
     Рассчитывает различные метрики производительности на основе DataFrame сделок.
-    Оптимизирован для многократных вызовов: общие компоненты (equity, returns)
-    рассчитываются только один раз при инициализации.
+
+    Все метрики считаются одним вызовом `trade_aggregates` по массиву PnL, сам DataFrame
+    не копируется. Таблица сделок с кривой капитала (`trades`) строится лениво, только
+    если она нужна для графиков.
+
+    Если передана побарная кривая капитала (результат BacktestEngine), дополнительно
+    рассчитываются метрики по переоценке открытых позиций (mtm_max_drawdown, avg_exposure).
     """
 
-    def __init__(self, trades_df: pd.DataFrame, initial_capital: float, annualization_factor: int = 252):
+    def __init__(self,
+                 trades_df: pd.DataFrame,
+                 initial_capital: float,
+                 annualization_factor: int = 252,
+                 equity_curve: Optional[pd.DataFrame] = None):
+        self.equity_curve = equity_curve if equity_curve is not None and not equity_curve.empty else None
+
         if trades_df.empty or len(trades_df) < 2:
             self.is_valid = False
             return
 
-        self.is_valid = True
-        self.trades = trades_df.copy()
         self.initial_capital = initial_capital
         self.annualization_factor = annualization_factor
-
-        # --- Предварительные расчеты, которые используются в нескольких метриках ---
-        self.trades['cumulative_pnl'] = self.trades['pnl'].cumsum()
-        self.trades['equity_curve'] = self.initial_capital + self.trades['cumulative_pnl']
-        self.returns = self.trades['equity_curve'].pct_change().dropna()
-        if self.returns.empty:
-            self.is_valid = False
+        self._trades_df = trades_df
+        self._trades: Optional[pd.DataFrame] = None
+
+        self._aggregates = trade_aggregates(
+            trades_df['pnl'].to_numpy(dtype=np.float64),
+            trades_df['entry_timestamp_utc'].iloc[0],
+            trades_df['exit_timestamp_utc'].iloc[-1],
+            initial_capital
+        )
+        self.is_valid = self._aggregates is not None
+        if not self.is_valid:
             return
 
-        high_water_mark = self.trades['equity_curve'].cummax()
-        drawdown = (self.trades['equity_curve'] - high_water_mark) / high_water_mark
-        self.max_drawdown = abs(drawdown.min())
-        self.gross_profit = self.trades[self.trades['pnl'] > 0]['pnl'].sum()
-        self.gross_loss = abs(self.trades[self.trades['pnl'] < 0]['pnl'].sum())
-        start_date = pd.to_datetime(self.trades['entry_timestamp_utc'].iloc[0])
-        end_date = pd.to_datetime(self.trades['exit_timestamp_utc'].iloc[-1])
-        self.num_days = (end_date - start_date).days if (end_date - start_date).days > 1 else 1
+        self.max_drawdown = self._aggregates['max_drawdown']
+        self.gross_profit = self._aggregates['gross_profit']
+        self.gross_loss = self._aggregates['gross_loss']
+        self.num_days = self._aggregates['num_days']
+        self._metrics = _metrics_from_aggregates(self._aggregates, initial_capital, annualization_factor)
+
+    @property
+    def trades(self) -> pd.DataFrame:
+        """Копия сделок с колонками cumulative_pnl и equity_curve (строится при первом обращении)."""
+        if self._trades is None:
+            trades = self._trades_df.copy()
+            trades['cumulative_pnl'] = trades['pnl'].cumsum()
+            trades['equity_curve'] = self.initial_capital + trades['cumulative_pnl']
+            self._trades = trades
+        return self._trades
 
     def calculate(self, metric_key: str) -> float:
-        """Главный метод. Вызывает нужный расчет на основе ключа."""
+        """Главный метод. Возвращает значение метрики по ключу."""
+        if metric_key not in METRIC_CONFIG:
+            raise ValueError(f"Неизвестная метрика: {metric_key}")
         if not self.is_valid:
             return -1.0 if METRIC_CONFIG[metric_key]['direction'] == 'maximize' else 1e9
-
-        method_map = {
-            "sharpe_ratio": self._calculate_sharpe,
-            "sortino_ratio": self._calculate_sortino,
-            "calmar_ratio": self._calculate_calmar,
-            "profit_factor": self._calculate_profit_factor,
-            "pnl_to_drawdown": self._calculate_pnl_to_drawdown,
-            "sqn": self._calculate_sqn,
-            "custom_metric": self._calculate_custom,
-            "pnl": lambda: self.trades['pnl'].sum(),
-            "win_rate": lambda: (self.trades['pnl'] > 0).mean(),
-            "max_drawdown": lambda: self.max_drawdown,
-        }
-
-        if metric_key not in method_map:
-            raise ValueError(f"Неизвестная метрика: {metric_key}")
-        return method_map[metric_key]()
+        return self._metrics[metric_key]
 
     def calculate_all(self) -> Dict[str, Any]:
         """Рассчитывает все доступные метрики и возвращает их в виде словаря."""
         if not self.is_valid:
             # Возвращаем словарь с нулевыми значениями по умолчанию
-            all_metrics = {key: 0.0 for key in METRIC_CONFIG.keys()}
-            all_metrics['pnl_abs'] = 0.0
-            all_metrics['pnl_pct'] = 0.0
-            all_metrics['total_trades'] = 0
+            all_metrics = _empty_metrics()
+            all_metrics.update(self._calculate_mark_to_market())
             return all_metrics
 
-        results = {key: self.calculate(key) for key in METRIC_CONFIG.keys()}
+        results = dict(self._metrics)
+        results.update(self._calculate_mark_to_market())
+        return results
 
-        # Добавляем базовые метрики, которые не входят в основной конфиг
-        results['pnl_abs'] = results['pnl']
-        results['pnl_pct'] = (results['pnl'] / self.initial_capital) * 100 if self.initial_capital > 0 else 0.0
-        results['total_trades'] = len(self.trades)
+    def _calculate_mark_to_market(self) -> Dict[str, float]:
+        """
+        Метрики по побарной кривой капитала. Учитывают просадку внутри открытых позиций,
+        которую кривая по закрытым сделкам не видит.
+        """
+        if self.equity_curve is None:
+            return {}
+
+        equity = self.equity_curve['equity'].to_numpy()
+        # Точное значение, посчитанное движком по всем барам (до прореживания)
+        mtm_max_drawdown = self.equity_curve.attrs.get('max_drawdown')
+        if mtm_max_drawdown is None:
+            high_water_mark = np.maximum.accumulate(equity)
+            mtm_max_drawdown = float(np.max((high_water_mark - equity) / high_water_mark))
 
-        return results
+        return {
+            'mtm_max_drawdown': mtm_max_drawdown,
+            'avg_exposure': float(self.equity_curve['exposure'].mean()),
+        }
 
-    def _calculate_sharpe(self) -> float:
-        if self.returns.std() == 0: return 0.0
-        return (self.returns.mean() / self.returns.std()) * np.sqrt(self.annualization_factor)
-
-    def _calculate_sortino(self) -> float:
-        downside_returns = self.returns[self.returns < 0]
-        if downside_returns.empty:
-            # Если нет убыточных сделок, волатильность убытков равна 0.
-            # Возвращаем большое число, если доходность положительная, иначе 0.
-            return 9999.0 if self.returns.mean() > 0 else 0.0
-        downside_std = downside_returns.std()
-        if downside_std == 0:
-             return 9999.0 if self.returns.mean() > 0 else 0.0
-        return (self.returns.mean() / downside_std) * np.sqrt(self.annualization_factor)
-
-    def _calculate_calmar(self) -> float:
-        total_return = self.trades['cumulative_pnl'].iloc[-1] / self.initial_capital
-        annualized_return = ((1 + total_return) ** (365.0 / self.num_days)) - 1 if self.num_days > 0 else 0.0
-        if self.max_drawdown == 0:
-            # Если просадки не было, это идеальный результат.
-            # Возвращаем большое число, если была прибыль, иначе 0.
-            return 9999.0 if annualized_return > 0 else 0.0
-        return annualized_return / self.max_drawdown
-
-    def _calculate_profit_factor(self) -> float:
-        if self.gross_loss == 0:
-            # Если убытков не было, это идеальный результат.
-            # Возвращаем большое число, если была прибыль, иначе 1 (нейтрально).
-            return 9999.0 if self.gross_profit > 0 else 1.0
-        return self.gross_profit / self.gross_loss
-
-    def _calculate_pnl_to_drawdown(self) -> float:
-        if self.max_drawdown == 0:
-            # Если просадки не было, это идеальный результат.
-            return 9999.0 if self.trades['pnl'].sum() > 0 else 0.0
-        total_pnl = self.trades['cumulative_pnl'].iloc[-1]
-        return total_pnl / (self.max_drawdown * self.initial_capital)
-
-    def _calculate_sqn(self) -> float:
-        if self.trades['pnl'].std() == 0: return 0.0
-        return np.sqrt(len(self.trades)) * (self.trades['pnl'].mean() / self.trades['pnl'].std())
-
-    def _calculate_custom(self) -> float:
-        pf = self._calculate_profit_factor()
-        wr = (self.trades['pnl'] > 0).mean()
-        if self.max_drawdown == 0:
-            return 9999.0 if pf > 1 and wr > 0 else 0.0
-        # Нормализуем PF, чтобы он не доминировал слишком сильно
-        # (например, ограничиваем сверху значением 10)
-        normalized_pf = min(pf, 10.0)
-        return (normalized_pf * wr) / self.max_drawdown
+
+def calculate_batch_metrics(trades: pd.DataFrame,
+                            initial_capital: Union[float, pd.Series],
+                            annualization_factor: int = 252,
+                            run_column: str = 'run_id') -> pd.DataFrame:
+    """
+    Рассчитывает метрики сразу для множества прогонов по длинной таблице сделок.
+
+    Вместо отдельного PortfolioMetricsCalculator на каждый прогон все агрегаты считаются
+    сегментными редукциями (groupby cumsum/cummax и np.*.reduceat) по общему массиву,
+    а в Python-цикле остается только сборка словаря по готовым скалярам.
+    Внутри прогона сделки должны идти в порядке выхода, как и для PortfolioMetricsCalculator;
+    результат совпадает с ним с точностью до округления сумм.
+
+    :param trades: Сделки всех прогонов: колонки run_column, pnl, entry_timestamp_utc, exit_timestamp_utc.
+    :param initial_capital: Начальный капитал — общий или Series по идентификаторам прогонов.
+    :param annualization_factor: Коэффициент годовой нормализации.
+    :param run_column: Колонка с идентификатором прогона.
+    :return: DataFrame с индексом по прогонам и колонками как у `calculate_all()`.
+             Прогоны менее чем с двумя сделками получают нулевые метрики.
+    """
+    if trades.empty:
+        return pd.DataFrame(columns=list(_empty_metrics().keys()))
+
+    # 1. Сегменты: прогоны подряд, порядок сделок внутри прогона сохраняется
+    codes, run_ids = pd.factorize(trades[run_column], sort=False)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    counts = np.bincount(codes, minlength=len(run_ids))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    if isinstance(initial_capital, pd.Series):
+        capital = initial_capital.reindex(run_ids).to_numpy(dtype=np.float64)
+    else:
+        capital = np.full(len(run_ids), float(initial_capital))
+
+    pnl = trades['pnl'].to_numpy(dtype=np.float64)[order]
+    group_keys = pd.Series(codes)
+
+    # 2. Кривая капитала, доходности и просадка по каждому прогону
+    equity = capital[codes] + pd.Series(pnl).groupby(group_keys).cumsum().to_numpy()
+    high_water_mark = pd.Series(equity).groupby(group_keys).cummax().to_numpy()
+    drawdown = (equity - high_water_mark) / high_water_mark
+
+    is_start = np.zeros(len(pnl), dtype=bool)
+    is_start[starts] = True
+    returns = equity[1:] / equity[:-1] - 1
+    returns = returns[~is_start[1:]]
+    return_codes = codes[~is_start]
+
+    # 3. Сегментные суммы только по прогонам хотя бы с одной доходностью:
+    # прогоны с одной сделкой выбрасываются, чтобы сегменты reduceat не были пустыми
+    valid = counts >= 2
+    n_trades = counts[valid]
+
+    def segment_sum(values: np.ndarray, segment_starts: np.ndarray) -> np.ndarray:
+        return np.add.reduceat(values, segment_starts) if len(values) else np.zeros(len(segment_starts))
+
+    pnl_valid_mask = valid[codes]
+    pnl_v, equity_v, drawdown_v = pnl[pnl_valid_mask], equity[pnl_valid_mask], drawdown[pnl_valid_mask]
+    run_of_pnl = np.repeat(np.arange(len(n_trades)), n_trades)
+    valid_starts = np.concatenate(([0], np.cumsum(n_trades)[:-1]))
+
+    returns_v = returns[valid[return_codes]]
+    n_returns = n_trades - 1
+    run_of_return = np.repeat(np.arange(len(n_returns)), n_returns)
+    return_starts = np.concatenate(([0], np.cumsum(n_returns)[:-1]))
+
+    total_pnl = segment_sum(pnl_v, valid_starts)
+    pnl_mean = total_pnl / n_trades
+    pnl_var = segment_sum((pnl_mean[run_of_pnl] - pnl_v) ** 2, valid_starts) / (n_trades - 1)
+
+    returns_mean = segment_sum(returns_v, return_starts) / n_returns
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns_var = segment_sum((returns_mean[run_of_return] - returns_v) ** 2, return_starts) / (n_returns - 1)
+
+        negative = returns_v < 0
+        downside_count = segment_sum(negative.astype(np.int64), return_starts)
+        downside_mean = segment_sum(np.where(negative, returns_v, 0.0), return_starts) / downside_count
+        downside_sq = np.where(negative, (downside_mean[run_of_return] - returns_v) ** 2, 0.0)
+        downside_var = np.where(downside_count >= 2,
+                                segment_sum(downside_sq, return_starts) / (downside_count - 1), np.nan)
+
+    wins = pnl_v > 0
+    win_count = segment_sum(wins.astype(np.int64), valid_starts)
+    gross_profit = segment_sum(np.where(wins, pnl_v, 0.0), valid_starts)
+    gross_loss = np.abs(segment_sum(np.where(pnl_v < 0, pnl_v, 0.0), valid_starts))
+    last_index = valid_starts + n_trades - 1
+    final_cumulative_pnl = equity_v[last_index] - capital[valid]
+    max_drawdown = np.abs(np.minimum.reduceat(drawdown_v, valid_starts))
+
+    # 4. Длительность: вход первой сделки и выход последней
+    first_entry = pd.to_datetime(trades['entry_timestamp_utc'].take(order[starts[valid]]).reset_index(drop=True))
+    last_exit = pd.to_datetime(trades['exit_timestamp_utc'].take(order[starts[valid] + n_trades - 1]).reset_index(drop=True))
+    days = (last_exit - first_entry).dt.days.to_numpy()
+
+    # 5. Сборка метрик по готовым агрегатам
+    rows = {run_id: _empty_metrics() for run_id in run_ids}
+    valid_ids = run_ids[valid]
+    valid_capital = capital[valid]
+    for i, run_id in enumerate(valid_ids):
+        aggregates = {
+            'n_trades': int(n_trades[i]),
+            'total_pnl': total_pnl[i],
+            'final_cumulative_pnl': final_cumulative_pnl[i],
+            'win_count': win_count[i],
+            'gross_profit': gross_profit[i],
+            'gross_loss': gross_loss[i],
+            'pnl_mean': pnl_mean[i],
+            'pnl_std': np.sqrt(pnl_var[i]),
+            'returns_mean': returns_mean[i],
+            'returns_std': np.sqrt(returns_var[i]),
+            'downside_count': int(downside_count[i]),
+            'downside_std': np.sqrt(downside_var[i]),
+            'max_drawdown': max_drawdown[i],
+            'num_days': days[i] if days[i] > 1 else 1,
+        }
+        rows[run_id] = _metrics_from_aggregates(aggregates, valid_capital[i], annualization_factor)
+
+    result = pd.DataFrame.from_dict(rows, orient='index')
+    result.index.name = run_column
+    return result
+
+
+class _RunningMoments:
+    """Онлайн-оценка среднего и выборочного СКО (алгоритм Уэлфорда)."""
+
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def std(self) -> float:
+        """СКО с ddof=1, как у pandas. Для менее чем двух значений — NaN."""
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self._m2 / (self.count - 1))
+
+
+class OnlineMetricsAccumulator:
+    """
+    Потоковый расчет метрик по мере закрытия сделок.
+
+    FillProcessor вызывает `update()` для каждой закрытой сделки, поэтому к концу
+    прогона все агрегаты (моменты PnL и доходностей, High Water Mark, просадка,
+    валовые прибыль/убыток) уже готовы, и `calculate_all()` не требует DataFrame.
+    Семантика совпадает с PortfolioMetricsCalculator: кривая капитала строится
+    по выходам из сделок, доходности — процентные изменения между сделками.
+    """
+
+    def __init__(self, initial_capital: float, annualization_factor: int = 252):
+        """
+        :param initial_capital: Начальный капитал.
+        :param annualization_factor: Коэффициент годовой нормализации.
+        """
+        self.initial_capital = initial_capital
+        self.annualization_factor = annualization_factor
+
+        self.n_trades = 0
+        self.win_count = 0
+        self.cumulative_pnl = 0.0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.high_water_mark = -np.inf
+        self.max_drawdown = 0.0
+        self.first_entry_timestamp = None
+        self.last_exit_timestamp = None
+
+        self._equity = initial_capital
+        self._pnl_moments = _RunningMoments()
+        self._returns_moments = _RunningMoments()
+        self._downside_moments = _RunningMoments()
+
+    @property
+    def is_valid(self) -> bool:
+        """Метрики определены, если есть хотя бы две сделки (одна доходность)."""
+        return self.n_trades >= 2
+
+    def update(self, pnl: float, entry_timestamp, exit_timestamp) -> None:
+        """
+        Учитывает одну закрытую сделку.
+
+        :param pnl: Чистый PnL сделки.
+        :param entry_timestamp: Время входа.
+        :param exit_timestamp: Время выхода.
+        """
+        if self.n_trades == 0:
+            self.first_entry_timestamp = entry_timestamp
+        self.last_exit_timestamp = exit_timestamp
+
+        previous_equity = self._equity
+        self.n_trades += 1
+        self.cumulative_pnl += pnl
+        self._equity = self.initial_capital + self.cumulative_pnl
+        self._pnl_moments.push(pnl)
+
+        if pnl > 0:
+            self.win_count += 1
+            self.gross_profit += pnl
+        elif pnl < 0:
+            self.gross_loss -= pnl
+
+        if self.n_trades > 1:
+            ret = self._equity / previous_equity - 1
+            self._returns_moments.push(ret)
+            if ret < 0:
+                self._downside_moments.push(ret)
+
+        # Как и в PortfolioMetricsCalculator, пик отсчитывается от первой сделки
+        if self._equity > self.high_water_mark:
+            self.high_water_mark = self._equity
+        else:
+            drawdown = (self.high_water_mark - self._equity) / self.high_water_mark
+            if drawdown > self.max_drawdown:
+                self.max_drawdown = drawdown
+
+    def calculate_all(self) -> Dict[str, Any]:
+        """Возвращает словарь метрик в том же формате, что и PortfolioMetricsCalculator."""
+        if not self.is_valid:
+            return _empty_metrics()
+
+        days = (pd.to_datetime(self.last_exit_timestamp) - pd.to_datetime(self.first_entry_timestamp)).days
+        aggregates = {
+            'n_trades': self.n_trades,
+            'total_pnl': self.cumulative_pnl,
+            'final_cumulative_pnl': self.cumulative_pnl,
+            'win_count': self.win_count,
+            'gross_profit': self.gross_profit,
+            'gross_loss': self.gross_loss,
+            'pnl_mean': self._pnl_moments.mean,
+            'pnl_std': self._pnl_moments.std,
+            'returns_mean': self._returns_moments.mean,
+            'returns_std': self._returns_moments.std,
+            'downside_count': self._downside_moments.count,
+            'downside_std': self._downside_moments.std,
+            'max_drawdown': self.max_drawdown,
+            'num_days': days if days > 1 else 1,
+        }
+        return _metrics_from_aggregates(aggregates, self.initial_capital, self.annualization_factor)
+
+
+def buy_and_hold_metrics(entry_price: float, close: np.ndarray, initial_capital: float,
+                         annualization_factor: int = 252) -> Dict[str, Any]:
+    """
+    Метрики Buy & Hold: покупка по цене открытия первой свечи и удержание до конца.
+    Зависят только от цен закрытия, цены входа, капитала и коэффициента нормализации.
+
+    :param entry_price: Цена открытия первой свечи.
+    :param close: Цены закрытия (float64).
+    :param initial_capital: Начальный капитал.
+    :param annualization_factor: Коэффициент годовой нормализации.
+    """
+    quantity = initial_capital / entry_price
+    equity = close * quantity
+
+    # PnL
+    final_pnl = equity[-1] - initial_capital
+
+    # Max Drawdown (как cummax/min в pandas: пропуски не учитываются)
+    high_water_mark = np.fmax.accumulate(equity)
+    max_drawdown = abs(np.nanmin((equity - high_water_mark) / high_water_mark))
+
+    # Sharpe Ratio (пропуски заполняются предыдущим значением, как в pct_change)
+    missing = np.isnan(equity)
+    if missing.any():
+        equity = equity[np.maximum.accumulate(np.where(missing, 0, np.arange(len(equity))))]
+    returns = equity[1:] / equity[:-1] - 1
+    returns = returns[~np.isnan(returns)]
+    sharpe_ratio = 0.0
+    returns_std = _sample_std(returns)
+    if len(returns) and returns_std != 0:
+        returns_mean = returns.sum(dtype=np.float64) / len(returns)
+        sharpe_ratio = (returns_mean / returns_std) * np.sqrt(annualization_factor)
+
+    return {
+        'pnl_abs': final_pnl,
+        'pnl_pct': (final_pnl / initial_capital) * 100,
+        'max_drawdown': max_drawdown,
+        'sharpe_ratio': sharpe_ratio
+    }
+
+
+class BenchmarkCache:
+    """
+    LRU-кэш метрик Buy & Hold.
+
+    Бенчмарк одного и того же набора данных нужен в каждом пакетном прогоне, OOS-тесте
+    и строке дашборда, но зависит только от цен. Ключ — отпечаток цен закрытия и цены входа
+    (blake2b), границы по времени, капитал и коэффициент нормализации.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        :param max_entries: Максимальное число наборов данных в кэше.
+        """
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Tuple, Dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(entry_price: float, close: np.ndarray, time_range: Tuple[Any, Any],
+                 initial_capital: float, annualization_factor: int) -> Tuple:
+        digest = hashlib.blake2b(np.ascontiguousarray(close).tobytes(), digest_size=16)
+        digest.update(np.float64(entry_price).tobytes())
+        return digest.hexdigest(), len(close), time_range, float(initial_capital), annualization_factor
+
+    def get_metrics(self, data: pd.DataFrame, initial_capital: float, annualization_factor: int = 252) -> Dict[str, Any]:
+        """
+        Возвращает метрики Buy & Hold для набора свечей, считая их только при первом обращении.
+
+        :param data: Свечи; используются только колонки open (первая свеча), close и time.
+        :param initial_capital: Начальный капитал.
+        :param annualization_factor: Коэффициент годовой нормализации.
+        """
+        entry_price = data['open'].iloc[0]
+        close = data['close'].to_numpy(dtype=np.float64)
+        time_range = (data['time'].iloc[0], data['time'].iloc[-1]) if 'time' in data.columns else None
+        key = self.make_key(entry_price, close, time_range, initial_capital, annualization_factor)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(cached)
+            self.misses += 1
+
+        metrics = buy_and_hold_metrics(entry_price, close, initial_capital, annualization_factor)
+        with self._lock:
+            self._entries[key] = metrics
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return dict(metrics)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Общий кэш процесса: бэктесты, отчеты и дашборд переиспользуют бенчмарки друг друга
+benchmark_cache = BenchmarkCache()
 
 
 class BenchmarkMetricsCalculator:
     """
     Рассчитывает полный набор метрик для эталонной стратегии (например, Buy & Hold)
     на основе исторического временного ряда цен.
+
+    Метрики берутся из общего `benchmark_cache`, кривая капитала (`equity_curve`)
+    строится лениво, только для графиков.
     """
 
     def __init__(self, historical_data: pd.DataFrame, initial_capital: float, annualization_factor: int = 252):
@@ -145,20 +636,22 @@ class BenchmarkMetricsCalculator:
             self.is_valid = False
             return
 
-        self.is_valid = True
-        self.data = historical_data.copy()
+        self.data = historical_data
         self.initial_capital = initial_capital
         self.annualization_factor = annualization_factor
 
         # --- Ключевые расчеты ---
         entry_price = self.data['open'].iloc[0]
-        if entry_price == 0:
-            self.is_valid = False
-            return
+        self.is_valid = entry_price != 0
+        self._quantity = self.initial_capital / entry_price if self.is_valid else 0.0
+        self._equity_curve: Optional[pd.Series] = None
 
-        quantity = self.initial_capital / entry_price
-        self.equity_curve = self.data['close'] * quantity
-        self.returns = self.equity_curve.pct_change().dropna()
+    @property
+    def equity_curve(self) -> pd.Series:
+        """Кривая капитала Buy & Hold (строится при первом обращении)."""
+        if self._equity_curve is None:
+            self._equity_curve = self.data['close'] * self._quantity
+        return self._equity_curve
 
     def calculate_all(self) -> Dict[str, Any]:
         """Рассчитывает все метрики для бенчмарка."""
@@ -166,23 +659,4 @@ class BenchmarkMetricsCalculator:
             return {
                 'pnl_abs': 0.0, 'pnl_pct': 0.0, 'max_drawdown': 0.0, 'sharpe_ratio': 0.0
             }
-
-        # PnL
-        final_pnl = self.equity_curve.iloc[-1] - self.initial_capital
-
-        # Max Drawdown
-        high_water_mark = self.equity_curve.cummax()
-        drawdown = (self.equity_curve - high_water_mark) / high_water_mark
-        max_drawdown = abs(drawdown.min())
-
-        # Sharpe Ratio
-        sharpe_ratio = 0.0
-        if not self.returns.empty and self.returns.std() != 0:
-            sharpe_ratio = (self.returns.mean() / self.returns.std()) * np.sqrt(self.annualization_factor)
-
-        return {
-            'pnl_abs': final_pnl,
-            'pnl_pct': (final_pnl / self.initial_capital) * 100,
-            'max_drawdown': max_drawdown,
-            'sharpe_ratio': sharpe_ratio
-        }
+        return benchmark_cache.get_metrics(self.data, self.initial_capital, self.annualization_factor)
@@ -0,0 +1,240 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.shared.config import config
+
+logger = logging.getLogger(__name__)
+
+MONTE_CARLO_METHODS = ("bootstrap", "shuffle")
+MONTE_CARLO_METRICS = ("final_pnl", "max_drawdown", "sharpe_ratio")
+# Траекторий в блоке с собственным зерном: разбиение на пачки не меняет результат
+SEED_BLOCK_PATHS = 64
+
+
+def trade_returns(pnl: np.ndarray, initial_capital: float) -> np.ndarray:
+    """
+    Доходности сделок относительно капитала перед сделкой: r_i = pnl_i / equity_{i-1}.
+
+    Риск-менеджеры считают размер позиции от текущего капитала, поэтому переставлять
+    и повторять нужно доходности, а не абсолютный PnL: иначе PnL, заработанный при большом
+    капитале, переносится на малый, и разброс доходностей траекторий завышается.
+    Сделки после обнуления капитала отбрасываются — доходность для них не определена.
+    """
+    equity_before = initial_capital + np.concatenate(([0.0], np.cumsum(pnl)[:-1]))
+    ruined = np.flatnonzero(equity_before <= 0)
+    if len(ruined):
+        logger.warning(f"Монте-Карло: капитал обнулился на сделке #{ruined[0]}, последующие сделки не учитываются.")
+        pnl, equity_before = pnl[:ruined[0]], equity_before[:ruined[0]]
+    return pnl / equity_before
+
+
+def _path_metrics(return_paths: np.ndarray, initial_capital: float, annualization_factor: int) -> np.ndarray:
+    """
+    Считает метрики для пачки траекторий сразу (одна траектория — одна строка).
+
+    Капитал траектории — сложный процент доходностей сделок от начального капитала.
+    Формулы совпадают с `trade_aggregates`: просадка считается от максимума кривой капитала
+    по сделкам, Sharpe — по доходностям между соседними сделками (ddof=1).
+
+    :param return_paths: Доходности сделок, массив формы (n_paths, n_trades).
+    :return: Массив формы (n_paths, 3): final_pnl, max_drawdown, sharpe_ratio.
+    """
+    equity = initial_capital * np.cumprod(1 + return_paths, axis=1)
+    high_water_mark = np.maximum.accumulate(equity, axis=1)
+    max_drawdown = np.abs(((equity - high_water_mark) / high_water_mark).min(axis=1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = equity[:, 1:] / equity[:, :-1] - 1
+        returns_mean = np.nanmean(returns, axis=1)
+        returns_std = np.nanstd(returns, axis=1, ddof=1)
+        sharpe = np.where(returns_std > 0, returns_mean / returns_std, 0.0) * np.sqrt(annualization_factor)
+
+    return np.column_stack((equity[:, -1] - initial_capital, max_drawdown, sharpe))
+
+
+def _simulate_block(returns: np.ndarray, method: str, n_paths: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Генерирует n_paths траекторий доходностей сделок блока из его собственного зерна."""
+    rng = np.random.default_rng(seed)
+    if method == "bootstrap":
+        # Выборка сделок с возвращением: меняется и порядок, и состав сделок
+        return returns[rng.integers(0, len(returns), size=(n_paths, len(returns)))]
+    # Перестановка: итоговый капитал неизменен, меняется только путь (просадка, Sharpe)
+    return rng.permuted(np.broadcast_to(returns, (n_paths, len(returns))), axis=1)
+
+
+def _simulate_chunk(returns: np.ndarray, initial_capital: float, annualization_factor: int,
+                    method: str, block_sizes: List[int], seeds: List[np.random.SeedSequence]) -> np.ndarray:
+    """
+    Рабочая единица симуляции: генерирует траектории нескольких блоков и считает их метрики.
+    Функция уровня модуля, чтобы ее можно было передать в ProcessPoolExecutor.
+    """
+    paths = np.vstack([_simulate_block(returns, method, size, seed) for size, seed in zip(block_sizes, seeds)])
+    return _path_metrics(paths, initial_capital, annualization_factor)
+
+
+class MonteCarloSimulator:
+    """
+    Оценка устойчивости результата бэктеста перемешиванием сделок (Монте-Карло).
+
+    Каждая траектория — это переставленная ('shuffle') или выбранная с возвращением
+    ('bootstrap') последовательность доходностей сделок (см. `trade_returns`), капитал
+    наращивается по ним от начального сложным процентом. Траектории генерируются пачками в виде
+    матриц numpy и считаются векторно, без PortfolioMetricsCalculator на каждый прогон.
+    Размер пачки ограничивается числом элементов матрицы, поэтому память не зависит
+    от числа симуляций. Пачки можно распределить по процессам. Зерна порождаются из одного
+    SeedSequence на блоки фиксированного размера (SEED_BLOCK_PATHS), а пачка состоит из целых
+    блоков, поэтому при заданном зерне результат не зависит ни от размера пачки, ни от числа воркеров.
+    """
+
+    def __init__(self,
+                 pnl: Sequence[float],
+                 initial_capital: float,
+                 annualization_factor: int = 252,
+                 n_simulations: int = 10_000,
+                 method: str = "bootstrap",
+                 max_chunk_elements: int = 2_000_000,
+                 n_workers: int = 1,
+                 seed: Optional[int] = None):
+        """
+        :param pnl: PnL сделок в порядке закрытия.
+        :param initial_capital: Начальный капитал.
+        :param annualization_factor: Коэффициент годовой нормализации Sharpe.
+        :param n_simulations: Число траекторий.
+        :param method: 'bootstrap' (выборка с возвращением) или 'shuffle' (перестановка).
+        :param max_chunk_elements: Лимит элементов матрицы траекторий в одной пачке
+                                   (пачка содержит минимум один блок из SEED_BLOCK_PATHS траекторий).
+        :param n_workers: Число процессов (1 — считать в текущем процессе).
+        :param seed: Зерно генератора для воспроизводимости.
+        """
+        if method not in MONTE_CARLO_METHODS:
+            raise ValueError(f"Неизвестный метод Монте-Карло: {method}")
+        self.pnl = np.asarray(pnl, dtype=np.float64)
+        self.initial_capital = initial_capital
+        self.returns = trade_returns(self.pnl, initial_capital)
+        self.annualization_factor = annualization_factor
+        self.n_simulations = n_simulations
+        self.method = method
+        self.max_chunk_elements = max_chunk_elements
+        self.n_workers = max(1, n_workers)
+        self.seed = seed
+
+    @classmethod
+    def from_trades(cls, trades_df: pd.DataFrame, initial_capital: float, **kwargs) -> "MonteCarloSimulator":
+        """
+        Создает симулятор по таблице сделок (сделки упорядочиваются по времени выхода).
+
+        :param trades_df: DataFrame с колонками 'pnl' и 'exit_timestamp_utc'.
+        :param initial_capital: Начальный капитал.
+        """
+        if 'exit_timestamp_utc' in trades_df.columns:
+            trades_df = trades_df.sort_values('exit_timestamp_utc', kind='stable')
+        return cls(trades_df['pnl'].to_numpy(dtype=np.float64), initial_capital, **kwargs)
+
+    @property
+    def is_valid(self) -> bool:
+        """Для доходностей и Sharpe нужны минимум две сделки."""
+        return len(self.returns) >= 2 and self.n_simulations > 0
+
+    def _block_sizes(self) -> List[int]:
+        n_full, rest = divmod(self.n_simulations, SEED_BLOCK_PATHS)
+        return [SEED_BLOCK_PATHS] * n_full + ([rest] if rest else [])
+
+    def run(self) -> pd.DataFrame:
+        """
+        Выполняет все симуляции.
+
+        :return: DataFrame (одна строка на траекторию): final_pnl, max_drawdown, sharpe_ratio.
+        """
+        if not self.is_valid:
+            return pd.DataFrame(columns=list(MONTE_CARLO_METRICS), dtype=float)
+
+        block_sizes = self._block_sizes()
+        seeds = np.random.SeedSequence(self.seed).spawn(len(block_sizes))
+        blocks_per_chunk = max(1, self.max_chunk_elements // (SEED_BLOCK_PATHS * max(1, len(self.returns))))
+        args = [
+            (self.returns, self.initial_capital, self.annualization_factor, self.method,
+             block_sizes[start:start + blocks_per_chunk], seeds[start:start + blocks_per_chunk])
+            for start in range(0, len(block_sizes), blocks_per_chunk)
+        ]
+
+        if self.n_workers > 1 and len(args) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.n_workers, len(args))) as executor:
+                chunks = list(executor.map(_simulate_chunk, *zip(*args)))
+        else:
+            chunks = [_simulate_chunk(*a) for a in args]
+
+        logger.info(f"Монте-Карло: {self.n_simulations} траекторий ({self.method}) по {len(self.returns)} сделкам, "
+                    f"пачек: {len(args)}.")
+        return pd.DataFrame(np.vstack(chunks), columns=list(MONTE_CARLO_METRICS))
+
+    def observed(self) -> Dict[str, float]:
+        """Метрики фактической последовательности сделок (по тем же формулам, что и траектории)."""
+        values = _path_metrics(self.returns[None, :], self.initial_capital, self.annualization_factor)[0]
+        return dict(zip(MONTE_CARLO_METRICS, values))
+
+    def summary(self, distribution: Optional[pd.DataFrame] = None, confidence: float = 0.9) -> pd.DataFrame:
+        """
+        Сводка распределений с доверительными интервалами.
+
+        :param distribution: Результат `run()` (если не передан, симуляция выполняется).
+        :param confidence: Уровень доверительного интервала (0.9 — перцентили 5 и 95).
+        :return: DataFrame (индекс — метрика): observed, mean, lower, median, upper.
+                 В attrs: probability_of_loss, n_simulations, method, confidence.
+        """
+        if distribution is None:
+            distribution = self.run()
+        tail = (1 - confidence) / 2
+        observed = self.observed() if self.is_valid else {}
+
+        table = pd.DataFrame({
+            "observed": pd.Series(observed, dtype=float),
+            "mean": distribution.mean(),
+            "lower": distribution.quantile(tail),
+            "median": distribution.median(),
+            "upper": distribution.quantile(1 - tail),
+        }).reindex(list(MONTE_CARLO_METRICS))
+
+        table.attrs.update({
+            "probability_of_loss": float((distribution["final_pnl"] < 0).mean()) if len(distribution) else np.nan,
+            "n_simulations": len(distribution),
+            "method": self.method,
+            "confidence": confidence,
+        })
+        return table
+
+
+def run_monte_carlo(trades_df: pd.DataFrame,
+                    initial_capital: float,
+                    annualization_factor: int = 252,
+                    n_simulations: Optional[int] = None,
+                    method: Optional[str] = None,
+                    seed: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """
+    Запускает Монте-Карло с настройками из BACKTEST_CONFIG["MONTE_CARLO"] и возвращает сводку.
+
+    :param n_simulations: Число траекторий (None — из конфига, 0 — анализ выключен).
+    :param method: Метод перемешивания (None — из конфига).
+    :param seed: Зерно генератора (None — из конфига).
+    :return: Таблица `MonteCarloSimulator.summary()` или None, если анализ выключен
+             или сделок недостаточно.
+    """
+    mc_config = config.BACKTEST_CONFIG["MONTE_CARLO"]
+    n_simulations = mc_config["SIMULATIONS"] if n_simulations is None else n_simulations
+    if not n_simulations or trades_df is None or len(trades_df) < 2:
+        return None
+
+    simulator = MonteCarloSimulator.from_trades(
+        trades_df,
+        initial_capital,
+        annualization_factor=annualization_factor,
+        n_simulations=n_simulations,
+        method=method or mc_config["METHOD"],
+        max_chunk_elements=mc_config["MAX_CHUNK_ELEMENTS"],
+        n_workers=mc_config["WORKERS"],
+        seed=mc_config["SEED"] if seed is None else seed,
+    )
+    return simulator.summary(confidence=mc_config["CONFIDENCE"])
@@ -1,5 +1,6 @@
 import numpy as np
-from typing import Dict, Any
+import pandas as pd
+from typing import Dict, Any, Optional
 from rich.console import Console
 from rich.table import Table
 
@@ -13,12 +14,15 @@ class ConsoleReportGenerator:
                  portfolio_metrics: Dict[str, Any],
                  benchmark_metrics: Dict[str, Any],
                  metadata: Dict[str, str],
-                 report_filename: str):
+                 report_filename: str,
+                 monte_carlo: Optional[pd.DataFrame] = None):
 
         self.portfolio_metrics = portfolio_metrics
         self.benchmark_metrics = benchmark_metrics
         self.metadata = metadata
         self.report_filename = report_filename
+        # Сводка MonteCarloSimulator.summary() (опционально)
+        self.monte_carlo = monte_carlo
 
     def _format_metrics_for_display(self) -> Dict[str, str]:
         """Форматирует числовые метрики в строки для вывода в таблицу."""
@@ -60,4 +64,30 @@ class ConsoleReportGenerator:
             else:
                 table.add_row(key, value)
 
-        console.print(table)
\ No newline at end of file
+        console.print(table)
+
+        if self.monte_carlo is not None:
+            console.print(self._build_monte_carlo_table())
+
+    def _build_monte_carlo_table(self) -> Table:
+        """Таблица доверительных интервалов Монте-Карло."""
+        attrs = self.monte_carlo.attrs
+        confidence = attrs.get("confidence", 0.9) * 100
+        table = Table(title=f"Monte Carlo: {attrs.get('n_simulations', 0)} симуляций ({attrs.get('method', '')})",
+                      show_header=True, header_style="bold magenta")
+        table.add_column("Метрика", style="dim", width=25)
+        for column in ("Факт", "Среднее", f"Нижняя ({confidence:.0f}%)", "Медиана", f"Верхняя ({confidence:.0f}%)"):
+            table.add_column(column, justify="right")
+
+        formats = {
+            "final_pnl": ("Total PnL", lambda v: f"{v:.2f}"),
+            "max_drawdown": ("Max Drawdown", lambda v: f"{v * 100:.2f}%"),
+            "sharpe_ratio": ("Sharpe Ratio", lambda v: f"{v:.2f}"),
+        }
+        for metric, row in self.monte_carlo.iterrows():
+            label, fmt = formats.get(metric, (metric, lambda v: f"{v:.4f}"))
+            table.add_row(label, *(fmt(row[c]) for c in ("observed", "mean", "lower", "median", "upper")))
+
+        table.add_section()
+        table.add_row("Вероятность убытка", f"{attrs.get('probability_of_loss', 0) * 100:.2f}%")
+        return table
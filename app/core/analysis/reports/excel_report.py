@@ -1,11 +1,72 @@
+import os
+from enum import Enum
+
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Iterable, List
 import logging
 
+from app.shared.config import config
+
 logger = logging.getLogger(__name__)
 
+# Предел строк листа Excel: сделки сверх него переносятся на следующий лист
+EXCEL_MAX_ROWS = 1_048_576
+
+# Переименование колонок листа 'Детализация' и их жесткий порядок (Инструмент - ПЕРВЫЙ)
+DETAIL_COLUMNS = {
+    'instrument': 'Инструмент',
+    'pnl_pct': 'PnL (%)',
+    'pnl_abs': 'PnL (абс.)',
+    'pnl_bh_pct': 'B&H (%)',
+    'avg_trade_pnl': 'Ср. PnL сделки',
+    'total_trades': 'Сделок',
+    'win_rate': 'Win Rate',
+    'profit_factor': 'PF',
+    'max_drawdown': 'Max DD (%)',
+    'sharpe_ratio': 'Sharpe',
+    'calmar_ratio': 'Calmar'
+}
+
+
+def _cell_value(value: Any) -> Any:
+    """
+    Приводит значение к виду, который принимает xlsxwriter, так же как pandas.to_excel:
+    NaN и NaT — пустая ячейка (None), бесконечность — строка 'inf'.
+    """
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return None
+        if np.isinf(value):
+            return 'inf' if value > 0 else '-inf'
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _write_rows(sheet, frame: pd.DataFrame, first_row: int, chunk_rows: int) -> int:
+    """
+    Пишет строки DataFrame строго по порядку, пачками по chunk_rows.
+
+    Порядок строк обязателен для режима constant_memory: xlsxwriter сбрасывает строку на диск,
+    как только начата следующая. Пачка переводится в список Python целиком, без построчного
+    доступа к pandas.
+
+    :return: Номер строки листа, следующей за последней записанной.
+    """
+    row_num = first_row
+    for start in range(0, len(frame), chunk_rows):
+        for values in frame.iloc[start:start + chunk_rows].to_numpy(dtype=object).tolist():
+            sheet.write_row(row_num, 0, [_cell_value(v) for v in values])
+            row_num += 1
+    return row_num
+
 
 class ExcelReportGenerator:
     """
@@ -18,7 +79,25 @@ class ExcelReportGenerator:
                  interval: str,
                  risk_manager_type: str,
                  strategy_params: Optional[Dict[str, Any]] = None,
-                 rm_params: Optional[Dict[str, Any]] = None):
+                 rm_params: Optional[Dict[str, Any]] = None,
+                 monte_carlo: Optional[pd.DataFrame] = None,
+                 trades_source: Optional[Callable[[], Iterable[pd.DataFrame]]] = None,
+                 trades_sheet: Optional[bool] = None,
+                 constant_memory: Optional[bool] = None,
+                 companion_format: Optional[str] = None,
+                 chunk_rows: Optional[int] = None):
+        """
+        :param monte_carlo: Сводка MonteCarloSimulator.summary() по сделкам портфеля.
+                            Если передана, в отчет добавляется лист 'Монте-Карло'.
+        :param trades_source: Функция, возвращающая сделки пачками (например,
+                              BatchResultsAggregator.iter_trades). Сделки не загружаются целиком.
+        :param trades_sheet: Добавить лист 'Сделки' (None — из BACKTEST_CONFIG["EXCEL_REPORT"]).
+        :param constant_memory: Потоковая запись xlsxwriter: строки сбрасываются на диск по мере записи,
+                                память не растет с размером отчета (None — из конфига).
+        :param companion_format: Сопутствующая выгрузка таблиц рядом с отчетом: 'parquet' или 'csv'
+                                 (None — из конфига, пустая строка — выкл.).
+        :param chunk_rows: Размер пачки строк при записи (None — из конфига).
+        """
         if results_df.empty:
             raise ValueError("DataFrame с результатами для Excel-отчета не может быть пустым.")
 
@@ -28,6 +107,16 @@ class ExcelReportGenerator:
         self.risk_manager_type = risk_manager_type
         self.strategy_params = strategy_params or {}
         self.rm_params = rm_params or {}
+        self.monte_carlo = monte_carlo
+
+        excel_config = config.BACKTEST_CONFIG["EXCEL_REPORT"]
+        self.trades_source = trades_source
+        self.trades_sheet = excel_config["TRADES_SHEET"] if trades_sheet is None else trades_sheet
+        self.constant_memory = excel_config["CONSTANT_MEMORY"] if constant_memory is None else constant_memory
+        self.companion_format = excel_config["COMPANION_FORMAT"] if companion_format is None else companion_format
+        self.chunk_rows = chunk_rows or excel_config["CHUNK_ROWS"]
+        if self.companion_format not in ("", "parquet", "csv"):
+            raise ValueError(f"Неизвестный формат сопутствующей выгрузки: {self.companion_format}")
 
     def _calculate_summary_metrics(self) -> pd.DataFrame:
         """Рассчитывает сводные метрики по всему портфелю инструментов."""
@@ -78,12 +167,33 @@ class ExcelReportGenerator:
         }
         return pd.DataFrame(summary_data)
 
+    def _detail_table(self) -> pd.DataFrame:
+        """Таблица листа 'Детализация' (исходные имена колонок), отсортированная по PnL %."""
+        df_export = self.results_df
+
+        # Добавляем полезную метрику: Средний PnL на сделку (защита от деления на ноль)
+        total_trades = df_export['total_trades'].to_numpy(dtype=np.float64)
+        pnl_abs = df_export['pnl_abs'].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_trade_pnl = np.where(total_trades > 0, pnl_abs / total_trades, 0.0)
+        df_export = df_export.assign(avg_trade_pnl=avg_trade_pnl)
+
+        # Оставляем только те, что есть в наличии (на всякий случай)
+        final_cols = [c for c in DETAIL_COLUMNS if c in df_export.columns]
+        return df_export[final_cols].sort_values(by='pnl_pct', ascending=False)
+
     def generate(self, output_path: str):
-        """Создает и сохраняет Excel-отчет с двумя листами."""
+        """
+        Создает и сохраняет Excel-отчет (сводка, детализация, опционально Монте-Карло и сделки).
+        Все листы пишутся построчно, поэтому в режиме constant_memory отчет не держится в памяти.
+        """
         try:
-            with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-                workbook = writer.book
-
+            workbook = xlsxwriter.Workbook(output_path, {
+                'constant_memory': self.constant_memory,
+                'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+                'remove_timezone': True,
+            })
+            try:
                 # --- Стили ---
                 header_format = workbook.add_format({'bold': True, 'font_size': 14, 'bg_color': '#DDEBF7', 'border': 1})
                 subheader_format = workbook.add_format({'bold': True, 'bg_color': '#F2F2F2', 'border': 1})
@@ -123,9 +233,7 @@ class ExcelReportGenerator:
                 # Таблица метрик
                 curr_row += 2
                 summary_sheet.write(f'A{curr_row}', "Ключевые показатели", subheader_format)
-
-                # Пишем таблицу сводки вручную или через pandas (через pandas проще)
-                summary_df.to_excel(writer, sheet_name='Сводка', index=False, startrow=curr_row, header=False)
+                _write_rows(summary_sheet, summary_df, curr_row, self.chunk_rows)
 
                 # Форматирование колонок сводки
                 summary_sheet.set_column('A:A', 35)
@@ -134,54 +242,12 @@ class ExcelReportGenerator:
                 # ==========================================
                 # ЛИСТ 2: ДЕТАЛИЗАЦИЯ (Detailed)
                 # ==========================================
+                df_export = self._detail_table()
+                details_sheet = workbook.add_worksheet('Детализация')
 
-                # 1. Подготовка данных
-                df_export = self.results_df.copy()
-
-                # Добавляем полезную метрику: Средний PnL на сделку
-                # (защита от деления на ноль)
-                df_export['avg_trade_pnl'] = df_export.apply(
-                    lambda x: x['pnl_abs'] / x['total_trades'] if x['total_trades'] > 0 else 0, axis=1
-                )
-
-                # Переименование для красоты
-                rename_map = {
-                    'instrument': 'Инструмент',
-                    'pnl_pct': 'PnL (%)',
-                    'pnl_abs': 'PnL (абс.)',
-                    'pnl_bh_pct': 'B&H (%)',
-                    'avg_trade_pnl': 'Ср. PnL сделки',
-                    'total_trades': 'Сделок',
-                    'win_rate': 'Win Rate',
-                    'profit_factor': 'PF',
-                    'max_drawdown': 'Max DD (%)',
-                    'sharpe_ratio': 'Sharpe',
-                    'calmar_ratio': 'Calmar'
-                }
-                df_export.rename(columns=rename_map, inplace=True)
-
-                # 2. ЖЕСТКИЙ ПОРЯДОК КОЛОНОК (Инструмент - ПЕРВЫЙ)
-                cols_order = [
-                    'Инструмент',
-                    'PnL (%)', 'PnL (абс.)', 'B&H (%)',
-                    'Ср. PnL сделки', 'Сделок', 'Win Rate', 'PF', 'Max DD (%)',
-                    'Sharpe', 'Calmar'
-                ]
-                # Оставляем только те, что есть в наличии (на всякий случай)
-                final_cols = [c for c in cols_order if c in df_export.columns]
-                df_export = df_export[final_cols]
-
-                # 3. Сортировка по PnL % (от лучших к худшим)
-                df_export.sort_values(by='PnL (%)', ascending=False, inplace=True)
-
-                # 4. Запись в Excel
-                df_export.to_excel(writer, sheet_name='Детализация', index=False)
-                details_sheet = writer.sheets['Детализация']
-
-                # 5. Форматирование колонок
-                # Заголовки
-                for col_num, value in enumerate(df_export.columns.values):
-                    details_sheet.write(0, col_num, value, subheader_format)
+                # Заголовки (переименование для красоты)
+                details_sheet.write_row(0, 0, [DETAIL_COLUMNS[c] for c in df_export.columns], subheader_format)
+                _write_rows(details_sheet, df_export, 1, self.chunk_rows)
 
                 # Ширина
                 details_sheet.set_column('A:A', 15, None)  # Инструмент
@@ -198,13 +264,117 @@ class ExcelReportGenerator:
                 details_sheet.set_column(8, 8, 10, percent_format)  # Max DD
 
                 # Условное форматирование (Зеленый/Красный) для PnL % (Колонка B)
-                # B2:B1000
                 details_sheet.conditional_format(1, 1, len(df_export), 1,
                                                  {'type': 'cell', 'criteria': '>', 'value': 0, 'format': green_fmt})
                 details_sheet.conditional_format(1, 1, len(df_export), 1,
                                                  {'type': 'cell', 'criteria': '<', 'value': 0, 'format': red_fmt})
 
+                # ==========================================
+                # ЛИСТ 3: МОНТЕ-КАРЛО (опционально)
+                # ==========================================
+                if self.monte_carlo is not None:
+                    self._write_monte_carlo_sheet(workbook, header_format, subheader_format, default_format)
+
+                # ==========================================
+                # ЛИСТ 4: СДЕЛКИ (опционально)
+                # ==========================================
+                if self.trades_sheet and self.trades_source is not None:
+                    self._write_trades_sheets(workbook, subheader_format)
+            finally:
+                workbook.close()
+
             logger.info(f"Excel-отчет успешно сохранен в: {output_path}")
 
         except Exception as e:
-            logger.error(f"Не удалось сгенерировать Excel-отчет: {e}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Не удалось сгенерировать Excel-отчет: {e}", exc_info=True)
+
+        if self.companion_format:
+            self._export_companion(output_path)
+
+    def _write_trades_sheets(self, workbook, subheader_format):
+        """
+        Пишет сделки всех инструментов пачками по мере чтения из trades_source.
+        При достижении предела строк Excel продолжает на листах 'Сделки 2', 'Сделки 3' и т.д.
+        """
+        columns: Optional[List[str]] = None
+        sheet, sheet_count, row_num = None, 0, EXCEL_MAX_ROWS
+
+        for trades in self.trades_source():
+            if columns is None:
+                columns = list(trades.columns)
+            trades = trades.reindex(columns=columns)
+            for start in range(0, len(trades), self.chunk_rows):
+                chunk = trades.iloc[start:start + self.chunk_rows]
+                while len(chunk):
+                    if row_num >= EXCEL_MAX_ROWS:
+                        sheet_count += 1
+                        sheet = workbook.add_worksheet('Сделки' if sheet_count == 1 else f'Сделки {sheet_count}')
+                        sheet.write_row(0, 0, columns, subheader_format)
+                        sheet.set_column(0, len(columns) - 1, 18)
+                        row_num = 1
+                    fits = EXCEL_MAX_ROWS - row_num
+                    row_num = _write_rows(sheet, chunk.iloc[:fits], row_num, self.chunk_rows)
+                    chunk = chunk.iloc[fits:]
+
+    def _export_companion(self, output_path: str) -> None:
+        """
+        Сохраняет рядом с отчетом таблицу детализации (<имя>_summary) и, если есть источник
+        сделок, все сделки (<имя>_trades) в Parquet или CSV. Сделки пишутся пачками.
+        """
+        base_path = os.path.splitext(output_path)[0]
+        extension = self.companion_format
+        try:
+            summary_path = f"{base_path}_summary.{extension}"
+            if extension == "parquet":
+                self._detail_table().to_parquet(summary_path, index=False)
+            else:
+                self._detail_table().to_csv(summary_path, index=False)
+
+            if self.trades_source is not None:
+                trades_path = f"{base_path}_trades.{extension}"
+                writer, schema, columns = None, None, None
+                try:
+                    for trades in self.trades_source():
+                        # Колонки всех пачек приводятся к первой, чтобы файл имел единую схему
+                        columns = columns or list(trades.columns)
+                        trades = trades.reindex(columns=columns)
+                        if extension == "csv":
+                            trades.to_csv(trades_path, index=False, mode="w" if writer is None else "a",
+                                          header=writer is None)
+                            writer = trades_path
+                            continue
+                        if writer is None:
+                            schema = pa.Table.from_pandas(trades, preserve_index=False).schema
+                            writer = pq.ParquetWriter(trades_path, schema)
+                        writer.write_table(pa.Table.from_pandas(trades, schema=schema, preserve_index=False))
+                finally:
+                    if isinstance(writer, pq.ParquetWriter):
+                        writer.close()
+
+            logger.info(f"Сопутствующая выгрузка ({extension}) сохранена рядом с отчетом: {base_path}_*.{extension}")
+        except Exception as e:
+            logger.error(f"Не удалось сохранить сопутствующую выгрузку: {e}", exc_info=True)
+
+    def _write_monte_carlo_sheet(self, workbook, header_format, subheader_format, number_format):
+        """Пишет лист с доверительными интервалами Монте-Карло по сделкам портфеля."""
+        attrs = self.monte_carlo.attrs
+        sheet = workbook.add_worksheet('Монте-Карло')
+        sheet.write('A1', "Монте-Карло по сделкам портфеля", header_format)
+        sheet.write('A2', f"Симуляций: {attrs.get('n_simulations', 0)} | Метод: {attrs.get('method', '')} | "
+                          f"Уровень доверия: {attrs.get('confidence', 0.9) * 100:.0f}%")
+        sheet.write('A3', "Вероятность убытка (%)")
+        sheet.write('B3', attrs.get('probability_of_loss', 0) * 100, number_format)
+
+        labels = {'final_pnl': 'Итоговый PnL (абс.)', 'max_drawdown': 'Макс. просадка', 'sharpe_ratio': 'Sharpe'}
+        headers = ['Метрика', 'Факт', 'Среднее', 'Нижняя граница', 'Медиана', 'Верхняя граница']
+        for col_num, value in enumerate(headers):
+            sheet.write(4, col_num, value, subheader_format)
+        for row_num, (metric, row) in enumerate(self.monte_carlo.iterrows(), start=5):
+            sheet.write(row_num, 0, labels.get(metric, metric))
+            for col_num, column in enumerate(('observed', 'mean', 'lower', 'median', 'upper'), start=1):
+                value = row[column]
+                if np.isfinite(value):
+                    sheet.write_number(row_num, col_num, value, number_format)
+
+        sheet.set_column('A:A', 25)
+        sheet.set_column('B:F', 16)
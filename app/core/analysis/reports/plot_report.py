@@ -8,10 +8,12 @@ from matplotlib import pyplot as plt
 import matplotlib.ticker as ticker
 
 from app.core.analysis.constants import METRIC_CONFIG
+from app.core.analysis.downsample import downsample_indices
 from app.shared.primitives import ExchangeType
 from app.shared.config import config
 
 EXCHANGE_SPECIFIC_CONFIG = config.EXCHANGE_SPECIFIC_CONFIG
+CHARTS_CONFIG = config.BACKTEST_CONFIG["CHARTS"]
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +32,12 @@ class PlotReportGenerator:
                  initial_capital: float,
                  report_filename: str,
                  report_dir: str,
-                 metadata: Dict[str, str]):
+                 metadata: Dict[str, str],
+                 rolling_metrics: Optional[pd.DataFrame] = None):
+        """
+        :param rolling_metrics: Скользящие метрики по сделкам (см. analysis/rolling.py).
+                                Если переданы, под кривой капитала строятся панели режимов.
+        """
 
         self.portfolio_metrics = portfolio_metrics
         self.benchmark_metrics = benchmark_metrics
@@ -40,6 +47,9 @@ class PlotReportGenerator:
         self.report_filename = report_filename
         self.report_dir = report_dir
         self.metadata = metadata
+        self.rolling_metrics = rolling_metrics
+        self.max_points = CHARTS_CONFIG["MAX_POINTS"]
+        self.downsample_method = CHARTS_CONFIG["METHOD"]
         os.makedirs(self.report_dir, exist_ok=True)
 
     def _format_metrics_for_display(self) -> Dict[str, str]:
@@ -69,6 +79,37 @@ class PlotReportGenerator:
             "Total Trades": int(self.portfolio_metrics.get('total_trades', 0))
         }
 
+    def _thin(self, x: np.ndarray, y: np.ndarray, keep: np.ndarray = None) -> tuple:
+        """
+        Прореживает линию до MAX_POINTS точек с сохранением экстремумов (см. analysis/downsample.py).
+
+        :param keep: Номера точек, которые должны остаться точными (например, бары сделок).
+        """
+        indices = downsample_indices(y, self.max_points, self.downsample_method, x=x, keep=keep)
+        return x[indices], y[indices]
+
+    def _plot_rolling_metrics(self, ax_sharpe, ax_drawdown, full_time_index: pd.Index):
+        """Рисует скользящие Sharpe, win rate и просадку на той же оси без разрывов, что и капитал."""
+        rolling = self.rolling_metrics
+        # Время выхода сделки -> номер свечи на общей оси
+        x = np.clip(full_time_index.searchsorted(rolling.index), 0, len(full_time_index) - 1)
+
+        ax_sharpe.plot(*self._thin(x, rolling['sharpe_ratio'].to_numpy()), color='purple', lw=1.2, label='Rolling Sharpe')
+        ax_sharpe.axhline(0, color='black', lw=0.8, alpha=0.5)
+        ax_sharpe.set_ylabel("Sharpe")
+        ax_win_rate = ax_sharpe.twinx()
+        ax_win_rate.plot(*self._thin(x, rolling['win_rate'].to_numpy() * 100), color='orange', lw=1, alpha=0.8,
+                         label='Rolling Win Rate')
+        ax_win_rate.set_ylabel("Win Rate, %")
+        ax_win_rate.grid(False)
+        handles = ax_sharpe.get_legend_handles_labels()[0] + ax_win_rate.get_legend_handles_labels()[0]
+        ax_sharpe.legend(handles=handles, loc='upper left')
+
+        ax_drawdown.fill_between(*self._thin(x, -rolling['drawdown'].to_numpy() * 100), 0, color='red', alpha=0.4,
+                                 step='post', label='Rolling Drawdown')
+        ax_drawdown.set_ylabel("Drawdown, %")
+        ax_drawdown.legend(loc='lower left')
+
     def generate(self, wfo_results: Optional[Dict[str, float]] = None):
         """Создает и сохраняет графический отчет с устранением разрывов (Gaps)."""
         display_metrics = self._format_metrics_for_display()
@@ -86,7 +127,13 @@ class PlotReportGenerator:
             )
 
         plt.style.use('seaborn-v0_8-darkgrid')
-        fig, ax = plt.subplots(figsize=(15, 7))
+        has_rolling = self.rolling_metrics is not None and not self.rolling_metrics.empty
+        if has_rolling:
+            fig, (ax, ax_sharpe, ax_drawdown) = plt.subplots(
+                3, 1, figsize=(15, 11), sharex=True, gridspec_kw={'height_ratios': [3, 1, 1]}
+            )
+        else:
+            fig, ax = plt.subplots(figsize=(15, 7))
 
         # 1. Берем индекс бенчмарка как "эталонное время" (все свечи периода)
         # Если бенчмарка нет (ошибка данных), берем индекс стратегии
@@ -105,9 +152,13 @@ class PlotReportGenerator:
             aligned_portfolio_curve = aligned_portfolio_curve.fillna(self.initial_capital)
 
             portfolio_values = aligned_portfolio_curve.values
+            # Бары выхода из сделок (индекс скользящих метрик) при прореживании сохраняются точно
+            trade_bars = (full_time_index.searchsorted(self.rolling_metrics.index)
+                          if has_rolling else None)
         else:
             # Если сделок не было вообще, рисуем прямую линию начального капитала
             portfolio_values = np.full(len(full_time_index), self.initial_capital)
+            trade_bars = None
 
         # 3. Подготавливаем данные бенчмарка
         if not self.benchmark_equity_curve.empty:
@@ -115,15 +166,16 @@ class PlotReportGenerator:
         else:
             benchmark_values = np.array([])
 
-        # 4. Рисуем по индексам (0..N), чтобы скрыть выходные
+        # 4. Рисуем по индексам (0..N), чтобы скрыть выходные.
+        # Длинные ряды прореживаются: форма и экстремумы кривых сохраняются, а отрисовка не зависит от числа свечей
         x_indices = np.arange(len(full_time_index))
 
         if len(benchmark_values) > 0:
-            ax.plot(x_indices, benchmark_values, label='Buy & Hold Benchmark',
-                    color='gray', alpha=0.5, lw=1.5)
+            ax.plot(*self._thin(x_indices, np.asarray(benchmark_values, dtype=np.float64)),
+                    label='Buy & Hold Benchmark', color='gray', alpha=0.5, lw=1.5)
 
         if len(portfolio_values) > 0:
-            ax.plot(x_indices, portfolio_values,
+            ax.plot(*self._thin(x_indices, np.asarray(portfolio_values, dtype=np.float64), keep=trade_bars),
                     label='Strategy Equity Curve', color='blue', lw=2)
 
         # Используем полный индекс времени для подписей
@@ -131,12 +183,16 @@ class PlotReportGenerator:
             thisind = np.clip(int(x + 0.5), 0, len(full_time_index) - 1)
             return full_time_index[thisind].strftime('%Y-%m-%d')
 
-        ax.xaxis.set_major_formatter(ticker.FuncFormatter(format_date))
-        ax.xaxis.set_major_locator(ticker.MaxNLocator(nbins=10))
+        if has_rolling:
+            self._plot_rolling_metrics(ax_sharpe, ax_drawdown, full_time_index)
+
+        bottom_ax = ax_drawdown if has_rolling else ax
+        bottom_ax.xaxis.set_major_formatter(ticker.FuncFormatter(format_date))
+        bottom_ax.xaxis.set_major_locator(ticker.MaxNLocator(nbins=10))
 
         ax.set_title(f"Backtest Results: {self.metadata.get('strategy_name', 'N/A')} on {self.report_filename}",
                      fontsize=16)
-        ax.set_xlabel("Date")
+        bottom_ax.set_xlabel("Date")
         fig.autofmt_xdate()
         ax.set_ylabel("Capital")
         ax.legend()
@@ -0,0 +1,139 @@
+import logging
+from collections import deque
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from app.shared.config import config
+
+logger = logging.getLogger(__name__)
+
+ROLLING_METRICS = ("n_trades", "sharpe_ratio", "drawdown", "win_rate")
+
+Window = Union[int, str, pd.Timedelta]
+
+
+def parse_window(window: Window) -> Union[int, pd.Timedelta]:
+    """
+    Приводит окно к числу сделок (int) или к длительности (Timedelta).
+
+    :param window: Число сделок (50 или '50') либо длительность ('30D', '12h', Timedelta).
+    """
+    if isinstance(window, (int, np.integer)):
+        return int(window)
+    if isinstance(window, str) and window.strip().isdigit():
+        return int(window)
+    return pd.Timedelta(window)
+
+
+def window_starts(n: int, window: Window, times: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Номер первой сделки окна, заканчивающегося на каждой сделке.
+
+    Окно по сделкам — последние N сделок. Окно по времени, как в pandas rolling('30D'),
+    полуоткрытое: (t_i - window, t_i]. Начала окон не убывают, что и позволяет
+    считать все метрики инкрементально за один проход.
+
+    :param n: Количество сделок.
+    :param window: Окно (см. `parse_window`).
+    :param times: Время сделок по возрастанию (нужно для окна по времени).
+    """
+    window = parse_window(window)
+    if isinstance(window, int):
+        if window < 1:
+            raise ValueError(f"Окно скользящих метрик должно быть не меньше 1 сделки, получено {window}.")
+        return np.maximum(np.arange(n) - window + 1, 0)
+    if times is None:
+        raise ValueError("Для окна по времени нужно время сделок.")
+    times = pd.DatetimeIndex(times).asi8
+    return np.searchsorted(times, times - window.value, side='right')
+
+
+def window_sums(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Сумма values[starts[i]:i + 1] для каждого i через накопленную сумму — O(n)."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return cumulative[1:] - cumulative[starts]
+
+
+def window_max(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Максимум values[starts[i]:i + 1] монотонной очередью: каждый элемент
+    добавляется и удаляется не более одного раза, поэтому проход линейный.
+    """
+    # Списки Python в цикле заметно быстрее поэлементного доступа к массивам numpy
+    values_list = values.tolist()
+    result = [0.0] * len(values_list)
+    candidates = deque()
+    for i, (value, start) in enumerate(zip(values_list, starts.tolist())):
+        while candidates and values_list[candidates[-1]] <= value:
+            candidates.pop()
+        candidates.append(i)
+        while candidates[0] < start:
+            candidates.popleft()
+        result[i] = values_list[candidates[0]]
+    return np.asarray(result, dtype=np.float64)
+
+
+def rolling_trade_metrics(trades_df: pd.DataFrame,
+                          initial_capital: float,
+                          window: Optional[Window] = None,
+                          annualization_factor: int = 252) -> pd.DataFrame:
+    """
+    Скользящие метрики по журналу сделок для анализа режимов рынка.
+
+    Sharpe считается как в `trade_aggregates` на срезе сделок окна: по доходностям
+    капитала между соседними сделками окна (ddof=1). Просадка — текущее отклонение
+    капитала от его максимума в окне, win rate — доля прибыльных сделок окна.
+    Суммы считаются разностями накопленных сумм, максимум — монотонной очередью,
+    поэтому расчет линейный и не использует `rolling().apply`.
+
+    :param trades_df: DataFrame с колонками 'pnl' и 'exit_timestamp_utc'.
+    :param initial_capital: Начальный капитал.
+    :param window: Число сделок или длительность (None — BACKTEST_CONFIG["ROLLING_WINDOW"]).
+    :param annualization_factor: Коэффициент годовой нормализации Sharpe.
+    :return: DataFrame, индекс — время выхода сделки; колонки n_trades, sharpe_ratio,
+             drawdown (доля, >= 0), win_rate. Sharpe не определен (NaN), пока в окне меньше
+             трех сделок.
+    """
+    if window is None:
+        window = config.BACKTEST_CONFIG["ROLLING_WINDOW"]
+    if trades_df is None or trades_df.empty:
+        return pd.DataFrame(columns=list(ROLLING_METRICS), dtype=float)
+
+    trades = trades_df.sort_values('exit_timestamp_utc', kind='stable')
+    times = pd.to_datetime(trades['exit_timestamp_utc'])
+    pnl = trades['pnl'].to_numpy(dtype=np.float64)
+    n = len(pnl)
+    starts = window_starts(n, window, times.to_numpy())
+    counts = np.arange(1, n + 1) - starts
+
+    equity = initial_capital + np.cumsum(pnl)
+
+    # Доходность r_i (между сделками i-1 и i) входит в окно, если в нем обе сделки:
+    # окну [s, i] соответствуют доходности r_{s+1}..r_i
+    returns = np.zeros(n)
+    returns[1:] = equity[1:] / equity[:-1] - 1
+    returns_counts = counts - 1
+    # Центрирование по общему среднему снижает потерю точности в разности накопленных сумм
+    offset = returns[1:].mean() if n > 1 else 0.0
+    centered = returns - offset
+    centered[0] = 0.0
+    sums = window_sums(centered, starts + 1)
+    squares = window_sums(centered ** 2, starts + 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.maximum(squares - sums ** 2 / returns_counts, 0.0) / (returns_counts - 1)
+        returns_std = np.sqrt(variance)
+        returns_mean = sums / returns_counts + offset
+        sharpe = np.where(returns_std > 0, returns_mean / returns_std, 0.0) * np.sqrt(annualization_factor)
+    sharpe[returns_counts < 2] = np.nan
+
+    peak = window_max(equity, starts)
+    drawdown = np.abs(equity / peak - 1)
+    win_rate = window_sums((pnl > 0).astype(np.float64), starts) / counts
+
+    return pd.DataFrame(
+        {"n_trades": counts, "sharpe_ratio": sharpe, "drawdown": drawdown, "win_rate": win_rate},
+        index=pd.DatetimeIndex(times, name='exit_timestamp_utc')
+    )
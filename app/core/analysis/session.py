@@ -2,6 +2,8 @@ import pandas as pd
 from typing import Dict, Any, Optional
 
 from app.core.analysis.metrics import PortfolioMetricsCalculator, BenchmarkMetricsCalculator
+from app.core.analysis.monte_carlo import run_monte_carlo
+from app.core.analysis.rolling import rolling_trade_metrics
 from app.core.analysis.reports.plot_report import PlotReportGenerator
 from app.core.analysis.reports.console_report import ConsoleReportGenerator
 from app.shared.config import config
@@ -22,7 +24,8 @@ class AnalysisSession:
                  exchange: str,
                  interval: str,
                  risk_manager_type: str,
-                 strategy_name: str):
+                 strategy_name: str,
+                 equity_curve: Optional[pd.DataFrame] = None):
         """
         Инициализирует сессию анализа, сразу же производя все необходимые расчеты.
 
@@ -33,6 +36,8 @@ class AnalysisSession:
         :param interval: Таймфрейм.
         :param risk_manager_type: Тип используемого риск-менеджера.
         :param strategy_name: Имя стратегии.
+        :param equity_curve: Опциональная побарная кривая капитала от BacktestEngine.
+                             Если передана, на графике используется она вместо кривой по сделкам.
         """
         self.trades_df = trades_df
         self.historical_data = historical_data
@@ -48,10 +53,14 @@ class AnalysisSession:
 
         # --- Шаг 1: Расчет метрик ---
         annual_factor = EXCHANGE_SPECIFIC_CONFIG.get(exchange, {}).get("SHARPE_ANNUALIZATION_FACTOR", 252)
+        self.annual_factor = annual_factor
+        self.monte_carlo: Optional[pd.DataFrame] = None
 
         # 1.1 Рассчитываем метрики по сделкам нашей стратегии
-        portfolio_calc = PortfolioMetricsCalculator(trades_df, initial_capital, annual_factor)
+        portfolio_calc = PortfolioMetricsCalculator(trades_df, initial_capital, annual_factor, equity_curve)
         self.portfolio_metrics: Dict[str, Any] = portfolio_calc.calculate_all()
+        # Скользящие Sharpe, просадка и win rate для анализа режимов на графике
+        self.rolling_metrics = rolling_trade_metrics(trades_df, initial_capital, annualization_factor=annual_factor)
 
         # 1.2 Рассчитываем метрики для бенчмарка (Buy & Hold)
         benchmark_calc = BenchmarkMetricsCalculator(historical_data, initial_capital, annual_factor)
@@ -60,7 +69,10 @@ class AnalysisSession:
         # --- FIX START: Привязка кривых капитала к ВРЕМЕНИ (Datetime), а не к номеру строки ---
 
         # 1. Исправляем кривую стратегии
-        if portfolio_calc.is_valid:
+        if portfolio_calc.equity_curve is not None:
+            # Побарная кривая уже привязана ко времени и учитывает открытые позиции
+            self.portfolio_equity_curve = portfolio_calc.equity_curve.set_index('time')['equity']
+        elif portfolio_calc.is_valid:
             # Берем таблицу сделок из калькулятора
             temp_trades = portfolio_calc.trades.copy()
             # Убеждаемся, что время выхода - это datetime
@@ -82,6 +94,22 @@ class AnalysisSession:
         else:
             self.benchmark_equity_curve = pd.Series()
 
+    def run_monte_carlo(self, n_simulations: Optional[int] = None, method: Optional[str] = None,
+                        seed: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """
+        Оценивает устойчивость результата перемешиванием сделок (см. MonteCarloSimulator).
+        Сводка сохраняется в сессии и попадает в консольный отчет.
+
+        :param n_simulations: Число траекторий (None — из BACKTEST_CONFIG["MONTE_CARLO"]).
+        :param method: 'bootstrap' или 'shuffle' (None — из конфига).
+        :param seed: Зерно генератора (None — из конфига).
+        """
+        self.monte_carlo = run_monte_carlo(
+            self.trades_df, self.initial_capital, self.annual_factor,
+            n_simulations=n_simulations, method=method, seed=seed
+        )
+        return self.monte_carlo
+
     def generate_all_reports(self,
                              base_filename: str,
                              report_dir: str,
@@ -105,7 +133,8 @@ class AnalysisSession:
             initial_capital=self.initial_capital,
             report_filename=base_filename,
             report_dir=report_dir,
-            metadata=self.metadata
+            metadata=self.metadata,
+            rolling_metrics=self.rolling_metrics
         )
         plot_gen.generate(wfo_results=wfo_results)
 
@@ -115,6 +144,7 @@ class AnalysisSession:
                 portfolio_metrics=self.portfolio_metrics,
                 benchmark_metrics=self.benchmark_metrics,
                 metadata=self.metadata,
-                report_filename=base_filename
+                report_filename=base_filename,
+                monte_carlo=self.monte_carlo
             )
             console_gen.generate()
\ No newline at end of file
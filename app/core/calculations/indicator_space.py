@@ -0,0 +1,244 @@
+import itertools
+import logging
+import math
+from queue import Queue
+from typing import List, Dict, Any, Optional, Tuple, Type
+
+import pandas as pd
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.risk.manager import AVAILABLE_RISK_MANAGERS
+from app.shared.schemas import StrategyConfigModel
+
+logger = logging.getLogger(__name__)
+
+
+def requirement_key(requirement: Dict[str, Any]) -> Tuple:
+    """Хешируемый ключ требования к индикатору: имя и отсортированные параметры."""
+    return requirement.get("name"), tuple(sorted(requirement.get("params", {}).items()))
+
+
+class FeatureMatrix:
+    """
+    Предрасчитанные индикаторы одного среза данных.
+
+    Хранит все колонки индикаторов в одном DataFrame и карту "требование -> колонки",
+    чтобы FeatureEngine мог просто скопировать нужные колонки вместо повторного расчета.
+    """
+
+    def __init__(self, frame: pd.DataFrame, columns_by_requirement: Dict[Tuple, List[str]],
+                 first_time: Any, last_time: Any):
+        """
+        :param frame: Колонки индикаторов, построчно совпадающие с исходным срезом.
+        :param columns_by_requirement: Какие колонки создает каждое требование.
+        :param first_time: Время первой свечи среза (для проверки соответствия данных).
+        :param last_time: Время последней свечи среза.
+        """
+        self.frame = frame
+        self.columns_by_requirement = columns_by_requirement
+        self.first_time = first_time
+        self.last_time = last_time
+
+    def __len__(self) -> int:
+        return len(self.columns_by_requirement)
+
+    def matches(self, data: pd.DataFrame) -> bool:
+        """Проверяет, что DataFrame — это тот же срез, по которому построена матрица."""
+        return (
+            len(data) == len(self.frame)
+            and 'time' in data.columns
+            and data['time'].iloc[0] == self.first_time
+            and data['time'].iloc[-1] == self.last_time
+        )
+
+    def slice(self, start: int, end: int, data: pd.DataFrame) -> "FeatureMatrix":
+        """
+        Матрица для строк [start, end) исходного среза (view, без пересчета индикаторов).
+
+        Индикаторы причинные, поэтому для окна, начинающегося с первой строки,
+        срез совпадает с матрицей, построенной заново по этому окну.
+
+        :param start: Первая строка (включительно).
+        :param end: Последняя строка (не включительно).
+        :param data: Исходный срез, по которому построена матрица (нужен для границ по времени).
+        """
+        window_time = data['time'].iloc[start:end]
+        return FeatureMatrix(
+            frame=self.frame.iloc[start:end],
+            columns_by_requirement=self.columns_by_requirement,
+            first_time=window_time.iloc[0],
+            last_time=window_time.iloc[-1]
+        )
+
+    def assign(self, data: pd.DataFrame, requirement: Dict[str, Any]) -> bool:
+        """
+        Копирует в data колонки, соответствующие требованию.
+
+        :return: True, если требование найдено в матрице и колонки добавлены.
+        """
+        columns = self.columns_by_requirement.get(requirement_key(requirement))
+        if columns is None:
+            return False
+        for col in columns:
+            if col not in data.columns:
+                data[col] = self.frame[col].to_numpy()
+        return True
+
+
+class IndicatorSpace:
+    """
+    Пространство индикаторов, достижимых при оптимизации стратегии и риск-менеджера.
+
+    Перебирает значения оптимизируемых параметров из `params_config` и собирает все
+    требования к индикаторам, которые могут понадобиться trials. Параметры, влияющие
+    на одни и те же индикаторы (например, период и ширина Bollinger Bands),
+    перебираются совместно, независимые — по отдельности.
+    """
+
+    def __init__(self, strategy_class: Type, risk_manager_type: str, max_combinations: int = 1000):
+        """
+        :param strategy_class: Класс стратегии.
+        :param risk_manager_type: Тип риск-менеджера ('FIXED', 'ATR').
+        :param max_combinations: Лимит комбинаций в одной группе связанных параметров.
+                                 При превышении группа перебирается по одному параметру.
+        """
+        self.strategy_class = strategy_class
+        self.risk_manager_type = risk_manager_type
+        self.max_combinations = max_combinations
+        self.requirements = self._enumerate()
+
+    @staticmethod
+    def _full_config(cls) -> Dict[str, Dict[str, Any]]:
+        full_config = {}
+        for base in reversed(cls.__mro__):
+            if hasattr(base, 'params_config'):
+                full_config.update(base.params_config)
+        return full_config
+
+    @staticmethod
+    def _param_grid(param_config: Dict[str, Any]) -> List[Any]:
+        """
+        Значения, которые Optuna может предложить для параметра.
+        Для float с шагом значения считаются так же, как в Optuna: low + k * step.
+        """
+        low, high = param_config["low"], param_config["high"]
+        if param_config["type"] == "int":
+            return list(range(low, high + 1, param_config.get("step", 1)))
+        step = param_config.get("step")
+        if param_config["type"] == "float" and step:
+            n_steps = int(math.floor((high - low) / step + 1e-9))
+            return [k * step + low for k in range(n_steps + 1)]
+        return []
+
+    def _requirements_for(self, strategy_params: Dict[str, Any], rm_params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        strategy_config = StrategyConfigModel(
+            strategy_name=self.strategy_class.__name__,
+            instrument="_",
+            exchange="_",
+            interval="1hour",
+            params=strategy_params,
+            risk_manager_type=self.risk_manager_type,
+            risk_manager_params=rm_params
+        )
+        strategy = self.strategy_class(events_queue=Queue(), feature_engine=None, config=strategy_config)
+        return list(strategy.required_indicators)
+
+    def _enumerate(self) -> List[Dict[str, Any]]:
+        strategy_config = self._full_config(self.strategy_class)
+        rm_config = self._full_config(AVAILABLE_RISK_MANAGERS[self.risk_manager_type])
+        defaults = {
+            "strategy": {name: c["default"] for name, c in strategy_config.items()},
+            "rm": {name: c["default"] for name, c in rm_config.items()},
+        }
+
+        def requirements_with(overrides: Dict[Tuple[str, str], Any]) -> Optional[List[Dict[str, Any]]]:
+            params = {"strategy": dict(defaults["strategy"]), "rm": dict(defaults["rm"])}
+            for (scope, name), value in overrides.items():
+                params[scope][name] = value
+            try:
+                return self._requirements_for(params["strategy"], params["rm"])
+            except Exception:
+                return None
+
+        base = requirements_with({}) or []
+        base_keys = [requirement_key(r) for r in base]
+
+        # 1. Для каждого параметра находим, какие требования (по позиции) он меняет
+        grids: Dict[Tuple[str, str], List[Any]] = {}
+        slots: Dict[Tuple[str, str], set] = {}
+        for scope, scope_config in (("strategy", strategy_config), ("rm", rm_config)):
+            for name, param_config in scope_config.items():
+                if not param_config.get("optimizable", False):
+                    continue
+                grid = self._param_grid(param_config)
+                changed = set()
+                for value in grid:
+                    variant = requirements_with({(scope, name): value})
+                    if variant is None:
+                        continue
+                    keys = [requirement_key(r) for r in variant]
+                    if len(keys) != len(base_keys):
+                        changed.add("*")
+                    else:
+                        changed.update(i for i, (a, b) in enumerate(zip(keys, base_keys)) if a != b)
+                if changed:
+                    grids[(scope, name)] = grid
+                    slots[(scope, name)] = changed
+
+        # 2. Объединяем в группы параметры, влияющие на общие требования
+        groups: List[Tuple[List[Tuple[str, str]], set]] = []
+        for param, param_slots in slots.items():
+            merged_params, merged_slots = [param], set(param_slots)
+            for group in list(groups):
+                if "*" in merged_slots or "*" in group[1] or merged_slots & group[1]:
+                    merged_params.extend(group[0])
+                    merged_slots |= group[1]
+                    groups.remove(group)
+            groups.append((merged_params, merged_slots))
+
+        # 3. Перебираем комбинации внутри групп и собираем уникальные требования
+        unique: Dict[Tuple, Dict[str, Any]] = {requirement_key(r): r for r in base}
+        for group_params, _ in groups:
+            n_combinations = math.prod(len(grids[p]) for p in group_params)
+            if n_combinations <= self.max_combinations:
+                combinations = (
+                    dict(zip(group_params, values))
+                    for values in itertools.product(*(grids[p] for p in group_params))
+                )
+            else:
+                logger.warning(f"IndicatorSpace: группа параметров {[p[1] for p in group_params]} дает "
+                               f"{n_combinations} комбинаций, перебираем параметры по отдельности.")
+                combinations = ({p: v} for p in group_params for v in grids[p])
+
+            for overrides in combinations:
+                for req in requirements_with(overrides) or []:
+                    unique.setdefault(requirement_key(req), req)
+
+        return list(unique.values())
+
+    def build(self, data: pd.DataFrame, feature_engine: FeatureEngine) -> FeatureMatrix:
+        """
+        Рассчитывает все индикаторы пространства на срезе данных за один проход.
+
+        :param data: Срез данных инструмента (не изменяется).
+        :param feature_engine: Движок расчета индикаторов.
+        :return: Матрица предрасчитанных колонок.
+        """
+        work = data.copy()
+        columns_by_requirement: Dict[Tuple, List[str]] = {}
+        for req in self.requirements:
+            columns_before = list(work.columns)
+            feature_engine.add_required_features(work, [req])
+            new_columns = [c for c in work.columns if c not in columns_before]
+            # Требование, чьи колонки уже созданы другим требованием, не кэшируется:
+            # при trial оно будет рассчитано обычным способом
+            if new_columns:
+                columns_by_requirement[requirement_key(req)] = new_columns
+
+        feature_columns = [c for c in work.columns if c not in data.columns]
+        return FeatureMatrix(
+            frame=work[feature_columns],
+            columns_by_requirement=columns_by_requirement,
+            first_time=data['time'].iloc[0],
+            last_time=data['time'].iloc[-1]
+        )
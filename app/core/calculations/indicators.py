@@ -1,8 +1,11 @@
 import pandas as pd
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 import pandas_ta as ta
 
+if TYPE_CHECKING:
+    from app.core.calculations.indicator_space import FeatureMatrix
+
 logger = logging.getLogger(__name__)
 
 class FeatureEngine:
@@ -23,12 +26,22 @@ class FeatureEngine:
             "adx": self._calculate_adx,
         }
 
-    def add_required_features(self, data: pd.DataFrame, requirements: List[Dict[str, Any]]) -> pd.DataFrame:
+    def add_required_features(self, data: pd.DataFrame, requirements: List[Dict[str, Any]],
+                              precomputed: Optional["FeatureMatrix"] = None) -> pd.DataFrame:
         """
         Главный метод. Принимает DataFrame и список требований,
         добавляет в DataFrame только запрошенные индикаторы.
+
+        :param precomputed: Предрасчитанная матрица индикаторов для этого же среза данных (WFO).
+                            Найденные в ней индикаторы копируются, остальные рассчитываются.
         """
+        if precomputed is not None and not precomputed.matches(data):
+            precomputed = None
+
         for req in requirements:
+            if precomputed is not None and precomputed.assign(data, req):
+                continue
+
             indicator_name = req.get("name")
             params = req.get("params", {})
 
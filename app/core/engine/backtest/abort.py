@@ -0,0 +1,50 @@
+from typing import Dict, Any, Optional
+
+from app.core.portfolio.equity import EquityCurveRecorder
+
+
+class EarlyAbortMonitor:
+    """
+    Критерии досрочной остановки бэктеста при оптимизации.
+
+    Trial, который уже потерял большую часть капитала или почти не торгует,
+    не имеет шансов стать лучшим, поэтому симуляцию можно прервать, не дожидаясь конца окна.
+    Нулевое значение критерия означает, что он выключен.
+    """
+
+    def __init__(self, rules: Dict[str, Any], n_bars: int, initial_capital: float):
+        """
+        :param rules: Словарь критериев:
+                      - 'max_drawdown': предельная просадка по переоценке (доля, например 0.6);
+                      - 'capital_floor': минимальный капитал как доля начального;
+                      - 'min_trades': минимум закрытых сделок к контрольной точке;
+                      - 'min_trades_deadline': контрольная точка как доля баров окна.
+        :param n_bars: Количество баров в симуляции.
+        :param initial_capital: Начальный капитал.
+        """
+        self.max_drawdown = rules.get("max_drawdown") or 0.0
+        self.capital_floor = (rules.get("capital_floor") or 0.0) * initial_capital
+        self.min_trades = rules.get("min_trades") or 0
+        self.deadline_bar = int(n_bars * (rules.get("min_trades_deadline") or 0.5))
+
+    @classmethod
+    def from_rules(cls, rules: Optional[Dict[str, Any]], n_bars: int,
+                   initial_capital: float) -> Optional["EarlyAbortMonitor"]:
+        """Создает монитор, если хотя бы один критерий включен, иначе возвращает None."""
+        if not rules or not any(rules.get(k) for k in ("max_drawdown", "capital_floor", "min_trades")):
+            return None
+        return cls(rules, n_bars, initial_capital)
+
+    def check(self, bar_index: int, recorder: EquityCurveRecorder, closed_trades: int) -> Optional[str]:
+        """
+        Проверяет критерии после переоценки портфеля на баре.
+
+        :return: Причина остановки или None, если симуляцию можно продолжать.
+        """
+        if self.max_drawdown and recorder.max_drawdown >= self.max_drawdown:
+            return f"max_drawdown {recorder.max_drawdown:.2%} >= {self.max_drawdown:.2%}"
+        if self.capital_floor and recorder.last_equity <= self.capital_floor:
+            return f"capital {recorder.last_equity:.2f} <= {self.capital_floor:.2f}"
+        if self.min_trades and bar_index == self.deadline_bar and closed_trades < self.min_trades:
+            return f"trades {closed_trades} < {self.min_trades} at bar {bar_index}"
+        return None
@@ -0,0 +1,174 @@
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.analysis.metrics import PortfolioMetricsCalculator
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.core.execution.simulator import SimulatedExecutionHandler
+from app.shared.config import config
+from app.shared.primitives import TradeDirection
+
+logger = logging.getLogger(__name__)
+
+
+class CostSensitivitySweep:
+    """
+    Анализ чувствительности результата бэктеста к комиссии и проскальзыванию.
+
+    Режим 'approx': бэктест прогоняется один раз с журналом исполнений (идеальные цены,
+    объемы, объем свечи). Затем цены исполнения, комиссии и PnL пересчитываются векторно
+    для всей сетки (commission_rate x impact_coefficient) по формулам SimulatedExecutionHandler.
+    Зависимость размера позиции от капитала учитывается масштабированием объемов, но моменты
+    сделок считаются неизменными, хотя уровни SL/TP зависят от цены входа с проскальзыванием,
+    а исчерпание капитала может отменить сделку. Поэтому таблица помечается как приближенная.
+
+    Режим 'exact': для каждой точки сетки выполняется полный бэктест.
+    """
+
+    def __init__(self, settings: Dict[str, Any], feature_engine: FeatureEngine):
+        """
+        :param settings: Настройки BacktestEngine для базового прогона.
+        :param feature_engine: Сервис расчета индикаторов.
+        """
+        self.settings = settings
+        self.feature_engine = feature_engine
+        self.annualization_factor = config.EXCHANGE_SPECIFIC_CONFIG.get(
+            settings["exchange"], {}
+        ).get("SHARPE_ANNUALIZATION_FACTOR", 252)
+        self.slippage_enabled = (
+            self.settings.get("slippage_config") or config.BACKTEST_CONFIG["SLIPPAGE_CONFIG"]
+        ).get("ENABLED", False)
+        self._trades: Optional[Dict[str, Any]] = None
+        self.base_trades_df: Optional[pd.DataFrame] = None
+
+    def _run_engine(self, overrides: Dict[str, Any]) -> Tuple[BacktestEngine, Dict[str, Any]]:
+        engine = BacktestEngine({**self.settings, **overrides}, queue.Queue(), self.feature_engine)
+        results = engine.run()
+        if results["status"] != "success":
+            raise RuntimeError(f"Бэктест завершился с ошибкой: {results.get('message')}")
+        return engine, results
+
+    def record(self) -> None:
+        """Выполняет базовый прогон и собирает журнал исполнений в пары вход/выход."""
+        engine, results = self._run_engine({"record_fills": True})
+        fills = engine.components['execution_handler'].fill_log
+
+        # Позиция по инструменту одна, поэтому исполнения чередуются: вход, выход, вход, ...
+        n_closed = len(fills) // 2
+        entries, exits = fills[0:2 * n_closed:2], fills[1:2 * n_closed:2]
+
+        self._trades = {
+            "sign": np.array([1.0 if f["direction"] == TradeDirection.BUY else -1.0 for f in entries]),
+            "quantity": np.array([f["quantity"] for f in entries], dtype=float),
+            "entry_ideal": np.array([f["ideal_price"] for f in entries], dtype=float),
+            "exit_ideal": np.array([f["ideal_price"] for f in exits], dtype=float),
+            "entry_volume": np.array([f["candle_volume"] for f in entries], dtype=float),
+            "exit_volume": np.array([f["candle_volume"] for f in exits], dtype=float),
+            "entry_timestamp_utc": [f["timestamp"] for f in entries],
+            "exit_timestamp_utc": [f["timestamp"] for f in exits],
+            "base_pnl": results["trades_df"]["pnl"].to_numpy() if n_closed else np.array([]),
+        }
+        self.base_trades_df = results["trades_df"]
+        logger.info(f"Журнал исполнений записан: {n_closed} закрытых сделок.")
+
+    def _slippage(self, impact: np.ndarray, quantity: np.ndarray, volume: float) -> np.ndarray:
+        """Доля проскальзывания по формуле SimulatedExecutionHandler (аргументы транслируются numpy)."""
+        if not self.slippage_enabled or volume <= 0:
+            return np.zeros(np.broadcast(impact, quantity).shape)
+        volume_ratio = np.minimum(quantity / volume, 1.0)
+        return np.minimum(impact * volume_ratio ** 0.5, SimulatedExecutionHandler.MAX_SLIPPAGE_PERCENT)
+
+    def pnl_grid(self, commission_rates: Sequence[float], impact_coefficients: Sequence[float]) -> np.ndarray:
+        """
+        Векторно (по всей сетке сразу) пересчитывает PnL сделок для сетки издержек.
+
+        Размер позиции у риск-сайзера пропорционален капиталу, поэтому объем каждой сделки
+        масштабируется отношением капитала в точке сетки к капиталу базового прогона на момент входа.
+        Округление до лота и лимит экспозиции не учитываются.
+
+        :return: Массив формы (len(commission_rates), len(impact_coefficients), n_trades).
+        """
+        if self._trades is None:
+            self.record()
+        t = self._trades
+        commissions = np.asarray(commission_rates, dtype=float)[:, None]
+        impacts = np.asarray(impact_coefficients, dtype=float)[None, :]
+        initial_capital = self.settings["initial_capital"]
+
+        n_trades = len(t["quantity"])
+        base_capital = initial_capital + np.concatenate(([0.0], np.cumsum(t["base_pnl"])[:-1]))
+        capital = np.full((commissions.shape[0], impacts.shape[1]), float(initial_capital))
+        pnl = np.empty(capital.shape + (n_trades,))
+
+        for k in range(n_trades):
+            sign = t["sign"][k]
+            quantity = t["quantity"][k] * np.maximum(capital, 0.0) / base_capital[k]
+
+            # Вход в направлении сделки, выход — в обратном
+            entry_price = t["entry_ideal"][k] * (1 + sign * self._slippage(impacts, quantity, t["entry_volume"][k]))
+            exit_price = t["exit_ideal"][k] * (1 - sign * self._slippage(impacts, quantity, t["exit_volume"][k]))
+
+            gross_pnl = sign * (exit_price - entry_price) * quantity
+            pnl[:, :, k] = gross_pnl - (entry_price + exit_price) * quantity * commissions
+            capital = capital + pnl[:, :, k]
+
+        return pnl
+
+    def sweep(self,
+              commission_rates: Sequence[float],
+              impact_coefficients: Sequence[float],
+              mode: str = "approx") -> pd.DataFrame:
+        """
+        Строит таблицу чувствительности метрик к издержкам.
+
+        :param commission_rates: Значения комиссии.
+        :param impact_coefficients: Значения коэффициента влияния на цену (проскальзывание).
+        :param mode: 'approx' — векторный пересчет по журналу, 'exact' — полный бэктест в каждой точке.
+        :return: DataFrame: commission_rate, impact_coefficient и метрики из METRIC_CONFIG.
+                 attrs['approximate'] показывает, учтены ли зависящие от пути эффекты.
+        """
+        if mode == "exact":
+            table = self._sweep_exact(commission_rates, impact_coefficients)
+        elif mode == "approx":
+            table = self._sweep_approx(commission_rates, impact_coefficients)
+        else:
+            raise ValueError(f"Неизвестный режим анализа издержек: {mode}")
+        table.attrs['approximate'] = mode == "approx"
+        return table
+
+    def _sweep_approx(self, commission_rates: Sequence[float], impact_coefficients: Sequence[float]) -> pd.DataFrame:
+        pnl = self.pnl_grid(commission_rates, impact_coefficients)
+        t = self._trades
+        initial_capital = self.settings["initial_capital"]
+
+        rows: List[Dict[str, Any]] = []
+        for i, commission_rate in enumerate(commission_rates):
+            for j, impact in enumerate(impact_coefficients):
+                trades_df = pd.DataFrame({
+                    "pnl": pnl[i, j],
+                    "entry_timestamp_utc": t["entry_timestamp_utc"],
+                    "exit_timestamp_utc": t["exit_timestamp_utc"],
+                })
+                metrics = PortfolioMetricsCalculator(trades_df, initial_capital, self.annualization_factor).calculate_all()
+                rows.append({"commission_rate": commission_rate, "impact_coefficient": impact, **metrics})
+        return pd.DataFrame(rows)
+
+    def _sweep_exact(self, commission_rates: Sequence[float], impact_coefficients: Sequence[float]) -> pd.DataFrame:
+        grid = [(c, i) for c in commission_rates for i in impact_coefficients]
+
+        def run_point(point):
+            commission_rate, impact = point
+            _, results = self._run_engine({
+                "commission_rate": commission_rate,
+                "slippage_config": {"ENABLED": self.slippage_enabled, "IMPACT_COEFFICIENT": impact},
+            })
+            return {"commission_rate": commission_rate, "impact_coefficient": impact, **results["metrics"]}
+
+        with ThreadPoolExecutor() as executor:
+            rows = list(executor.map(run_point, grid))
+        return pd.DataFrame(rows)
@@ -9,13 +9,19 @@ class BacktestDataFeed(IDataFeed):
     как будто она работает в Live-режиме.
     """
 
-    def __init__(self, data: pd.DataFrame, interval: str):
+    def __init__(self, data: pd.DataFrame, interval: str, copy_on_write: bool = False):
         """
         :param data: Полный DataFrame с историческими данными (уже предобработанный).
         :param interval: Таймфрейм (например, '5min').
+        :param copy_on_write: Фид работает внутри движка с включенным Copy-on-Write.
         """
-        self._data = data.reset_index(drop=True)
+        index = data.index
+        if isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+            self._data = data
+        else:
+            self._data = data.reset_index(drop=True)
         self._interval = interval
+        self._copy_on_write = copy_on_write
         self._current_index = -1
         self._max_index = len(self._data) - 1
 
@@ -43,6 +49,8 @@ class BacktestDataFeed(IDataFeed):
         """
         Возвращает срез данных [current - length + 1 : current + 1].
         То есть последние N свечей, заканчивая текущей.
+        При включенном Copy-on-Write срез не копируется: изменения на стороне
+        стратегии все равно не дойдут до данных фида.
         """
         if self._current_index < 0:
             return pd.DataFrame()
@@ -50,4 +58,5 @@ class BacktestDataFeed(IDataFeed):
         start_index = max(0, self._current_index - length + 1)
         end_index = self._current_index + 1
 
-        return self._data.iloc[start_index:end_index].copy()
\ No newline at end of file
+        history = self._data.iloc[start_index:end_index]
+        return history if self._copy_on_write else history.copy()
\ No newline at end of file
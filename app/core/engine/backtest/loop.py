@@ -1,10 +1,14 @@
 import queue
 import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
 
 from app.shared.events import MarketEvent, SignalEvent, OrderEvent, FillEvent
 from app.core.portfolio.state import PortfolioState
+from app.core.portfolio.equity import EquityCurveRecorder
 from app.shared.schemas import StrategyConfigModel
 from app.core.portfolio.manager import Portfolio
 from app.infrastructure.feeds.local import HistoricLocalDataHandler
@@ -14,7 +18,11 @@ from app.core.risk.manager import AVAILABLE_RISK_MANAGERS
 from app.core.risk.monitor import RiskMonitor
 from app.core.execution.order_logic import OrderManager
 from app.core.portfolio.accounting import FillProcessor
+from app.core.analysis.metrics import OnlineMetricsAccumulator
 from app.core.engine.backtest.feeds import BacktestDataFeed
+from app.core.engine.backtest.profiling import PhaseProfiler, NullProfiler
+from app.core.engine.backtest.signal_cache import CachedSignals
+from app.core.engine.backtest.abort import EarlyAbortMonitor
 from app.core.calculations.indicators import FeatureEngine
 
 from app.strategies.base_strategy import BaseStrategy
@@ -24,6 +32,40 @@ from app.shared.config import config
 
 logger = logging.getLogger('backtester')
 
+_cow_lock = threading.Lock()
+_cow_depth = 0
+_cow_previous = None
+
+
+@contextmanager
+def _copy_on_write_scope(enabled: bool) -> Iterator[None]:
+    """
+    Включает Copy-on-Write в pandas на время работы движка.
+
+    Опция pandas глобальная, а бэктесты идут параллельно в потоках (trials Optuna, OOS-тесты),
+    поэтому используется счетчик: режим включает первый вошедший движок, а исходное значение
+    восстанавливает последний вышедший. Без счетчика выход одного движка выключил бы CoW
+    посреди подготовки данных другого.
+
+    :param enabled: False — движок работает с глубокими копиями и опцию не трогает.
+    """
+    global _cow_depth, _cow_previous
+    if not enabled:
+        yield
+        return
+    with _cow_lock:
+        if _cow_depth == 0:
+            _cow_previous = pd.options.mode.copy_on_write
+            pd.set_option("mode.copy_on_write", True)
+        _cow_depth += 1
+    try:
+        yield
+    finally:
+        with _cow_lock:
+            _cow_depth -= 1
+            if _cow_depth == 0:
+                pd.set_option("mode.copy_on_write", _cow_previous)
+
 
 class BacktestEngine:
     """
@@ -46,6 +88,14 @@ class BacktestEngine:
 
         self.components: Dict[str, Any] = {}
         self.pending_strategy_order: Optional[Any] = None
+        self.equity_recorder: Optional[EquityCurveRecorder] = None
+        self.abort_reason: Optional[str] = None
+
+        profiling_enabled = settings.get("profile", config.BACKTEST_CONFIG["PROFILING_ENABLED"])
+        self.profiler = PhaseProfiler() if profiling_enabled else NullProfiler()
+        # Срезы и производные DataFrame разделяют память с исходником до первой записи,
+        # поэтому подготовка данных не дублирует свечи на каждом шаге
+        self.copy_on_write = bool(settings.get("copy_on_write", config.BACKTEST_CONFIG["COPY_ON_WRITE"]))
 
     def _initialize_components(self) -> None:
         """
@@ -89,6 +139,15 @@ class BacktestEngine:
         risk_manager = rm_class(params=rm_params)
         position_sizer = FixedRiskSizer()
 
+        annual_factor = config.EXCHANGE_SPECIFIC_CONFIG.get(
+            self.settings["exchange"], {}
+        ).get("SHARPE_ANNUALIZATION_FACTOR", 252)
+        metrics_accumulator = OnlineMetricsAccumulator(
+            initial_capital=self.settings["initial_capital"],
+            annualization_factor=annual_factor
+        )
+        self.components['metrics_accumulator'] = metrics_accumulator
+
         risk_monitor = RiskMonitor(events_queue)
         order_manager = OrderManager(events_queue, risk_manager, position_sizer, instrument_info)
 
@@ -98,15 +157,17 @@ class BacktestEngine:
             interval=self.settings["interval"],
             strategy_name=strategy.name,
             risk_manager_name=risk_manager.__class__.__name__,
-            risk_manager_params=rm_params
+            risk_manager_params=rm_params,
+            metrics_accumulator=metrics_accumulator
         )
 
-        slippage_conf = config.BACKTEST_CONFIG.get("SLIPPAGE_CONFIG", {})
+        slippage_conf = self.settings.get("slippage_config") or config.BACKTEST_CONFIG.get("SLIPPAGE_CONFIG", {})
 
         execution_handler = SimulatedExecutionHandler(
             events_queue,
             commission_rate=self.settings["commission_rate"],
-            slippage_config=slippage_conf
+            slippage_config=slippage_conf,
+            record_fills=self.settings.get("record_fills", False)
         )
         self.components['execution_handler'] = execution_handler
 
@@ -144,7 +205,19 @@ class BacktestEngine:
             logger.error(f"Не удалось получить данные для бэктеста по инструменту {self.settings['instrument']}.")
             return None
 
-        enriched_data = strategy.process_data(raw_data.copy())
+        # При Copy-on-Write поверхностной копии достаточно: добавление колонок
+        # и фильтрация строк не затронут исходный срез (например, общий срез WFO).
+        enriched_data = strategy.process_data(
+            raw_data.copy(deep=not self.copy_on_write),
+            precomputed=self.settings.get("feature_matrix")
+        )
+
+        if self.settings.get("float32_features", config.BACKTEST_CONFIG["FLOAT32_FEATURES"]):
+            feature_columns = [
+                col for col in enriched_data.columns
+                if col not in raw_data.columns and enriched_data[col].dtype == np.float64
+            ]
+            enriched_data = enriched_data.astype({col: np.float32 for col in feature_columns})
 
         if len(enriched_data) < strategy.min_history_needed:
             logger.error(f"Ошибка: Недостаточно данных для запуска стратегии '{strategy.name}'. "
@@ -163,6 +236,7 @@ class BacktestEngine:
         events_queue = self.components['events_queue']
         portfolio = self.components['portfolio']
         execution_handler = self.components['execution_handler']
+        profiler = self.profiler
 
         while not events_queue.empty():
             try:
@@ -170,6 +244,8 @@ class BacktestEngine:
             except queue.Empty:
                 break
 
+            profiler.count('events')
+
             if isinstance(event, SignalEvent):
                 portfolio.on_signal(event)
 
@@ -177,15 +253,34 @@ class BacktestEngine:
                 if event.trigger_reason == 'SIGNAL':
                     self.pending_strategy_order = event
                 else:
+                    started = profiler.start()
                     execution_handler.execute_order(event, current_candle)
+                    profiler.stop('execute_order', started)
 
             elif isinstance(event, FillEvent):
                 portfolio.on_fill(event)
 
-    def _run_event_loop(self, enriched_data: pd.DataFrame) -> None:
+    def _trading_start_bar(self, enriched_data: pd.DataFrame) -> int:
+        """
+        Номер первого торгового бара.
+
+        Если задан 'trade_start_time', бары до него — только история (prefix lookback):
+        фид их отдает, но стратегия, портфель и кривая капитала их не видят.
+        """
+        trade_start_time = self.settings.get("trade_start_time")
+        if trade_start_time is None:
+            return 0
+        return int(enriched_data['time'].searchsorted(trade_start_time))
+
+    def _run_event_loop(self, enriched_data: pd.DataFrame,
+                        replay_signals: Optional[Dict[int, list]] = None) -> Optional[Dict[int, list]]:
         """
         Главный цикл симуляции.
         Использует BacktestDataFeed для эмуляции потока данных.
+
+        :param replay_signals: Сохраненные сигналы стратегии по номерам баров. Если переданы,
+                               стратегия не вызывается, а сигналы проигрываются из кэша.
+        :return: Сигналы, сгенерированные стратегией (если включен кэш сигналов и не было проигрывания).
         """
         logger.info("Запуск основного цикла обработки событий...")
 
@@ -193,12 +288,34 @@ class BacktestEngine:
         strategy = self.components['strategy']
         execution_handler = self.components['execution_handler']
         instrument = self.settings['instrument']
+        profiler = self.profiler
+        loop_started = profiler.start()
+
+        # 1. Инициализируем Фид и побарную кривую капитала
+        feed = BacktestDataFeed(data=enriched_data, interval=self.settings['interval'],
+                                copy_on_write=self.copy_on_write)
+        start_bar = self._trading_start_bar(enriched_data)
+        n_trading_bars = len(enriched_data) - start_bar
+        max_points = self.settings.get(
+            "equity_curve_max_points", config.BACKTEST_CONFIG["EQUITY_CURVE_MAX_POINTS"]
+        )
+        self.equity_recorder = EquityCurveRecorder(n_bars=n_trading_bars, max_points=max_points)
+
+        abort_monitor = EarlyAbortMonitor.from_rules(
+            self.settings.get("early_abort"), n_trading_bars, self.settings["initial_capital"]
+        )
+        closed_trades = portfolio.state.closed_trades
 
-        # 1. Инициализируем Фид
-        feed = BacktestDataFeed(data=enriched_data, interval=self.settings['interval'])
+        events_queue = self.events_queue
+        recorded_signals = {} if replay_signals is None and self.settings.get("signal_cache") is not None else None
+        bar_index = -1
 
         # 2. Крутим цикл, пока есть данные
         while feed.next():
+            bar_index += 1
+            if bar_index < start_bar:
+                # Разогрев: бар остается в истории фида, но не торгуется
+                continue
             current_candle = feed.get_current_candle()
 
             # Создаем событие рынка для Портфеля и Риск-менеджера
@@ -212,46 +329,114 @@ class BacktestEngine:
 
             # ФАЗА 1: ИСПОЛНЕНИЕ ОТЛОЖЕННЫХ ОРДЕРОВ (Начало свечи, цена Open)
             if self.pending_strategy_order:
+                started = profiler.start()
                 execution_handler.execute_order(self.pending_strategy_order, current_candle)
+                profiler.stop('execute_order', started)
                 self.pending_strategy_order = None
+
+                started = profiler.start()
                 self._process_queue(current_candle, phase='EXECUTION')
+                profiler.stop('process_queue', started)
 
             # ФАЗА 2: ПРОВЕРКА РИСКОВ (Внутри свечи, цены High/Low)
+            started = profiler.start()
             portfolio.update_market_price(market_event)
+            profiler.stop('update_market_price', started)
+
+            started = profiler.start()
             self._process_queue(current_candle, phase='EXECUTION')
+            profiler.stop('process_queue', started)
 
             # ФАЗА 3: АНАЛИЗ СТРАТЕГИИ (Конец свечи, цена Close)
-            strategy.on_candle(feed)
+            started = profiler.start()
+            if replay_signals is not None:
+                for signal in replay_signals.get(bar_index, ()):
+                    events_queue.put(signal)
+            else:
+                strategy.on_candle(feed)
+                # Очередь перед вызовом стратегии пуста, значит в ней только сигналы этого бара
+                if recorded_signals is not None and not events_queue.empty():
+                    recorded_signals[bar_index] = list(events_queue.queue)
+            profiler.stop('strategy_on_candle', started)
 
             # Если стратегия дала сигнал, он попадет в очередь.
+            started = profiler.start()
             self._process_queue(current_candle, phase='STRATEGY')
+            profiler.stop('process_queue', started)
 
+            # ФАЗА 4: ПЕРЕОЦЕНКА ПОРТФЕЛЯ (Mark-to-Market по цене Close)
+            started = profiler.start()
+            self.equity_recorder.record(
+                market_event.timestamp, portfolio.state, {instrument: current_candle['close']}
+            )
+            profiler.stop('mark_to_market', started)
+            profiler.count('bars')
+
+            # ФАЗА 5: ДОСРОЧНАЯ ОСТАНОВКА (только при оптимизации)
+            if abort_monitor is not None:
+                self.abort_reason = abort_monitor.check(bar_index - start_bar, self.equity_recorder,
+                                                        len(closed_trades))
+                if self.abort_reason:
+                    logger.info(f"Бэктест остановлен досрочно: {self.abort_reason}")
+                    break
+
+        self.equity_recorder.finalize()
+        profiler.stop('event_loop', loop_started)
         backtest_time_filter.reset_sim_time()
         logger.info("Основной цикл завершен.")
+        return recorded_signals
 
     def run(self) -> Dict[str, Any]:
         """
         Запускает одну полную сессию бэктеста и возвращает результаты.
-        :return: Словарь с результатами, включая DataFrame сделок, финальный капитал и обогащенные данные.
+        Copy-on-Write (настройка 'copy_on_write' / COPY_ON_WRITE) действует только на время прогона.
+        :return: Словарь с результатами, включая DataFrame сделок, финальный капитал,
+                 побарную кривую капитала, накопленные метрики и обогащенные данные.
         """
+        with _copy_on_write_scope(self.copy_on_write):
+            return self._run()
+
+    def _run(self) -> Dict[str, Any]:
+        """Тело `run` (выполняется в области Copy-on-Write движка)."""
         try:
             self._initialize_components()
 
-            enriched_data = self._prepare_data()
+            # Кэш сигналов (оптимизация): при совпадении среза, параметров стратегии и требований
+            # к данным подготовка данных и вызовы стратегии пропускаются
+            signal_cache = self.settings.get("signal_cache")
+            cache_key = (signal_cache.make_key(self.settings, self.components["strategy"])
+                         if signal_cache is not None else None)
+            cached = signal_cache.get(cache_key) if cache_key is not None else None
+
+            started = self.profiler.start()
+            enriched_data = cached.enriched_data if cached is not None else self._prepare_data()
+            self.profiler.stop('prepare_data', started)
             if enriched_data is None:
                 raise ValueError("Data preparation failed, no data returned.")
 
-            self._run_event_loop(enriched_data)
+            recorded_signals = self._run_event_loop(enriched_data, cached.signals if cached is not None else None)
+            # Досрочно остановленный прогон записал сигналы не по всему срезу
+            if cache_key is not None and recorded_signals is not None and not self.abort_reason:
+                signal_cache.put(cache_key, CachedSignals(enriched_data, recorded_signals))
 
             portfolio: Portfolio = self.components["portfolio"]
             trades_df = pd.DataFrame(portfolio.state.closed_trades) if portfolio.state.closed_trades else pd.DataFrame()
 
+            # Метрики уже накоплены по ходу прогона, остается только собрать словарь
+            metrics = self.components['metrics_accumulator'].calculate_all()
+            metrics.update(self.equity_recorder.summary())
+
             return {
-                "status": "success",
+                "status": "aborted" if self.abort_reason else "success",
+                "abort_reason": self.abort_reason,
                 "trades_df": trades_df,
                 "final_capital": portfolio.state.current_capital,
                 "initial_capital": self.settings["initial_capital"],
-                "enriched_data": enriched_data,
+                # Бары разогрева не входят в торговое окно (и в бенчмарк)
+                "enriched_data": enriched_data.iloc[self._trading_start_bar(enriched_data):],
+                "equity_curve": self.equity_recorder.to_frame(),
+                "metrics": metrics,
+                "profile": self.profiler.to_dict(),
                 "open_positions": portfolio.state.positions
             }
         except Exception as e:
@@ -261,9 +446,13 @@ class BacktestEngine:
             return {
                 "status": "error",
                 "message": str(e),
+                "abort_reason": None,
                 "trades_df": pd.DataFrame(),
                 "final_capital": self.settings.get("initial_capital", 0),
                 "initial_capital": self.settings.get("initial_capital", 0),
                 "enriched_data": pd.DataFrame(),
+                "equity_curve": pd.DataFrame(),
+                "metrics": {},
+                "profile": self.profiler.to_dict(),
                 "open_positions": {}
             }
\ No newline at end of file
@@ -0,0 +1,197 @@
+import logging
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from app.core.analysis.constants import METRIC_CONFIG
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.infrastructure.feeds.local import HistoricLocalDataHandler
+from app.shared.config import config
+
+logger = logging.getLogger(__name__)
+
+# Состояние процесса-воркера: настройки и исходные данные передаются один раз в инициализаторе пула
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def permute_ohlcv(data: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Строит синтетический ряд перестановкой приращений исходных свечей.
+
+    Бар раскладывается на гэп (лог-отношение open к предыдущему close) и внутрибаровое
+    движение (лог-отношения close, high, low к open). Гэпы и внутрибаровые движения
+    перемешиваются независимо, поэтому сохраняются распределение доходностей, форма свечей
+    и итоговое изменение цены, а любая временная структура (тренды, автокорреляция) разрушается.
+    Первый бар, время и прочие колонки не меняются; объем переезжает вместе со своим баром.
+
+    :param data: Свечи с колонками open, high, low, close (и обычно time, volume).
+    :param rng: Генератор случайных чисел.
+    :return: Новый DataFrame той же формы.
+    """
+    log_open, log_high, log_low, log_close = (
+        np.log(data[col].to_numpy(dtype=np.float64)) for col in ('open', 'high', 'low', 'close')
+    )
+    gaps = log_open[1:] - log_close[:-1]
+    bar_order = rng.permutation(len(gaps))
+    gaps = gaps[rng.permutation(len(gaps))]
+    body = (log_close[1:] - log_open[1:])[bar_order]
+    up = (log_high[1:] - log_open[1:])[bar_order]
+    down = (log_low[1:] - log_open[1:])[bar_order]
+
+    new_close = log_close[0] + np.cumsum(gaps + body)
+    new_open = np.concatenate(([log_close[0]], new_close[:-1])) + gaps
+
+    permuted = data.copy()
+    permuted['open'] = np.exp(np.concatenate(([log_open[0]], new_open)))
+    permuted['high'] = np.exp(np.concatenate(([log_high[0]], new_open + up)))
+    permuted['low'] = np.exp(np.concatenate(([log_low[0]], new_open + down)))
+    permuted['close'] = np.exp(np.concatenate(([log_close[0]], new_close)))
+    if 'volume' in data.columns:
+        volume = data['volume'].to_numpy()
+        permuted['volume'] = np.concatenate((volume[:1], volume[1:][bar_order]))
+    return permuted
+
+
+def _backtest_metrics(settings: Dict[str, Any], data: pd.DataFrame, feature_engine: FeatureEngine) -> Dict[str, float]:
+    """Прогоняет бэктест на срезе в памяти и возвращает накопленные движком метрики."""
+    engine = BacktestEngine({**settings, "data_slice": data}, queue.Queue(), feature_engine)
+    results = engine.run()
+    if results["status"] != "success":
+        raise RuntimeError(f"Бэктест завершился с ошибкой: {results.get('message')}")
+    return results["metrics"]
+
+
+def _init_permutation_worker(settings: Dict[str, Any], data: pd.DataFrame) -> None:
+    """Инициализатор процесса-воркера: сохраняет настройки, исходные данные и FeatureEngine."""
+    _WORKER_STATE["settings"] = settings
+    _WORKER_STATE["data"] = data
+    _WORKER_STATE["feature_engine"] = FeatureEngine()
+
+
+def _permuted_metrics(settings: Dict[str, Any],
+                      data: pd.DataFrame,
+                      feature_engine: FeatureEngine,
+                      seed: np.random.SeedSequence) -> Dict[str, float]:
+    """Одна перестановка данных и один бэктест на ней."""
+    permuted = permute_ohlcv(data, np.random.default_rng(seed))
+    return _backtest_metrics(settings, permuted, feature_engine)
+
+
+def _run_permutation(seed: np.random.SeedSequence) -> Dict[str, float]:
+    """Рабочая единица процесса-воркера: перестановка по данным из `_WORKER_STATE`."""
+    return _permuted_metrics(_WORKER_STATE["settings"], _WORKER_STATE["data"], _WORKER_STATE["feature_engine"], seed)
+
+
+class PermutationTest:
+    """
+    Проверка значимости стратегии перестановочным тестом (в духе reality check Уайта).
+
+    Стратегия прогоняется на исходных данных и на N синтетических рядах, полученных
+    перестановкой приращений свечей (см. `permute_ohlcv`). Если у стратегии есть преимущество,
+    связанное со структурой рынка, на перемешанных рядах она должна работать хуже.
+    p-value метрики — доля перестановок, давших результат не хуже фактического
+    (с поправкой +1, чтобы p-value не было нулевым).
+
+    Бэктесты выполняются в пуле процессов на срезах в памяти, без журнала сделок и профилирования.
+    Зерна перестановок порождаются из одного SeedSequence, поэтому результат воспроизводим
+    и не зависит от числа воркеров.
+    """
+
+    def __init__(self,
+                 settings: Dict[str, Any],
+                 n_permutations: int = 200,
+                 n_workers: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 metrics: Optional[Sequence[str]] = None):
+        """
+        :param settings: Настройки BacktestEngine (без 'data_slice' данные читаются с диска).
+        :param n_permutations: Количество перестановок.
+        :param n_workers: Число процессов (None — по числу ядер, 1 — в текущем процессе).
+        :param seed: Зерно для воспроизводимости.
+        :param metrics: Метрики для p-value (по умолчанию — все из METRIC_CONFIG).
+        """
+        # Исходный срез хранится отдельно: воркерам он передается один раз, а не с каждой задачей
+        self.data_slice = settings.get("data_slice")
+        self.settings = {
+            **{k: v for k, v in settings.items() if k != "data_slice"},
+            "trade_log_path": None,
+            "profile": False
+        }
+        self.n_permutations = n_permutations
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.seed = seed
+        self.metrics = list(metrics or METRIC_CONFIG.keys())
+        self.observed: Optional[Dict[str, float]] = None
+        self.distribution: Optional[pd.DataFrame] = None
+
+    def _load_data(self) -> pd.DataFrame:
+        data = self.data_slice
+        if data is None:
+            data = HistoricLocalDataHandler(
+                exchange=self.settings["exchange"],
+                instrument_id=self.settings["instrument"],
+                interval_str=self.settings["interval"],
+                data_path=self.settings.get("data_dir", config.PATH_CONFIG["DATA_DIR"])
+            ).load_raw_data()
+        if data is None or data.empty:
+            raise ValueError(f"Нет данных для перестановочного теста по {self.settings['instrument']}.")
+        return data.reset_index(drop=True)
+
+    def _run_permutations(self, data: pd.DataFrame) -> List[Dict[str, float]]:
+        seeds = np.random.SeedSequence(self.seed).spawn(self.n_permutations)
+        progress = dict(total=self.n_permutations, desc="Перестановки")
+
+        if self.n_workers <= 1:
+            # В текущем процессе состояние воркера не заполняется: все передается явно
+            feature_engine = FeatureEngine()
+            return [_permuted_metrics(self.settings, data, feature_engine, seed) for seed in tqdm(seeds, **progress)]
+
+        with ProcessPoolExecutor(max_workers=self.n_workers,
+                                 initializer=_init_permutation_worker,
+                                 initargs=(self.settings, data)) as executor:
+            # map сохраняет порядок перестановок независимо от порядка завершения
+            chunksize = max(1, self.n_permutations // (self.n_workers * 4))
+            return list(tqdm(executor.map(_run_permutation, seeds, chunksize=chunksize), **progress))
+
+    def run(self) -> pd.DataFrame:
+        """
+        Выполняет фактический прогон и все перестановки.
+
+        :return: DataFrame (индекс — метрика): observed, permuted_mean, permuted_std, p_value.
+                 Распределение по перестановкам сохраняется в `self.distribution`.
+        """
+        data = self._load_data()
+        self.observed = _backtest_metrics(self.settings, data, FeatureEngine())
+        logger.info(f"Фактический прогон: {self.observed.get('total_trades', 0)} сделок. "
+                    f"Запуск {self.n_permutations} перестановок на {self.n_workers} воркерах...")
+
+        self.distribution = pd.DataFrame(self._run_permutations(data))
+        return self.summary()
+
+    def summary(self) -> pd.DataFrame:
+        """Таблица p-value по метрикам (направление 'лучше' берется из METRIC_CONFIG)."""
+        rows = {}
+        n = len(self.distribution)
+        for metric in self.metrics:
+            observed = self.observed[metric]
+            values = self.distribution[metric].to_numpy(dtype=np.float64)
+            if METRIC_CONFIG.get(metric, {}).get("direction") == "minimize":
+                at_least_as_good = np.count_nonzero(values <= observed)
+            else:
+                at_least_as_good = np.count_nonzero(values >= observed)
+            rows[metric] = {
+                "observed": observed,
+                "permuted_mean": values.mean(),
+                "permuted_std": values.std(ddof=1) if n > 1 else np.nan,
+                "p_value": (at_least_as_good + 1) / (n + 1),
+            }
+
+        table = pd.DataFrame.from_dict(rows, orient="index")
+        table.attrs.update({"n_permutations": n, "seed": self.seed})
+        return table
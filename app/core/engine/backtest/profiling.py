@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseProfiler:
+    """
+    Легковесный профилировщик фаз бэктеста.
+
+    Использует монотонный таймер `time.perf_counter_ns` и счетчики вызовов.
+    Фазы могут быть вложенными (например, 'execute_order' внутри 'process_queue'),
+    поэтому сумма времени фаз может превышать общее время цикла.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.phase_ns: Dict[str, int] = defaultdict(int)
+        self.phase_calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def start() -> int:
+        """Возвращает отметку времени для последующего вызова `stop()`."""
+        return time.perf_counter_ns()
+
+    def stop(self, phase: str, started_ns: int) -> None:
+        """
+        Добавляет к фазе время, прошедшее с отметки `started_ns`.
+
+        :param phase: Имя фазы.
+        :param started_ns: Значение, полученное от `start()`.
+        """
+        self.phase_ns[phase] += time.perf_counter_ns() - started_ns
+        self.phase_calls[phase] += 1
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Увеличивает счетчик (например, число баров или событий)."""
+        self.counters[name] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Сериализует замеры в словарь для результатов `BacktestEngine.run()`.
+        Пропускная способность считается по времени фазы 'event_loop'.
+        """
+        loop_s = self.phase_ns.get('event_loop', 0) / 1e9
+        return {
+            "phases": {
+                phase: {
+                    "total_s": total_ns / 1e9,
+                    "calls": self.phase_calls[phase],
+                    "avg_us": total_ns / self.phase_calls[phase] / 1e3 if self.phase_calls[phase] else 0.0,
+                }
+                for phase, total_ns in self.phase_ns.items()
+            },
+            "counters": dict(self.counters),
+            "bars_per_sec": self.counters.get('bars', 0) / loop_s if loop_s > 0 else 0.0,
+            "events_per_sec": self.counters.get('events', 0) / loop_s if loop_s > 0 else 0.0,
+        }
+
+
+class NullProfiler:
+    """
+    Профилировщик-заглушка для режима по умолчанию.
+    Имеет тот же интерфейс, что и PhaseProfiler, но ничего не измеряет.
+    """
+
+    enabled = False
+
+    @staticmethod
+    def start() -> int:
+        return 0
+
+    def stop(self, phase: str, started_ns: int) -> None:
+        pass
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {}
+
+
+class ProfileAggregator:
+    """
+    Потокобезопасно суммирует профили нескольких прогонов
+    (задачи пакетного теста, trial'ы Optuna) в один отчет.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phase_s: Dict[str, float] = defaultdict(float)
+        self._phase_calls: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[str, int] = defaultdict(int)
+        self.runs = 0
+
+    def add(self, profile: Optional[Dict[str, Any]]) -> None:
+        """
+        Добавляет профиль одного прогона (результат `PhaseProfiler.to_dict()`).
+        Пустые профили (профилирование выключено) игнорируются.
+        """
+        if not profile:
+            return
+        with self._lock:
+            self.runs += 1
+            for phase, stats in profile["phases"].items():
+                self._phase_s[phase] += stats["total_s"]
+                self._phase_calls[phase] += stats["calls"]
+            for name, value in profile["counters"].items():
+                self._counters[name] += value
+
+    def summary(self) -> Dict[str, Any]:
+        """Возвращает агрегированный профиль в том же формате, что и у одного прогона."""
+        with self._lock:
+            loop_s = self._phase_s.get('event_loop', 0.0)
+            return {
+                "runs": self.runs,
+                "phases": {
+                    phase: {
+                        "total_s": total_s,
+                        "calls": self._phase_calls[phase],
+                        "avg_us": total_s / self._phase_calls[phase] * 1e6 if self._phase_calls[phase] else 0.0,
+                    }
+                    for phase, total_s in self._phase_s.items()
+                },
+                "counters": dict(self._counters),
+                "bars_per_sec": self._counters.get('bars', 0) / loop_s if loop_s > 0 else 0.0,
+                "events_per_sec": self._counters.get('events', 0) / loop_s if loop_s > 0 else 0.0,
+            }
+
+    def log_summary(self, title: str) -> None:
+        """Выводит агрегированный профиль в лог, отсортировав фазы по суммарному времени."""
+        summary = self.summary()
+        if not summary["runs"]:
+            return
+
+        lines = [f"Профиль '{title}' (прогонов: {summary['runs']}):"]
+        phases = sorted(summary["phases"].items(), key=lambda item: item[1]["total_s"], reverse=True)
+        for phase, stats in phases:
+            lines.append(
+                f"  {phase:<22} {stats['total_s']:>10.3f} с | вызовов: {stats['calls']:>10} | "
+                f"в среднем: {stats['avg_us']:>10.1f} мкс"
+            )
+        lines.append(
+            f"  Баров/с: {summary['bars_per_sec']:,.0f} | Событий/с: {summary['events_per_sec']:,.0f}"
+        )
+        logger.info("\n".join(lines))
@@ -1,6 +1,7 @@
 import logging
 import os
 import queue
+import shutil
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, Any, Optional
@@ -8,10 +9,13 @@ from typing import Dict, Any, Optional
 import pandas as pd
 from tqdm import tqdm
 
-from app.core.analysis.metrics import PortfolioMetricsCalculator, BenchmarkMetricsCalculator
+from app.core.analysis.batch_aggregator import BatchResultsAggregator
+from app.core.analysis.metrics import BenchmarkMetricsCalculator
+from app.core.analysis.monte_carlo import run_monte_carlo
 from app.core.analysis.reports.excel_report import ExcelReportGenerator
 from app.core.analysis.session import AnalysisSession
 from app.core.engine.backtest.loop import BacktestEngine
+from app.core.engine.backtest.profiling import ProfileAggregator
 from app.core.risk.manager import AVAILABLE_RISK_MANAGERS
 from app.shared.logging_setup import setup_backtest_logging, backtest_time_filter
 from app.strategies import AVAILABLE_STRATEGIES
@@ -21,9 +25,14 @@ from app.bootstrap.container import container
 logger = logging.getLogger(__name__)
 
 
-def _run_and_analyze_single_instrument(engine_settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def _run_and_analyze_single_instrument(engine_settings: Dict[str, Any],
+                                       return_data: bool = False) -> Optional[Dict[str, Any]]:
     """
     "Рабочая единица": Запускает BacktestEngine для одного инструмента.
+
+    :param engine_settings: Настройки для BacktestEngine.
+    :param return_data: Вернуть ли обогащенные свечи (нужны только для графиков одиночного бэктеста).
+                        В пакетном режиме и WFO данные не возвращаются, чтобы не держать их в памяти.
     """
     try:
         events_queue = queue.Queue()
@@ -39,13 +48,8 @@ def _run_and_analyze_single_instrument(engine_settings: Dict[str, Any]) -> Optio
             exchange = engine_settings["exchange"]
             annual_factor = config.EXCHANGE_SPECIFIC_CONFIG[exchange]["SHARPE_ANNUALIZATION_FACTOR"]
 
-            # 1. Метрики по сделкам стратегии
-            portfolio_calc = PortfolioMetricsCalculator(
-                trades_df=results["trades_df"],
-                initial_capital=results["initial_capital"],
-                annualization_factor=annual_factor
-            )
-            portfolio_metrics = portfolio_calc.calculate_all()
+            # 1. Метрики по сделкам стратегии (накоплены движком по ходу прогона)
+            portfolio_metrics = results["metrics"]
 
             # 2. Метрики для бенчмарка (Buy & Hold)
             bench_calc = BenchmarkMetricsCalculator(
@@ -60,7 +64,9 @@ def _run_and_analyze_single_instrument(engine_settings: Dict[str, Any]) -> Optio
                 **portfolio_metrics,
                 'pnl_bh_pct': bench_metrics.get('pnl_pct', 0.0),
                 "trades_df": results["trades_df"],
-                "enriched_data": results["enriched_data"],
+                "enriched_data": results["enriched_data"] if return_data else None,
+                "equity_curve": results["equity_curve"],
+                "profile": results["profile"],
                 "initial_capital": results["initial_capital"]
             }
             return full_metrics
@@ -113,7 +119,7 @@ def run_single_backtest_flow(run_settings: Dict[str, Any]):
     }
 
     try:
-        analysis_results = _run_and_analyze_single_instrument(engine_settings)
+        analysis_results = _run_and_analyze_single_instrument(engine_settings, return_data=True)
 
         if analysis_results:
             logger.info(f"Бэктест завершен, найдено {analysis_results['total_trades']} сделок. Генерация отчетов.")
@@ -122,11 +128,14 @@ def run_single_backtest_flow(run_settings: Dict[str, Any]):
                 trades_df=analysis_results["trades_df"],
                 historical_data=analysis_results["enriched_data"],
                 initial_capital=analysis_results["initial_capital"],
+                equity_curve=analysis_results["equity_curve"],
                 exchange=exchange,
                 interval=interval,
                 risk_manager_type=risk_manager_type,
                 strategy_name=strategy_class.__name__
             )
+            analysis_session.run_monte_carlo(run_settings.get("monte_carlo"), run_settings.get("mc_method"),
+                                             run_settings.get("mc_seed"))
 
             analysis_session.generate_all_reports(
                 base_filename=base_filename,
@@ -173,6 +182,8 @@ def run_batch_backtest_flow(run_settings: Dict[str, Any]):
     logger.info(f"Используются параметры стратегии по умолчанию: {strategy_params}")
     logger.info(f"Используются параметры риск-менеджера по умолчанию: {rm_params}")
 
+    profiling_enabled = run_settings.get("profile") or config.BACKTEST_CONFIG["PROFILING_ENABLED"]
+
     # --- Подготовка задач ---
     tasks = []
     for filename in data_files:
@@ -189,41 +200,76 @@ def run_batch_backtest_flow(run_settings: Dict[str, Any]):
             "strategy_params": strategy_params,
             "risk_manager_params": rm_params,
             "trade_log_path": None,
+            "profile": profiling_enabled,
         }
         tasks.append(task_settings)
 
     # --- Запуск ---
-    results_list = []
+    # Результаты не накапливаются целиком: сводка остается в памяти, сделки сбрасываются на диск
+    report_dir = config.PATH_CONFIG["REPORTS_BATCH_TEST_DIR"]
+    os.makedirs(report_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    trades_dir = os.path.join(report_dir, f"{timestamp}_{strategy_name}_{interval}_trades")
+    aggregator = BatchResultsAggregator(spill_dir=trades_dir)
+
+    profile_aggregator = ProfileAggregator()
     with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
         future_to_settings = {executor.submit(_run_and_analyze_single_instrument, task): task for task in tasks}
 
         progress_bar = tqdm(as_completed(future_to_settings), total=len(tasks), desc="Общий прогресс")
         for future in progress_bar:
+            # pop освобождает ссылку на future, а вместе с ней и полный результат воркера
+            settings_for_future = future_to_settings.pop(future)
             result_dict = future.result()
             if result_dict:
-                settings_for_future = future_to_settings[future]
-                result_dict['instrument'] = settings_for_future['instrument']
-                results_list.append(result_dict)
+                profile_aggregator.add(result_dict.pop('profile', None))
+                aggregator.add(settings_for_future['instrument'], result_dict)
+            del future, result_dict
+
+    profile_aggregator.log_summary(f"Пакетный тест {strategy_name}")
 
-    if not results_list:
+    if not len(aggregator):
         logger.warning("Ни один из бэктестов не вернул корректных результатов.")
+        shutil.rmtree(trades_dir, ignore_errors=True)
         return
 
     # --- Отчет ---
-    results_df = pd.DataFrame(results_list)
-    report_dir = config.PATH_CONFIG["REPORTS_BATCH_TEST_DIR"]
-    os.makedirs(report_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_df = aggregator.summary_df()
     report_filename = f"{timestamp}_{strategy_name}_{interval}_{len(results_df)}instr.xlsx"
     output_path = os.path.join(report_dir, report_filename)
 
+    # Монте-Карло по сделкам всего портфеля: капитал портфеля — сумма капиталов инструментов
+    monte_carlo = None
+    mc_simulations = run_settings.get("monte_carlo")
+    if mc_simulations is None:
+        mc_simulations = config.BACKTEST_CONFIG["MONTE_CARLO"]["SIMULATIONS"]
+    if mc_simulations:
+        portfolio_trades = pd.concat(
+            [t[['pnl', 'exit_timestamp_utc']] for t in aggregator.iter_trades()], ignore_index=True
+        )
+        monte_carlo = run_monte_carlo(
+            portfolio_trades,
+            config.BACKTEST_CONFIG["INITIAL_CAPITAL"] * len(results_df),
+            config.EXCHANGE_SPECIFIC_CONFIG[exchange]["SHARPE_ANNUALIZATION_FACTOR"],
+            n_simulations=mc_simulations,
+            method=run_settings.get("mc_method"),
+            seed=run_settings.get("mc_seed")
+        )
+
     excel_generator = ExcelReportGenerator(
         results_df=results_df,
         strategy_name=strategy_name,
         interval=interval,
         risk_manager_type=risk_manager_type,
         strategy_params=strategy_params,
-        rm_params=rm_params
+        rm_params=rm_params,
+        monte_carlo=monte_carlo,
+        # Сделки читаются с диска по инструментам, а не собираются в один DataFrame
+        trades_source=aggregator.iter_trades,
+        trades_sheet=run_settings.get("excel_trades") or None,
+        constant_memory=run_settings.get("excel_streaming") or None,
+        companion_format=run_settings.get("companion")
     )
     excel_generator.generate(output_path)
-    logger.info(f"\n--- Поток пакетного тестирования успешно завершен. Отчет сохранен в {output_path} ---")
\ No newline at end of file
+    logger.info(f"\n--- Поток пакетного тестирования успешно завершен. Отчет сохранен в {output_path} ---")
+    logger.info(f"Сделки по инструментам сохранены в {trades_dir}")
\ No newline at end of file
@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.calculations.indicator_space import requirement_key
+from app.shared.events import SignalEvent
+
+
+@dataclass
+class CachedSignals:
+    """Результат работы стратегии на срезе: подготовленные данные и сигналы по номерам баров."""
+    enriched_data: pd.DataFrame
+    signals: Dict[int, List[SignalEvent]]
+
+
+class SignalCache:
+    """
+    LRU-кэш сигналов стратегии для оптимизации.
+
+    Сигналы стратегий зависят только от данных и параметров стратегии, но не от риск-менеджера
+    и состояния портфеля. Поэтому trial, который меняет только `rm_*` параметры, может не
+    запускать стратегию заново: движок проигрывает сохраненную последовательность сигналов
+    через портфель, риск-менеджер и исполнение.
+
+    Требования риск-менеджера к данным (например, период ATR) входят в ключ, так как
+    они меняют набор колонок и период разогрева, а значит и сами бары симуляции.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        """
+        :param max_entries: Максимальное число срезов в кэше (старые вытесняются).
+        """
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Tuple, CachedSignals] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(settings: Dict[str, Any], strategy) -> Optional[Tuple]:
+        """
+        Строит ключ кэша для бэктеста.
+
+        :param settings: Настройки BacktestEngine (нужен 'data_slice').
+        :param strategy: Инициализированная стратегия.
+        :return: Ключ или None, если данные читаются с диска и срез неизвестен.
+        """
+        data_slice = settings.get("data_slice")
+        if data_slice is None or data_slice.empty:
+            return None
+
+        params = tuple(sorted(
+            (name, round(value, 10) if isinstance(value, float) else value)
+            for name, value in strategy.params.items()
+        ))
+        return (
+            settings["instrument"],
+            settings["interval"],
+            len(data_slice),
+            data_slice['time'].iloc[0],
+            data_slice['time'].iloc[-1],
+            type(strategy).__name__,
+            params,
+            tuple(requirement_key(r) for r in strategy.required_indicators),
+            settings.get("float32_features"),
+        )
+
+    def get(self, key: Tuple) -> Optional[CachedSignals]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple, entry: CachedSignals) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,17 +1,163 @@
 import os
 import pandas as pd
 import logging
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Tuple
 
+import numpy as np
 import optuna
 
-from app.core.engine.optimization.preparer import WFODataPreparer
-from app.core.engine.optimization.step_runner import WFOStepRunner
+from app.core.analysis.metrics import calculate_batch_metrics
+from app.core.engine.optimization.preparer import WFODataPreparer, validation_mode, cv_test_groups, CV_MODES
+from app.core.engine.optimization.splitter import (
+    PeriodSplit, combinatorial_splits, cpcv_paths, purged_train_indices
+)
+from app.core.engine.optimization.step_runner import WFOStepRunner, select_top_params
 from app.core.engine.optimization.reporter import OptimizationReporter
 from app.core.calculations.indicators import FeatureEngine
+from app.core.calculations.indicator_space import IndicatorSpace, FeatureMatrix
+from app.strategies import AVAILABLE_STRATEGIES
+from app.shared.config import config
+
+BACKTEST_CONFIG = config.BACKTEST_CONFIG
 
 logger = logging.getLogger(__name__)
 
+# Состояние процесса-воркера при параллельном выполнении шагов WFO.
+# Заполняется один раз в инициализаторе пула, чтобы данные не передавались с каждой задачей.
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _step_slices(settings: Dict[str, Any],
+                 all_instrument_periods: Dict[str, PeriodSplit],
+                 step_num: int) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    """
+    Возвращает обучающие и тестовые срезы всех инструментов для шага WFO.
+
+    Срезы — это views на непрерывные данные инструмента, а не склеенные копии.
+    """
+    train_start, train_end = step_num - 1, step_num - 1 + settings["train_periods"]
+    test_start, test_end = train_end, train_end + settings["test_periods"]
+
+    train_slices = {i: p.slice(train_start, train_end) for i, p in all_instrument_periods.items()}
+    test_slices = {i: p.slice(test_start, test_end) for i, p in all_instrument_periods.items()}
+    return train_slices, test_slices
+
+
+def _cv_split_slices(settings: Dict[str, Any],
+                     all_instrument_periods: Dict[str, PeriodSplit],
+                     split_num: int) -> Tuple[Dict[str, List[pd.DataFrame]], Dict[str, List[pd.DataFrame]]]:
+    """
+    Возвращает обучающие и тестовые отрезки всех инструментов для разбиения purged k-fold / CPCV.
+
+    Обучающая выборка — непрерывные отрезки (views) вне тестовых групп, очищенные
+    от строк перед тестом (purge) и после него (embargo). Тестовая — по одному отрезку на группу.
+    """
+    n_groups = len(next(iter(all_instrument_periods.values())))
+    test_groups = combinatorial_splits(n_groups, cv_test_groups(settings))[split_num - 1]
+    purge_pct = settings.get("purge_pct")
+    embargo_pct = settings.get("embargo_pct")
+    purge_pct = BACKTEST_CONFIG["CV_PURGE_PCT"] if purge_pct is None else purge_pct
+    embargo_pct = BACKTEST_CONFIG["CV_EMBARGO_PCT"] if embargo_pct is None else embargo_pct
+
+    train_slices, test_slices = {}, {}
+    for instrument, periods in all_instrument_periods.items():
+        n_rows = len(periods.data)
+        train_indices = purged_train_indices(
+            periods.bounds, test_groups, int(n_rows * purge_pct), int(n_rows * embargo_pct)
+        )
+        train_slices[instrument] = periods.segments(train_indices)
+        test_slices[instrument] = [periods.slice(group, group + 1) for group in test_groups]
+    return train_slices, test_slices
+
+
+def _split_slices(settings: Dict[str, Any],
+                  all_instrument_periods: Dict[str, PeriodSplit],
+                  step_num: int) -> Tuple[Dict, Dict]:
+    """Срезы шага WFO или разбиения CV в зависимости от validation_mode."""
+    if validation_mode(settings) == "wfo":
+        return _step_slices(settings, all_instrument_periods, step_num)
+    return _cv_split_slices(settings, all_instrument_periods, step_num)
+
+
+def _anchored_step_inputs(settings: Dict[str, Any],
+                          all_instrument_periods: Dict[str, PeriodSplit],
+                          feature_matrices: Dict[str, FeatureMatrix],
+                          step_num: int) -> Dict[str, Any]:
+    """
+    Аргументы WFOStepRunner для шага anchored WFO.
+
+    Обучающее окно всегда начинается с первой строки истории и растет на период с каждым шагом.
+    Индикаторы берутся срезами из матриц, построенных один раз по всей истории: для окна,
+    начинающегося с начала данных, они совпадают с пересчитанными заново.
+    Тестовое окно дополняется слева строками разогрева (prefix lookback): стратегия видит их
+    как историю, но торговля начинается с первого бара теста ('trade_start_time').
+    """
+    train_end_period = step_num - 1 + settings["train_periods"]
+    warmup_bars = settings.get("warmup_bars")
+    warmup_bars = BACKTEST_CONFIG["WFO_WARMUP_BARS"] if warmup_bars is None else warmup_bars
+
+    train_slices, test_slices, train_matrices, oos_settings = {}, {}, {}, {}
+    for instrument, periods in all_instrument_periods.items():
+        train_end = int(periods.bounds[train_end_period])
+        test_end = int(periods.bounds[train_end_period + settings["test_periods"]])
+        test_start = max(0, train_end - warmup_bars)
+
+        train_slices[instrument] = periods.data.iloc[:train_end]
+        test_slices[instrument] = periods.data.iloc[test_start:test_end]
+        oos_settings[instrument] = {"trade_start_time": periods.data['time'].iloc[train_end]}
+
+        matrix = feature_matrices.get(instrument)
+        if matrix is not None:
+            train_matrices[instrument] = matrix.slice(0, train_end, periods.data)
+            oos_settings[instrument]["feature_matrix"] = matrix.slice(test_start, test_end, periods.data)
+
+    return {
+        "train_slices": train_slices,
+        "test_slices": test_slices,
+        "train_feature_matrices": train_matrices if feature_matrices else None,
+        "oos_settings": oos_settings,
+    }
+
+
+def _step_inputs(settings: Dict[str, Any],
+                 all_instrument_periods: Dict[str, PeriodSplit],
+                 feature_matrices: Dict[str, FeatureMatrix],
+                 step_num: int) -> Dict[str, Any]:
+    """Аргументы WFOStepRunner для шага: срезы данных и, в режиме anchored, готовые индикаторы."""
+    if validation_mode(settings) == "anchored":
+        return _anchored_step_inputs(settings, all_instrument_periods, feature_matrices, step_num)
+    train_slices, test_slices = _split_slices(settings, all_instrument_periods, step_num)
+    return {"train_slices": train_slices, "test_slices": test_slices}
+
+
+def _init_step_worker(settings: Dict[str, Any],
+                      all_instrument_periods: Dict[str, PeriodSplit],
+                      feature_matrices: Dict[str, FeatureMatrix]) -> None:
+    """Инициализатор процесса-воркера: сохраняет настройки, данные и индикаторы всех инструментов."""
+    _WORKER_STATE["settings"] = settings
+    _WORKER_STATE["periods"] = all_instrument_periods
+    _WORKER_STATE["feature_matrices"] = feature_matrices
+    _WORKER_STATE["feature_engine"] = FeatureEngine()
+
+
+def _run_step_in_worker(step_num: int) -> Tuple[int, pd.DataFrame, Dict, List[optuna.trial.FrozenTrial], List]:
+    """
+    Выполняет один шаг WFO внутри процесса-воркера.
+
+    Объект Study не передается между процессами: возвращаются его trials и направления,
+    из которых родительский процесс восстанавливает Study.
+    """
+    settings = _WORKER_STATE["settings"]
+    step_runner = WFOStepRunner(
+        settings,
+        step_num,
+        feature_engine=_WORKER_STATE["feature_engine"],
+        **_step_inputs(settings, _WORKER_STATE["periods"], _WORKER_STATE["feature_matrices"], step_num)
+    )
+    oos_trades_df, step_summary, study = step_runner.run()
+    return step_num, oos_trades_df, step_summary, study.trials, study.directions
+
 
 class OptimizationEngine:
     """
@@ -20,7 +166,7 @@ class OptimizationEngine:
     Этот класс не содержит сложной логики. Его задачи:
     1. Подготовить настройки.
     2. Вызвать WFODataPreparer для загрузки и нарезки данных.
-    3. В цикле вызывать WFOStepRunner для каждого шага WFO.
+    3. В цикле (или параллельно в пуле процессов) вызывать WFOStepRunner для каждого шага WFO.
     4. Вызвать OptimizationReporter для генерации итоговых отчетов.
     """
 
@@ -32,6 +178,8 @@ class OptimizationEngine:
         """
         self.settings = self._prepare_settings(settings)
         self.feature_engine = feature_engine
+        # Метрики OOS-путей кросс-валидации (по строке на путь), для WFO — None
+        self.path_metrics: pd.DataFrame | None = None
 
     def _prepare_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -54,49 +202,212 @@ class OptimizationEngine:
 
         return settings
 
+    def run_walk_forward(self) -> Tuple[List[pd.DataFrame], List[Dict[str, Any]], optuna.Study | None]:
+        """
+        Выполняет подготовку данных и все шаги WFO без генерации отчетов.
+
+        :return: Кортеж (список OOS-сделок по шагам, сводки шагов, study последнего шага).
+        :raises FileNotFoundError: Если не удалось загрузить данные.
+        :raises ValueError: Если данных недостаточно для WFO.
+        """
+        # --- Шаг 1: Подготовка данных ---
+        preparer = WFODataPreparer(self.settings)
+        all_instrument_periods, num_steps = preparer.prepare()
+
+        # --- Шаг 2: Цикл WFO (или разбиений CV) ---
+        feature_matrices = self._build_full_feature_matrices(all_instrument_periods)
+        all_oos_trades, step_results, last_study = self._run_steps(all_instrument_periods, num_steps, feature_matrices)
+
+        if validation_mode(self.settings) in CV_MODES:
+            n_groups = len(next(iter(all_instrument_periods.values())))
+            all_oos_trades = self._assemble_cv_paths(all_oos_trades, n_groups)
+
+        return all_oos_trades, step_results, last_study
+
+    def _build_full_feature_matrices(self, all_instrument_periods: Dict[str, PeriodSplit]) -> Dict[str, FeatureMatrix]:
+        """
+        Для anchored WFO рассчитывает все достижимые индикаторы один раз по всей истории инструментов.
+        Шаги получают их срезами, поэтому подготовка не растет квадратично с числом шагов.
+
+        :return: Матрицы по инструментам (пустой словарь, если режим другой или предрасчет выключен).
+        """
+        if validation_mode(self.settings) != "anchored" or not BACKTEST_CONFIG["WFO_PRECOMPUTE_FEATURES"]:
+            return {}
+        try:
+            indicator_space = IndicatorSpace(AVAILABLE_STRATEGIES[self.settings["strategy"]], self.settings["rm"])
+        except Exception:
+            logger.warning("Не удалось построить пространство индикаторов, предрасчет отключен.", exc_info=True)
+            return {}
+
+        matrices = {
+            instrument: indicator_space.build(periods.data, self.feature_engine)
+            for instrument, periods in all_instrument_periods.items()
+        }
+        logger.info(f"Anchored WFO: {len(indicator_space.requirements)} индикаторов рассчитаны по всей истории "
+                    f"для {len(matrices)} инструментов.")
+        return matrices
+
+    def _run_steps(self,
+                   all_instrument_periods: Dict[str, PeriodSplit],
+                   num_steps: int,
+                   feature_matrices: Dict[str, FeatureMatrix]) -> Tuple[List[pd.DataFrame], List[Dict[str, Any]], optuna.Study | None]:
+        """Выполняет все шаги последовательно или в пуле процессов."""
+        parallel_steps, n_jobs = self._resolve_parallelism(num_steps)
+        if parallel_steps > 1:
+            return self._run_steps_parallel(all_instrument_periods, num_steps, parallel_steps, n_jobs, feature_matrices)
+
+        all_oos_trades, step_results = [], []
+        last_study: optuna.Study | None = None
+        step_settings = {**self.settings, "n_jobs": n_jobs}
+        warm_start_top_k = self._warm_start_top_k()
+        if warm_start_top_k > 0 and validation_mode(self.settings) in CV_MODES:
+            # Обучение одного разбиения CV включает тестовые группы других: прогрев перенес бы утечку
+            logger.warning("Прогрев шагов переносит параметры между разбиениями CV и в режимах CV отключен.")
+            warm_start_top_k = 0
+        warm_start_params: List[Dict[str, Any]] = []
+
+        for step_num in range(1, num_steps + 1):
+            # Запускаем один шаг
+            step_runner = WFOStepRunner(
+                step_settings,
+                step_num,
+                feature_engine=self.feature_engine,
+                warm_start_params=warm_start_params,
+                **_step_inputs(self.settings, all_instrument_periods, feature_matrices, step_num)
+            )
+            oos_trades_df, step_summary, study = step_runner.run()
+            warm_start_params = select_top_params(study, warm_start_top_k)
+
+            # Собираем результаты
+            if not oos_trades_df.empty:
+                all_oos_trades.append(oos_trades_df)
+            if step_summary:
+                step_results.append(step_summary)
+            last_study = study
+
+        return all_oos_trades, step_results, last_study
+
+    def _assemble_cv_paths(self, all_oos_trades: List[pd.DataFrame], n_groups: int) -> List[pd.DataFrame]:
+        """
+        Собирает из тестовых сделок разбиений полные OOS-пути и считает метрики каждого пути.
+
+        Сделки помечены номером разбиения (oos_split) и отрезка (oos_segment), по которым
+        восстанавливается тестовая группа (oos_group). Путь берет каждую группу из своего разбиения
+        (см. `cpcv_paths`), для k-fold путь один. Метрики всех путей считаются одним вызовом
+        `calculate_batch_metrics` и сохраняются в `self.path_metrics`.
+
+        :return: Сделки первого пути по группам — непересекающаяся OOS-история для стандартных отчетов.
+        """
+        if not all_oos_trades:
+            return []
+        n_test_groups = cv_test_groups(self.settings)
+        split_groups = np.asarray(combinatorial_splits(n_groups, n_test_groups))
+        paths = np.asarray(cpcv_paths(n_groups, n_test_groups))
+
+        trades = pd.concat(all_oos_trades, ignore_index=True)
+        split_index = trades['oos_split'].to_numpy() - 1
+        group = split_groups[split_index, trades['oos_segment'].to_numpy()]
+        trades['oos_group'] = group
+
+        path_trades = pd.concat(
+            [trades[paths[path, group] == split_index].assign(path=path) for path in range(len(paths))],
+            ignore_index=True
+        ).sort_values(['path', 'exit_timestamp_utc'], kind='stable')
+
+        annualization_factor = config.EXCHANGE_SPECIFIC_CONFIG[self.settings["exchange"]]["SHARPE_ANNUALIZATION_FACTOR"]
+        self.path_metrics = calculate_batch_metrics(
+            path_trades, BACKTEST_CONFIG["INITIAL_CAPITAL"], annualization_factor, run_column='path'
+        )
+        for metric in self.settings["metrics"]:
+            values = self.path_metrics[metric]
+            logger.info(f"OOS-пути ({len(values)}): {metric} среднее {values.mean():.4f}, "
+                        f"мин. {values.min():.4f}, макс. {values.max():.4f}")
+
+        first_path = path_trades[path_trades['path'] == 0]
+        return [frame for _, frame in first_path.groupby('oos_group', sort=True)]
+
+    def _warm_start_top_k(self) -> int:
+        """Количество лучших наборов параметров, передаваемых следующему шагу (0 — прогрев выключен)."""
+        top_k = self.settings.get("warm_start_top_k")
+        return top_k if top_k is not None else BACKTEST_CONFIG["WFO_WARM_START_TOP_K"]
+
+    def _resolve_parallelism(self, num_steps: int) -> Tuple[int, int]:
+        """
+        Распределяет общий бюджет воркеров между шагами WFO и trials внутри шага.
+
+        :param num_steps: Количество шагов WFO.
+        :return: Кортеж (число одновременно выполняемых шагов, n_jobs для Optuna внутри шага).
+                 В последовательном режиме без явного бюджета n_jobs = -1 (все ядра).
+        """
+        parallel_steps = self.settings.get("parallel_steps") or BACKTEST_CONFIG["WFO_PARALLEL_STEPS"]
+        if validation_mode(self.settings) in CV_MODES and not self.settings.get("parallel_steps"):
+            # Разбиения CV независимы друг от друга, поэтому по умолчанию выполняются параллельно
+            parallel_steps = os.cpu_count() or 1
+        max_workers = self.settings.get("max_workers") or BACKTEST_CONFIG["WFO_MAX_WORKERS"]
+
+        if parallel_steps <= 1:
+            return 1, max_workers if max_workers > 0 else -1
+
+        total_workers = max_workers if max_workers > 0 else (os.cpu_count() or 1)
+        parallel_steps = max(1, min(parallel_steps, num_steps, total_workers))
+        return parallel_steps, max(1, total_workers // parallel_steps)
+
+    def _run_steps_parallel(self,
+                            all_instrument_periods: Dict[str, PeriodSplit],
+                            num_steps: int,
+                            parallel_steps: int,
+                            n_jobs: int,
+                            feature_matrices: Dict[str, FeatureMatrix]) -> Tuple[List[pd.DataFrame], List[Dict[str, Any]], optuna.Study | None]:
+        """
+        Выполняет независимые шаги WFO одновременно в пуле процессов.
+
+        Шаги завершаются в произвольном порядке, но результаты объединяются строго
+        по номеру шага, поэтому итог совпадает с последовательным режимом.
+        """
+        logger.info(f"Параллельный WFO: {parallel_steps} шаг(ов) одновременно, n_jobs={n_jobs} на шаг.")
+        if self._warm_start_top_k() > 0:
+            logger.warning("Прогрев шагов WFO требует последовательного выполнения и в параллельном режиме отключен.")
+        # В дочерних процессах прогресс-бары Optuna перемешиваются, поэтому отключаем их
+        step_settings = {**self.settings, "n_jobs": n_jobs, "show_progress_bar": False}
+
+        step_outputs = {}
+        with ProcessPoolExecutor(max_workers=parallel_steps,
+                                 initializer=_init_step_worker,
+                                 initargs=(step_settings, all_instrument_periods, feature_matrices)) as executor:
+            futures = [executor.submit(_run_step_in_worker, step_num) for step_num in range(1, num_steps + 1)]
+            for future in as_completed(futures):
+                step_num, oos_trades_df, step_summary, trials, directions = future.result()
+                step_outputs[step_num] = (oos_trades_df, step_summary, trials, directions)
+                logger.info(f"Шаг {step_num} завершен ({len(step_outputs)}/{num_steps}).")
+
+        all_oos_trades, step_results = [], []
+        for step_num in sorted(step_outputs):
+            oos_trades_df, step_summary, _, _ = step_outputs[step_num]
+            if not oos_trades_df.empty:
+                all_oos_trades.append(oos_trades_df)
+            if step_summary:
+                step_results.append(step_summary)
+
+        # Study последнего шага восстанавливается из его trials для отчетов Optuna
+        _, _, last_trials, last_directions = step_outputs[num_steps]
+        last_study = optuna.create_study(directions=last_directions)
+        last_study.add_trials(last_trials)
+
+        return all_oos_trades, step_results, last_study
+
     def run(self):
         """
         Запускает полный процесс Walk-Forward Optimization от начала до конца.
         """
         try:
-            # --- Шаг 1: Подготовка данных ---
-            preparer = WFODataPreparer(self.settings)
-            all_instrument_periods, num_steps = preparer.prepare()
-
-            # --- Шаг 2: Цикл WFO ---
-            all_oos_trades, step_results = [], []
-            last_study: optuna.Study | None = None
-
-            for step_num in range(1, num_steps + 1):
-                # Определяем срезы данных для текущего шага
-                train_start, train_end = step_num - 1, step_num - 1 + self.settings["train_periods"]
-                test_start, test_end = train_end, train_end + self.settings["test_periods"]
-
-                train_slices = {i: pd.concat(p[train_start:train_end]) for i, p in all_instrument_periods.items()}
-                test_slices = {i: pd.concat(p[test_start:test_end]) for i, p in all_instrument_periods.items()}
-
-                # Запускаем один шаг
-                step_runner = WFOStepRunner(
-                    self.settings,
-                    step_num,
-                    train_slices,
-                    test_slices,
-                    feature_engine=self.feature_engine
-                )
-                oos_trades_df, step_summary, study = step_runner.run()
-
-                # Собираем результаты
-                if not oos_trades_df.empty:
-                    all_oos_trades.append(oos_trades_df)
-                if step_summary:
-                    step_results.append(step_summary)
-                last_study = study
+            all_oos_trades, step_results, last_study = self.run_walk_forward()
 
             # --- Шаг 3: Генерация отчетов ---
-            reporter = OptimizationReporter(self.settings, all_oos_trades, step_results, last_study)
+            reporter = OptimizationReporter(self.settings, all_oos_trades, step_results, last_study,
+                                            path_metrics=self.path_metrics)
             reporter.generate_all_reports()
 
         except (FileNotFoundError, ValueError) as e:
             logger.error(f"Ошибка подготовки или выполнения WFO: {e}")
         except Exception:
-            logger.critical("Произошла непредвиденная ошибка в процессе WFO!", exc_info=True)
\ No newline at end of file
+            logger.critical("Произошла непредвиденная ошибка в процессе WFO!", exc_info=True)
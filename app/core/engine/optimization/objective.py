@@ -1,8 +1,14 @@
+import hashlib
+import threading
+
 import optuna
 import pandas as pd
 import queue
 
+from app.core.calculations.indicator_space import IndicatorSpace
 from app.core.engine.backtest.loop import BacktestEngine
+from app.core.engine.backtest.profiling import ProfileAggregator
+from app.core.engine.backtest.signal_cache import SignalCache
 from app.core.risk.manager import AVAILABLE_RISK_MANAGERS
 from app.core.analysis.metrics import PortfolioMetricsCalculator
 from app.core.analysis.constants import METRIC_CONFIG
@@ -20,6 +26,10 @@ class Objective:
     """
     Класс-обертка для целевой функции Optuna.
     Принимает уже подготовленные срезы данных для каждого инструмента.
+
+    Срез инструмента — это DataFrame или список непрерывных отрезков (обучающая выборка
+    purged k-fold / CPCV с вырезанными тестовыми группами). Каждый отрезок прогоняется
+    отдельным бэктестом, а сделки всех отрезков объединяются в одну последовательность.
     """
 
     def __init__(self,
@@ -29,7 +39,14 @@ class Objective:
                  risk_manager_type,
                  train_data_slices,
                  metrics,
-                 feature_engine):
+                 feature_engine,
+                 profile_aggregator: ProfileAggregator | None = None,
+                 precompute_features: bool | None = None,
+                 early_abort: dict | None = None,
+                 fidelity_rungs: list[float] | None = None,
+                 fidelity_mode: str | None = None,
+                 fidelity_reduction: int | None = None,
+                 feature_matrices: dict | None = None):
         self.strategy_class = strategy_class
         self.exchange = exchange
         self.interval = interval
@@ -40,6 +57,180 @@ class Objective:
         self.annualization_factor = EXCHANGE_SPECIFIC_CONFIG[exchange]["SHARPE_ANNUALIZATION_FACTOR"]
         self.total_initial_capital = BACKTEST_CONFIG["INITIAL_CAPITAL"]
         self.feature_engine = feature_engine
+        # Если передан агрегатор, каждый бэктест профилируется и его тайминги суммируются
+        self.profile_aggregator = profile_aggregator
+
+        # Кэш результатов trials: TPE на дискретных сетках часто повторяет уже проверенные комбинации.
+        # Значение — метрики (user_attrs) или None, если trial был отброшен (pruned).
+        self.window_id = self._window_fingerprint(train_data_slices)
+        self._trial_cache: dict[tuple, dict | None] = {}
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+
+        # Все индикаторы, достижимые из params_config, считаются один раз на срез,
+        # а trials только копируют нужные колонки
+        if precompute_features is None:
+            precompute_features = BACKTEST_CONFIG["WFO_PRECOMPUTE_FEATURES"]
+        self.indicator_space = self._build_indicator_space() if precompute_features else None
+        # Готовые матрицы (anchored WFO режет их из расчета по всей истории) не пересчитываются
+        self.feature_matrices = (feature_matrices if feature_matrices is not None
+                                 else self._build_feature_matrices(train_data_slices))
+
+        # Многоуровневая точность (successive halving): trial сначала оценивается на доле
+        # окна или на части инструментов, и только перспективные доходят до полного среза
+        self.fidelity_rungs = self._resolve_fidelity_rungs(fidelity_rungs)
+        self.fidelity_mode = fidelity_mode or BACKTEST_CONFIG["WFO_FIDELITY_MODE"]
+        self.fidelity_reduction = fidelity_reduction or BACKTEST_CONFIG["WFO_FIDELITY_REDUCTION"]
+        self.fidelity_levels = []
+        seen_levels = {self._slices_shape(train_data_slices)}
+        for rung in list(self.fidelity_rungs):
+            slices = self._fidelity_slices(rung)
+            if self._slices_shape(slices) in seen_levels:
+                # Уровень совпал с полным срезом или предыдущим уровнем (например, из-за округления числа инструментов)
+                self.fidelity_rungs.remove(rung)
+                continue
+            seen_levels.add(self._slices_shape(slices))
+            if all(slices[inst] is self.train_data_slices[inst] for inst in slices):
+                # Подмножество инструментов: срезы те же, матрицы уже построены
+                matrices = {inst: m for inst, m in self.feature_matrices.items() if inst in slices}
+            else:
+                matrices = self._build_feature_matrices(slices)
+            self.fidelity_levels.append((slices, matrices))
+
+        # Сигналы стратегии переиспользуются trials, которые отличаются только параметрами риск-менеджера
+        cache_size = BACKTEST_CONFIG["SIGNAL_CACHE_SIZE"]
+        self.signal_cache = SignalCache(max_entries=cache_size) if cache_size > 0 else None
+
+        # Критерии досрочной остановки бэктеста (см. engine/backtest/abort.py)
+        self.early_abort = early_abort if early_abort is not None else BACKTEST_CONFIG["EARLY_ABORT"]
+        self.aborted_trials = 0
+
+    def _build_indicator_space(self) -> IndicatorSpace | None:
+        try:
+            return IndicatorSpace(self.strategy_class, self.risk_manager_type)
+        except Exception:
+            logger.warning("Не удалось построить пространство индикаторов, предрасчет отключен.", exc_info=True)
+            return None
+
+    def _build_feature_matrices(self, data_slices: dict) -> dict:
+        if self.indicator_space is None:
+            return {}
+        matrices = {}
+        for instrument, data_slice in data_slices.items():
+            if isinstance(data_slice, list):
+                matrices[instrument] = [
+                    self.indicator_space.build(df, self.feature_engine) if not df.empty else None
+                    for df in data_slice
+                ]
+            elif not data_slice.empty:
+                matrices[instrument] = self.indicator_space.build(data_slice, self.feature_engine)
+        logger.info(f"Предрасчитано {len(self.indicator_space.requirements)} индикаторов "
+                    f"для {len(matrices)} инструментов.")
+        return matrices
+
+    def _resolve_fidelity_rungs(self, fidelity_rungs: list[float] | None) -> list[float]:
+        """Доли точности меньше 1 по возрастанию. Для многокритериальной оптимизации уровни не используются."""
+        if fidelity_rungs is None:
+            fidelity_rungs = BACKTEST_CONFIG["WFO_FIDELITY_RUNGS"]
+        rungs = sorted({float(r) for r in fidelity_rungs if 0 < r < 1})
+        if rungs and len(self.target_metrics) > 1:
+            logger.warning("Многоуровневая точность работает только с одной метрикой, trials оцениваются полностью.")
+            return []
+        return rungs
+
+    def build_pruner(self) -> optuna.pruners.BasePruner | None:
+        """
+        Прунер для уровней точности (None — прунер Optuna по умолчанию).
+
+        Уровень k сообщается как шаг reduction**k, поэтому SuccessiveHalvingPruner
+        с min_resource=1 проверяет trial на каждом уровне и пропускает дальше
+        лучшую 1/reduction часть trials.
+        """
+        if not self.fidelity_levels:
+            return None
+        return optuna.pruners.SuccessiveHalvingPruner(min_resource=1, reduction_factor=self.fidelity_reduction)
+
+    @staticmethod
+    def _segments(data_slice) -> list:
+        """Отрезки среза инструмента: список как есть, DataFrame — как один отрезок."""
+        return data_slice if isinstance(data_slice, list) else [data_slice]
+
+    @classmethod
+    def _slices_shape(cls, data_slices: dict) -> tuple:
+        return tuple(
+            (instrument, tuple(len(df) for df in cls._segments(data_slice)))
+            for instrument, data_slice in data_slices.items()
+        )
+
+    def _fidelity_slices(self, rung: float) -> dict:
+        """
+        Срезы данных для уровня точности.
+
+        В режиме 'instruments' берется первая доля инструментов портфеля,
+        в режиме 'window' (и для одного инструмента) — последняя доля каждого окна.
+        """
+        if self.fidelity_mode == "instruments" and len(self.instrument_list) > 1:
+            n_instruments = max(1, int(len(self.instrument_list) * rung))
+            return {inst: self.train_data_slices[inst] for inst in self.instrument_list[:n_instruments]}
+        def tail(df: pd.DataFrame) -> pd.DataFrame:
+            return df.iloc[len(df) - max(1, int(len(df) * rung)):] if not df.empty else df
+
+        return {
+            instrument: [tail(df) for df in data_slice] if isinstance(data_slice, list) else tail(data_slice)
+            for instrument, data_slice in self.train_data_slices.items()
+        }
+
+    @classmethod
+    def _window_fingerprint(cls, train_data_slices) -> tuple:
+        """Идентификатор обучающего окна: инструмент, длина и границы по времени каждого отрезка."""
+        return tuple(
+            (instrument, len(df), df['time'].iloc[0], df['time'].iloc[-1])
+            for instrument, data_slice in train_data_slices.items()
+            for df in cls._segments(data_slice) if not df.empty
+        )
+
+    @property
+    def window_key(self) -> str:
+        """Стабильная строка-отпечаток обучающего окна (сохраняется в исследовании Optuna)."""
+        return hashlib.sha1(repr(self.window_id).encode("utf-8")).hexdigest()
+
+    def _cache_key(self, params: dict) -> tuple:
+        """Канонический ключ trial: отсортированные параметры (float округлены) и окно данных."""
+        canonical = tuple(sorted(
+            (name, round(value, 10) if isinstance(value, float) else value)
+            for name, value in params.items()
+        ))
+        return canonical, self.window_id
+
+    def seed_cache(self, trials: list[optuna.trial.FrozenTrial]) -> int:
+        """
+        Заполняет кэш результатами уже завершенных trials (например, при продолжении исследования).
+
+        :param trials: Trials исследования, выполненного на том же обучающем окне.
+        :return: Количество trials, попавших в кэш.
+        """
+        seeded = 0
+        with self._cache_lock:
+            for t in trials:
+                if t.state == optuna.trial.TrialState.COMPLETE and all(m in t.user_attrs for m in self.target_metrics):
+                    self._trial_cache[self._cache_key(t.params)] = dict(t.user_attrs)
+                    seeded += 1
+                elif t.state == optuna.trial.TrialState.PRUNED:
+                    self._trial_cache[self._cache_key(t.params)] = None
+                    seeded += 1
+        return seeded
+
+    def _objective_value(self, trial: optuna.Trial) -> float | tuple[float, ...]:
+        if len(self.target_metrics) == 1:
+            return trial.user_attrs[self.target_metrics[0]]
+        return tuple(trial.user_attrs[m] for m in self.target_metrics)
+
+    def _sentinel_values(self) -> dict:
+        """Заведомо худшие значения целевых метрик с учетом направления оптимизации."""
+        return {
+            m: -1e9 if METRIC_CONFIG[m]['direction'] == 'maximize' else 1e9
+            for m in self.target_metrics
+        }
 
     def _suggest_params(self, trial: optuna.Trial) -> tuple[dict, dict]:
         strategy_params = {}
@@ -79,65 +270,165 @@ class Objective:
     def __call__(self, trial: optuna.Trial) -> float | tuple[float, ...]:
         try:
             strategy_params, rm_params = self._suggest_params(trial)
-            all_instrument_trades = []
-            capital_per_instrument = self.total_initial_capital / len(self.instrument_list)
-
-            for instrument, instrument_data_slice in self.train_data_slices.items():
-                if instrument_data_slice.empty:
-                    continue
-
-                backtest_settings = {
-                    "strategy_class": self.strategy_class, "exchange": self.exchange,
-                    "instrument": instrument, "interval": self.interval,
-                    "risk_manager_type": self.risk_manager_type,
-                    "initial_capital": capital_per_instrument,
-                    "commission_rate": BACKTEST_CONFIG["COMMISSION_RATE"],
-                    "strategy_params": strategy_params, "risk_manager_params": rm_params,
-                    "data_slice": instrument_data_slice,
-                    "data_dir": PATH_CONFIG["DATA_DIR"]
-                }
-
-                events_queue = queue.Queue()
-                engine = BacktestEngine(
-                    settings=backtest_settings,
-                    events_queue=events_queue,
-                    feature_engine=self.feature_engine
-                )
-
-                backtest_results = engine.run()
-
-                if backtest_results["status"] == "success" and not backtest_results["trades_df"].empty:
-                    all_instrument_trades.append(backtest_results["trades_df"])
-
-            if not all_instrument_trades:
-                raise optuna.TrialPruned("Ни на одном инструменте не было совершено сделок.")
 
+            cache_key = self._cache_key(trial.params)
+            with self._cache_lock:
+                is_cached = cache_key in self._trial_cache
+                cached = self._trial_cache.get(cache_key)
+                self.cache_hits += is_cached
+            if is_cached:
+                if cached is None:
+                    raise optuna.TrialPruned("Повтор ранее отброшенной комбинации параметров.")
+                for metric_key, value in cached.items():
+                    trial.set_user_attr(metric_key, value)
+                return self._objective_value(trial)
+
+            try:
+                return self._evaluate(trial, strategy_params, rm_params, cache_key)
+            except optuna.TrialPruned:
+                with self._cache_lock:
+                    self._trial_cache[cache_key] = None
+                raise
+
+        except optuna.TrialPruned as e:
+            raise e
+        except Exception:
+            logger.error(f"Критическая ошибка в trial #{trial.number}", exc_info=True)
+            sentinel = tuple(self._sentinel_values().values())
+            return sentinel[0] if len(sentinel) == 1 else sentinel
+
+    def _evaluate(self, trial: optuna.Trial, strategy_params: dict, rm_params: dict,
+                  cache_key: tuple) -> float | tuple[float, ...]:
+        """Прогоняет бэктесты по всем инструментам, записывает метрики в trial и кэш."""
+        # Сначала дешевые уровни точности: по промежуточному значению метрики
+        # прунер решает, стоит ли переводить trial на полный срез
+        for level, (data_slices, feature_matrices) in enumerate(self.fidelity_levels):
+            try:
+                metrics, abort = self._run_backtests(data_slices, feature_matrices, strategy_params, rm_params)
+            except optuna.TrialPruned:
+                # Отсутствие сделок на укороченном срезе еще ничего не говорит о полном
+                continue
+            if abort is not None:
+                return self._record_abort(trial, *abort, cache_key)
+            trial.report(metrics[self.target_metrics[0]], self.fidelity_reduction ** level)
+            if trial.should_prune():
+                raise optuna.TrialPruned(f"Отброшен на уровне точности {self.fidelity_rungs[level]}.")
+
+        all_calculated_metrics, abort = self._run_backtests(
+            self.train_data_slices, self.feature_matrices, strategy_params, rm_params
+        )
+        if abort is not None:
+            return self._record_abort(trial, *abort, cache_key)
+
+        for metric_key, value in all_calculated_metrics.items():
+            trial.set_user_attr(metric_key, value)
+
+        with self._cache_lock:
+            self._trial_cache[cache_key] = dict(trial.user_attrs)
+
+        return self._objective_value(trial)
+
+    @staticmethod
+    def _segment_tasks(data_slices: dict, feature_matrices: dict) -> list:
+        """
+        Список бэктестов (инструмент, отрезок, матрица индикаторов).
+
+        Отрезки одного инструмента идут друг за другом во времени, поэтому каждый
+        получает капитал инструмента, а их сделки складываются в общую последовательность.
+        """
+        tasks = []
+        for instrument, data_slice in data_slices.items():
+            matrices = feature_matrices.get(instrument)
+            if isinstance(data_slice, list):
+                tasks.extend(zip([instrument] * len(data_slice), data_slice, matrices or [None] * len(data_slice)))
+            else:
+                tasks.append((instrument, data_slice, matrices))
+        return tasks
+
+    def _run_backtests(self, data_slices: dict, feature_matrices: dict, strategy_params: dict,
+                       rm_params: dict) -> tuple[dict | None, tuple[str, str] | None]:
+        """
+        Прогоняет бэктесты по срезам инструментов и считает портфельные метрики.
+
+        :return: (метрики, None) или (None, (инструмент, причина)), если бэктест остановлен досрочно.
+        :raises optuna.TrialPruned: Если сделок недостаточно для расчета метрик.
+        """
+        all_instrument_trades = []
+        all_instrument_metrics = []
+        capital_per_instrument = self.total_initial_capital / len(self.instrument_list)
+
+        segment_tasks = self._segment_tasks(data_slices, feature_matrices)
+
+        for instrument, instrument_data_slice, feature_matrix in segment_tasks:
+            if instrument_data_slice.empty:
+                continue
+
+            backtest_settings = {
+                "strategy_class": self.strategy_class, "exchange": self.exchange,
+                "instrument": instrument, "interval": self.interval,
+                "risk_manager_type": self.risk_manager_type,
+                "initial_capital": capital_per_instrument,
+                "commission_rate": BACKTEST_CONFIG["COMMISSION_RATE"],
+                "strategy_params": strategy_params, "risk_manager_params": rm_params,
+                "data_slice": instrument_data_slice,
+                "data_dir": PATH_CONFIG["DATA_DIR"],
+                "profile": self.profile_aggregator is not None,
+                "feature_matrix": feature_matrix,
+                "signal_cache": self.signal_cache,
+                "early_abort": self.early_abort
+            }
+
+            events_queue = queue.Queue()
+            engine = BacktestEngine(
+                settings=backtest_settings,
+                events_queue=events_queue,
+                feature_engine=self.feature_engine
+            )
+
+            backtest_results = engine.run()
+            if self.profile_aggregator is not None:
+                self.profile_aggregator.add(backtest_results["profile"])
+
+            if backtest_results["status"] == "aborted":
+                # Комбинация безнадежна: остальные инструменты не прогоняем
+                return None, (instrument, backtest_results["abort_reason"])
+
+            if backtest_results["status"] == "success" and not backtest_results["trades_df"].empty:
+                all_instrument_trades.append(backtest_results["trades_df"])
+                all_instrument_metrics.append(backtest_results["metrics"])
+
+        if not all_instrument_trades:
+            raise optuna.TrialPruned("Ни на одном инструменте не было совершено сделок.")
+
+        if len(segment_tasks) == 1:
+            # Один инструмент: метрики уже накоплены движком, DataFrame не нужен.
+            # Нулевое число сделок в словаре означает, что метрики не определены.
+            all_calculated_metrics = all_instrument_metrics[0]
+            if all_calculated_metrics['total_trades'] == 0:
+                raise optuna.TrialPruned("Недостаточно сделок для расчета метрик.")
+        else:
             portfolio_trades_df = pd.concat(all_instrument_trades, ignore_index=True)
             portfolio_trades_df.sort_values(by='exit_timestamp_utc', inplace=True)
 
-            calculator = PortfolioMetricsCalculator(portfolio_trades_df, self.total_initial_capital, self.annualization_factor)
+            portfolio_capital = (self.total_initial_capital if len(data_slices) == len(self.instrument_list)
+                                 else capital_per_instrument * len(data_slices))
+            calculator = PortfolioMetricsCalculator(portfolio_trades_df, portfolio_capital, self.annualization_factor)
 
             if not calculator.is_valid:
                 raise optuna.TrialPruned("Недостаточно сделок для расчета метрик.")
 
             all_calculated_metrics = calculator.calculate_all()
-            for metric_key, value in all_calculated_metrics.items():
-                trial.set_user_attr(metric_key, value)
+        return all_calculated_metrics, None
 
-            if len(self.target_metrics) == 1:
-                return trial.user_attrs[self.target_metrics[0]]
-            else:
-                return tuple(trial.user_attrs[m] for m in self.target_metrics)
+    def _record_abort(self, trial: optuna.Trial, instrument: str, reason: str,
+                      cache_key: tuple) -> float | tuple[float, ...]:
+        """Записывает в trial сентинельные метрики и причину досрочной остановки."""
+        for metric_key, value in self._sentinel_values().items():
+            trial.set_user_attr(metric_key, value)
+        trial.set_user_attr("abort_reason", f"{instrument}: {reason}")
 
-        except optuna.TrialPruned as e:
-            raise e
-        except Exception:
-            logger.error(f"Критическая ошибка в trial #{trial.number}", exc_info=True)
-            if len(self.target_metrics) == 1:
-                direction = METRIC_CONFIG[self.target_metrics[0]]['direction']
-                return -1e9 if direction == 'maximize' else 1e9
-            else:
-                return tuple(
-                    -1e9 if METRIC_CONFIG[m]['direction'] == 'maximize' else 1e9
-                    for m in self.target_metrics
-                )
\ No newline at end of file
+        with self._cache_lock:
+            self._trial_cache[cache_key] = dict(trial.user_attrs)
+            self.aborted_trials += 1
+
+        return self._objective_value(trial)
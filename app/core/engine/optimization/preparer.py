@@ -1,16 +1,34 @@
-import pandas as pd
 import logging
 from tqdm import tqdm
-from typing import Dict, List, Tuple, Any
+from typing import Dict, Tuple, Any
 
-from app.core.engine.optimization.splitter import split_data_by_periods
+from app.core.engine.optimization.splitter import PeriodSplit, combinatorial_splits
 from app.infrastructure.feeds.local import HistoricLocalDataHandler
 from app.shared.config import config
 
 PATH_CONFIG = config.PATH_CONFIG
+BACKTEST_CONFIG = config.BACKTEST_CONFIG
 
 logger = logging.getLogger(__name__)
 
+# Схемы кросс-валидации: шаг — разбиение групп периодов, а не сдвиг окна
+CV_MODES = ("kfold", "cpcv")
+
+
+def validation_mode(settings: Dict[str, Any]) -> str:
+    """
+    Схема разбиения: 'wfo' (скользящее окно), 'anchored' (окно обучения расширяется от начала истории),
+    'kfold' (purged k-fold) или 'cpcv'.
+    """
+    return settings.get("validation_mode") or "wfo"
+
+
+def cv_test_groups(settings: Dict[str, Any]) -> int:
+    """Число тестовых групп в одном разбиении CV (для k-fold всегда 1)."""
+    if validation_mode(settings) == "kfold":
+        return 1
+    return settings.get("cv_test_groups") or BACKTEST_CONFIG["CV_TEST_GROUPS"]
+
 
 class WFODataPreparer:
     """
@@ -23,38 +41,39 @@ class WFODataPreparer:
 
         :param data_settings: Словарь с настройками, содержащий 'instrument_list',
                          'exchange', 'interval', 'total_periods', 'train_periods',
-                         'test_periods'.
+                         'test_periods' и опционально 'data_dir'.
         """
         self.data_settings = data_settings
 
-    def prepare(self) -> Tuple[Dict[str, List[pd.DataFrame]], int]:
+    def prepare(self) -> Tuple[Dict[str, PeriodSplit], int]:
         """
         Загружает, нарезает данные и проверяет их на достаточность для WFO.
 
         :return: Кортеж, содержащий:
-                 - Словарь, где ключ - инструмент, значение - список его периодов (DataFrame).
-                 - Количество шагов (сдвигов окна), которые можно будет сделать.
+                 - Словарь, где ключ - инструмент, значение - его данные, размеченные на периоды.
+                 - Количество шагов (сдвигов окна или разбиений CV), которые можно будет сделать.
         :raises FileNotFoundError: Если не удалось загрузить данные ни для одного инструмента.
         :raises ValueError: Если данных недостаточно для проведения WFO с заданными параметрами.
         """
         logger.info("--- Предварительная загрузка и нарезка данных ---")
         all_instrument_periods = {}
         instrument_list = self.data_settings["instrument_list"]
+        data_dir = self.data_settings.get("data_dir", PATH_CONFIG["DATA_DIR"])
 
         for instrument in tqdm(instrument_list, desc="Подготовка данных"):
             data_handler = HistoricLocalDataHandler(
                 exchange=self.data_settings["exchange"],
                 instrument_id=instrument,
                 interval_str=self.data_settings["interval"],
-                data_path=PATH_CONFIG["DATA_DIR"]
+                data_path=data_dir
             )
             full_dataset = data_handler.load_raw_data()
             if full_dataset.empty:
                 logger.warning(f"Не удалось загрузить данные для {instrument}. Пропускаем.")
                 continue
 
-            # Делегируем нарезку функции из splitter.py
-            all_instrument_periods[instrument] = split_data_by_periods(
+            # Данные не копируются по периодам: храним один DataFrame и границы периодов
+            all_instrument_periods[instrument] = PeriodSplit(
                 full_dataset, self.data_settings["total_periods"]
             )
 
@@ -63,6 +82,12 @@ class WFODataPreparer:
 
         # Проверяем достаточность данных на примере первого инструмента
         first_instrument_periods = next(iter(all_instrument_periods.values()))
+        if validation_mode(self.data_settings) in CV_MODES:
+            # Для кросс-валидации шаг — это одно разбиение групп на обучение и тест
+            return all_instrument_periods, len(
+                combinatorial_splits(len(first_instrument_periods), cv_test_groups(self.data_settings))
+            )
+
         num_steps = (
                 len(first_instrument_periods)
                 - self.data_settings["train_periods"]
@@ -2,7 +2,7 @@ import os
 import pandas as pd
 import logging
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import optuna
 
@@ -26,7 +26,8 @@ class OptimizationReporter:
     """
 
     def __init__(self, settings: Dict, all_oos_trades: List[pd.DataFrame],
-                 step_results: List[Dict], last_study: optuna.Study):
+                 step_results: List[Dict], last_study: optuna.Study,
+                 path_metrics: Optional[pd.DataFrame] = None):
         """
         Инициализирует генератор отчетов.
 
@@ -34,11 +35,13 @@ class OptimizationReporter:
         :param all_oos_trades: Список DataFrame'ов, где каждый df - сделки одного OOS-шага.
         :param step_results: Список словарей со сводной информацией по каждому шагу.
         :param last_study: Объект Study от Optuna, соответствующий последнему шагу WFO.
+        :param path_metrics: Метрики OOS-путей кросс-валидации (purged k-fold / CPCV), по строке на путь.
         """
         self.settings = settings
         self.all_oos_trades = all_oos_trades
         self.step_results = step_results
         self.last_study = last_study
+        self.path_metrics = path_metrics
         self.base_filepath = self._create_base_filepath()
 
     def _create_base_filepath(self) -> str:
@@ -54,7 +57,8 @@ class OptimizationReporter:
             else self.settings.get("instrument")
         )
 
-        filename = f"{timestamp}_WFO_{self.settings['strategy']}_{instrument_name}"
+        mode_tag = (self.settings.get("validation_mode") or "wfo").upper()
+        filename = f"{timestamp}_{mode_tag}_{self.settings['strategy']}_{instrument_name}"
         return os.path.join(report_dir, filename)
 
     def _create_hover_text(self, trials: List[optuna.trial.FrozenTrial]) -> List[str]:
@@ -121,6 +125,10 @@ class OptimizationReporter:
         pd.DataFrame(self.step_results).to_csv(f"{self.base_filepath}_steps_summary.csv", index=False)
         logger.info(f"Сводка по шагам WFO сохранена в: {self.base_filepath}_steps_summary.csv")
 
+        if self.path_metrics is not None:
+            self.path_metrics.to_csv(f"{self.base_filepath}_oos_paths.csv", index_label="path")
+            logger.info(f"Метрики {len(self.path_metrics)} OOS-путей сохранены в: {self.base_filepath}_oos_paths.csv")
+
         # 2. Сохраняем визуализации Optuna
         self._save_optuna_visualizations()
 
@@ -1,5 +1,7 @@
+import itertools
+
 import pandas as pd
-from typing import List, Tuple, Generator
+from typing import List, Tuple, Generator, Sequence
 import numpy as np
 
 def split_data_by_periods(data: pd.DataFrame, total_periods: int) -> List[pd.DataFrame]:
@@ -13,20 +15,81 @@ def split_data_by_periods(data: pd.DataFrame, total_periods: int) -> List[pd.Dat
     # Это надежнее, чем делить по индексам, особенно если в данных есть пропуски.
     return np.array_split(data, total_periods)
 
+
+def period_bounds(n_rows: int, total_periods: int) -> np.ndarray:
+    """
+    Рассчитывает границы периодов в позиционных индексах.
+
+    Разбиение совпадает с np.array_split: первые (n_rows % total_periods) периодов
+    длиннее остальных на одну строку.
+
+    :param n_rows: Количество строк в данных.
+    :param total_periods: Количество периодов.
+    :return: Массив из total_periods + 1 границ; период i — это строки [bounds[i], bounds[i+1]).
+    """
+    base, extra = divmod(n_rows, total_periods)
+    sizes = np.full(total_periods, base, dtype=np.int64)
+    sizes[:extra] += 1
+    return np.concatenate(([0], np.cumsum(sizes)))
+
+
+class PeriodSplit:
+    """
+    Данные одного инструмента, размеченные на периоды границами индексов.
+
+    Вместо списка отдельных DataFrame хранит один непрерывный DataFrame и границы периодов.
+    Окно из нескольких подряд идущих периодов возвращается срезом `iloc` (view, без копирования
+    и без pd.concat), поэтому подготовка шага WFO не дублирует данные.
+    """
+
+    def __init__(self, data: pd.DataFrame, total_periods: int):
+        """
+        :param data: Полный датасет инструмента.
+        :param total_periods: Количество периодов, на которые делятся данные.
+        """
+        self.data = data
+        self.bounds = period_bounds(len(data), total_periods)
+
+    def __len__(self) -> int:
+        return len(self.bounds) - 1
+
+    def __getitem__(self, period: int) -> pd.DataFrame:
+        """Возвращает один период (для совместимости со списком периодов)."""
+        return self.slice(period, period + 1)
+
+    def slice(self, start_period: int, end_period: int) -> pd.DataFrame:
+        """
+        Возвращает окно из периодов [start_period, end_period).
+
+        :param start_period: Первый период окна (включительно).
+        :param end_period: Последний период окна (не включительно).
+        """
+        return self.data.iloc[self.bounds[start_period]:self.bounds[end_period]]
+
+    def segments(self, indices: np.ndarray) -> List[pd.DataFrame]:
+        """
+        Возвращает строки с указанными номерами как список непрерывных срезов (views).
+        Разрывы между отрезками не склеиваются, чтобы бэктест не видел ложных скачков цены.
+
+        :param indices: Возрастающий массив номеров строк.
+        """
+        return [self.data.iloc[start:end] for start, end in contiguous_segments(indices)]
+
+
 def walk_forward_generator(
-        data_periods: List[pd.DataFrame],
+        periods: PeriodSplit,
         train_periods: int,
         test_periods: int
 ) -> Generator[Tuple[pd.DataFrame, pd.DataFrame, int], None, None]:
     """
     Генератор, который создает пары (train_df, test_df) для Walk-Forward Optimization.
 
-    :param data_periods: Список DataFrame'ов, где каждый элемент - один период.
+    :param periods: Данные инструмента, размеченные на периоды.
     :param train_periods: Количество периодов для обучающей выборки.
     :param test_periods: Количество периодов для тестовой выборки.
     :yields: Кортеж (train_df, test_df, step_number).
     """
-    total_periods = len(data_periods)
+    total_periods = len(periods)
 
     # Рассчитываем количество "шагов" (сдвигов окна), которые мы можем сделать.
     num_steps = total_periods - train_periods - test_periods + 1
@@ -42,8 +105,79 @@ def walk_forward_generator(
         test_start = train_end
         test_end = test_start + test_periods
 
-        # "Склеиваем" части в единые DataFrame'ы
-        train_df = pd.concat(data_periods[train_start:train_end], ignore_index=True)
-        test_df = pd.concat(data_periods[test_start:test_end], ignore_index=True)
+        # Окна — это срезы одного непрерывного DataFrame, без склейки
+        train_df = periods.slice(train_start, train_end)
+        test_df = periods.slice(test_start, test_end)
+
+        yield train_df, test_df, i + 1
+
 
-        yield train_df, test_df, i + 1
\ No newline at end of file
+def contiguous_segments(indices: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Разбивает отсортированный массив позиционных индексов на непрерывные отрезки.
+
+    :param indices: Возрастающий массив номеров строк.
+    :return: Список полуинтервалов (start, end) — строки [start, end).
+    """
+    if len(indices) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(indices)]))
+    return [(int(indices[s]), int(indices[e - 1]) + 1) for s, e in zip(starts, ends)]
+
+
+def purged_train_indices(bounds: np.ndarray,
+                         test_groups: Sequence[int],
+                         purge_bars: int = 0,
+                         embargo_bars: int = 0) -> np.ndarray:
+    """
+    Номера строк обучающей выборки для кросс-валидации с очисткой (purging) и эмбарго.
+
+    Обучение — все группы, кроме тестовых, минус `purge_bars` строк перед каждой тестовой
+    группой (сделки и индикаторы обучения не должны заглядывать в тест) и `embargo_bars`
+    строк после нее (сериальная корреляция сразу после теста).
+
+    :param bounds: Границы групп (см. `period_bounds`).
+    :param test_groups: Номера тестовых групп.
+    :param purge_bars: Сколько строк удалить перед каждой тестовой группой.
+    :param embargo_bars: Сколько строк удалить после каждой тестовой группы.
+    :return: Возрастающий массив номеров строк.
+    """
+    n_rows = int(bounds[-1])
+    mask = np.ones(n_rows, dtype=bool)
+    for group in test_groups:
+        start, end = int(bounds[group]), int(bounds[group + 1])
+        mask[max(0, start - purge_bars):min(n_rows, end + embargo_bars)] = False
+    return np.flatnonzero(mask)
+
+
+def combinatorial_splits(n_groups: int, n_test_groups: int) -> List[Tuple[int, ...]]:
+    """
+    Все наборы тестовых групп для combinatorial purged cross-validation (CPCV).
+    При n_test_groups=1 это обычный k-fold.
+
+    :return: Список кортежей номеров тестовых групп (в лексикографическом порядке).
+    """
+    if not 1 <= n_test_groups < n_groups:
+        raise ValueError("Число тестовых групп должно быть от 1 до n_groups - 1.")
+    return list(itertools.combinations(range(n_groups), n_test_groups))
+
+
+def cpcv_paths(n_groups: int, n_test_groups: int) -> List[List[int]]:
+    """
+    Собирает OOS-пути CPCV из разбиений `combinatorial_splits`.
+
+    Каждая группа тестируется в C(N-1, k-1) разбиениях; j-й путь берет для каждой группы
+    ее j-е по порядку тестовое разбиение. Так получается C(N-1, k-1) полных OOS-историй,
+    каждая из которых покрывает все группы ровно по одному разу.
+
+    :return: Список путей; путь — список номеров разбиений по группам (индекс — номер группы).
+    """
+    splits = combinatorial_splits(n_groups, n_test_groups)
+    occurrences: List[List[int]] = [[] for _ in range(n_groups)]
+    for split_index, test_groups in enumerate(splits):
+        for group in test_groups:
+            occurrences[group].append(split_index)
+    n_paths = len(occurrences[0])
+    return [[occurrences[group][path] for group in range(n_groups)] for path in range(n_paths)]
@@ -2,13 +2,14 @@ import os
 import pandas as pd
 import logging
 from tqdm import tqdm
-from typing import Dict, Tuple, Any
+from typing import Dict, Tuple, Any, List, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import optuna
 from rich.console import Console
 
 from app.core.engine.backtest.runners import _run_and_analyze_single_instrument
+from app.core.engine.backtest.profiling import ProfileAggregator
 from app.core.calculations.indicators import FeatureEngine
 
 from app.core.engine.optimization.objective import Objective
@@ -21,6 +22,30 @@ from app.shared.config import config
 logger = logging.getLogger(__name__)
 
 
+def select_top_params(study: optuna.Study, top_k: int) -> List[Dict[str, Any]]:
+    """
+    Возвращает параметры k лучших завершенных trials исследования.
+
+    Для одной метрики trials сортируются по значению с учетом направления оптимизации,
+    для нескольких метрик берутся решения фронта Парето.
+
+    :param study: Завершенное исследование Optuna.
+    :param top_k: Количество наборов параметров.
+    :return: Список словарей параметров в формате trial.params (с префиксом 'rm_' для риск-менеджера).
+    """
+    if top_k <= 0:
+        return []
+
+    if len(study.directions) == 1:
+        completed = [t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE]
+        reverse = study.direction == optuna.study.StudyDirection.MAXIMIZE
+        best = sorted(completed, key=lambda t: t.value, reverse=reverse)
+    else:
+        best = study.best_trials
+
+    return [dict(t.params) for t in best[:top_k]]
+
+
 class WFOStepRunner:
     """
     Выполняет один полный шаг Walk-Forward Optimization:
@@ -33,20 +58,79 @@ class WFOStepRunner:
                  step_num: int,
                  train_slices: Dict,
                  test_slices: Dict,
-                 feature_engine: FeatureEngine):
+                 feature_engine: FeatureEngine,
+                 warm_start_params: Optional[List[Dict[str, Any]]] = None,
+                 train_feature_matrices: Optional[Dict] = None,
+                 oos_settings: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        :param warm_start_params: Наборы параметров (обычно лучшие с предыдущего шага),
+                                  которые ставятся в очередь Optuna перед поиском.
+        :param train_feature_matrices: Готовые индикаторы обучающих срезов (anchored WFO),
+                                       если не переданы — рассчитываются в Objective.
+        :param oos_settings: Дополнительные настройки OOS-бэктеста по инструментам
+                             (например, 'trade_start_time' и 'feature_matrix' для среза с разогревом).
+        """
         self.settings = settings
         self.step_num = step_num
         self.train_slices = train_slices
         self.test_slices = test_slices
         self.feature_engine = feature_engine
+        self.warm_start_params = warm_start_params or []
+        self.train_feature_matrices = train_feature_matrices
+        self.oos_settings = oos_settings or {}
         self.console = Console()
 
+    def _early_abort_rules(self) -> Dict[str, Any]:
+        """Критерии досрочной остановки trials: значения из CLI поверх конфига."""
+        rules = dict(config.BACKTEST_CONFIG["EARLY_ABORT"])
+        for name in rules:
+            value = self.settings.get(f"abort_{name}")
+            if value is not None:
+                rules[name] = value
+        return rules
+
+    def _create_study(self, directions: List[str], objective: Objective) -> optuna.Study:
+        """
+        Создает исследование шага или продолжает сохраненное в хранилище Optuna.
+
+        Trials продолженного исследования попадают в кэш Objective, только если оно
+        велось на том же обучающем окне: иначе их метрики относятся к другим данным.
+        """
+        # Зерно сэмплера зависит от номера шага, а не от порядка выполнения, поэтому
+        # последовательный и параллельный режимы при одном 'seed' дают одинаковые trials
+        seed = self.settings.get("seed")
+        sampler = optuna.samplers.TPESampler(seed=seed + self.step_num) if seed is not None else None
+
+        storage = self.settings.get("study_storage") or config.BACKTEST_CONFIG["WFO_STUDY_STORAGE"]
+        if not storage:
+            return optuna.create_study(directions=directions, sampler=sampler, pruner=objective.build_pruner())
+
+        prefix = self.settings.get("study_name") or "_".join(
+            str(self.settings[key]) for key in ("strategy", "exchange", "interval", "rm")
+        )
+        study = optuna.create_study(directions=directions, sampler=sampler, pruner=objective.build_pruner(),
+                                    storage=storage, study_name=f"{prefix}_step{self.step_num}", load_if_exists=True)
+
+        stored_window = study.user_attrs.get("window_id")
+        if stored_window is None:
+            study.set_user_attr("window_id", objective.window_key)
+        if stored_window == objective.window_key:
+            seeded = objective.seed_cache(study.trials)
+            if seeded:
+                tqdm.write(f"Шаг {self.step_num}: продолжено исследование '{study.study_name}', "
+                           f"{seeded} trials загружены в кэш.")
+        elif stored_window is not None:
+            logger.warning(f"Исследование '{study.study_name}' велось на другом обучающем окне, "
+                           f"его trials не используются как кэш.")
+        return study
+
     def _run_in_sample_optimization(self) -> optuna.Study:
         # Эта часть остается без изменений
         metrics_to_optimize = self.settings["metrics"]
         directions = [METRIC_CONFIG[m]["direction"] for m in metrics_to_optimize]
-        study = optuna.create_study(directions=directions)
         strategy_class = AVAILABLE_STRATEGIES[self.settings["strategy"]]
+        profiling_enabled = self.settings.get("profile") or config.BACKTEST_CONFIG["PROFILING_ENABLED"]
+        profile_aggregator = ProfileAggregator() if profiling_enabled else None
 
         # Внедрение зависимости feature_engine в Objective
         objective = Objective(
@@ -56,10 +140,41 @@ class WFOStepRunner:
             risk_manager_type=self.settings["rm"],
             train_data_slices=self.train_slices,
             metrics=metrics_to_optimize,
-            feature_engine=self.feature_engine  # <--- Передаем инстанс
+            feature_engine=self.feature_engine,  # <--- Передаем инстанс
+            profile_aggregator=profile_aggregator,
+            early_abort=self._early_abort_rules(),
+            fidelity_rungs=self.settings.get("fidelity_rungs"),
+            fidelity_mode=self.settings.get("fidelity_mode"),
+            fidelity_reduction=self.settings.get("fidelity_reduction"),
+            feature_matrices=self.train_feature_matrices
         )
 
-        study.optimize(objective, n_trials=self.settings["n_trials"], n_jobs=-1, show_progress_bar=True)
+        study = self._create_study(directions, objective)
+        n_trials = self.settings["n_trials"]
+
+        # Прогрев: соседние окна сильно перекрываются, поэтому лучшие параметры
+        # прошлого шага проверяются первыми, а поиск можно сократить
+        if self.warm_start_params:
+            for params in self.warm_start_params:
+                study.enqueue_trial(params, skip_if_exists=True)
+            warm_n_trials = self.settings.get("warm_start_n_trials") or config.BACKTEST_CONFIG["WFO_WARM_START_N_TRIALS"]
+            if warm_n_trials > 0:
+                n_trials = warm_n_trials
+            tqdm.write(f"Шаг {self.step_num}: прогрев из {len(self.warm_start_params)} наборов параметров, "
+                       f"бюджет {n_trials} trials.")
+
+        study.optimize(objective, n_trials=n_trials,
+                       n_jobs=self.settings.get("n_jobs", -1),
+                       show_progress_bar=self.settings.get("show_progress_bar", True))
+
+        if objective.cache_hits:
+            tqdm.write(f"Шаг {self.step_num}: {objective.cache_hits} повторных trials взяты из кэша без бэктеста.")
+        if objective.aborted_trials:
+            tqdm.write(f"Шаг {self.step_num}: {objective.aborted_trials} trials остановлены досрочно.")
+        if objective.signal_cache is not None and objective.signal_cache.hits:
+            tqdm.write(f"Шаг {self.step_num}: сигналы стратегии переиспользованы {objective.signal_cache.hits} раз.")
+        if profile_aggregator is not None:
+            profile_aggregator.log_summary(f"In-Sample оптимизация, шаг {self.step_num}")
         return study
 
     def _select_best_trial(self, study: optuna.Study) -> optuna.trial.FrozenTrial:
@@ -103,7 +218,15 @@ class WFOStepRunner:
         initial_capital = config.BACKTEST_CONFIG["INITIAL_CAPITAL"]
         commission_rate = config.BACKTEST_CONFIG["COMMISSION_RATE"]
 
-        for instrument, oos_slice in self.test_slices.items():
+        # Тестовая выборка CV задается списком отрезков (по одному на тестовую группу):
+        # каждый отрезок тестируется отдельно, а его сделки помечаются номерами разбиения и отрезка
+        oos_segments = [
+            (instrument, segment_num if isinstance(test_slice, list) else None, oos_slice)
+            for instrument, test_slice in self.test_slices.items()
+            for segment_num, oos_slice in enumerate(test_slice if isinstance(test_slice, list) else [test_slice])
+        ]
+
+        for instrument, segment_num, oos_slice in oos_segments:
             task_settings = {
                 **self.settings,
                 "instrument": instrument,
@@ -115,22 +238,29 @@ class WFOStepRunner:
                 "initial_capital": initial_capital,
                 "commission_rate": commission_rate,
                 "trade_log_path": None,
+                **self.oos_settings.get(instrument, {}),
             }
-            tasks.append(task_settings)
+            tasks.append((task_settings, segment_num))
 
         # --- Запуск OOS-тестов в несколько потоков ---
         all_oos_trades = []
-        # Используем os.cpu_count() или дефолтное значение
-        max_workers = os.cpu_count() or 4
+        # Используем бюджет воркеров шага, если он задан, иначе os.cpu_count() или дефолтное значение
+        n_jobs = self.settings.get("n_jobs", -1)
+        max_workers = n_jobs if n_jobs > 0 else (os.cpu_count() or 4)
 
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_settings = {executor.submit(_run_and_analyze_single_instrument, task): task for task in tasks}
+            future_to_segment = {
+                executor.submit(_run_and_analyze_single_instrument, task): segment_num for task, segment_num in tasks
+            }
 
-            for future in as_completed(future_to_settings):
+            for future in as_completed(future_to_segment):
                 try:
                     analysis_results = future.result()
                     if analysis_results and not analysis_results["trades_df"].empty:
-                        all_oos_trades.append(analysis_results["trades_df"])
+                        trades_df = analysis_results["trades_df"]
+                        if future_to_segment[future] is not None:
+                            trades_df = trades_df.assign(oos_split=self.step_num, oos_segment=future_to_segment[future])
+                        all_oos_trades.append(trades_df)
                 except Exception as e:
                     logger.error(f"Ошибка в OOS тесте: {e}")
 
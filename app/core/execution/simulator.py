@@ -1,6 +1,6 @@
 from queue import Queue
 import pandas as pd
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from app.shared.events import OrderEvent, FillEvent
 from app.core.interfaces import BaseExecutionHandler
@@ -18,14 +18,22 @@ class SimulatedExecutionHandler(BaseExecutionHandler):
     - Генерирует FillEvent с финальными, "реалистичными" данными.
     """
 
+    MAX_SLIPPAGE_PERCENT = 0.20  # 20%
+
     def __init__(self,
                  events_queue: Queue,
                  commission_rate: float,
-                 slippage_config: Dict[str, Any]):
+                 slippage_config: Dict[str, Any],
+                 record_fills: bool = False):
+        """
+        :param record_fills: Сохранять ли журнал исполнений с "идеальными" ценами до издержек
+                             (нужен для анализа чувствительности к комиссии и проскальзыванию).
+        """
         super().__init__(events_queue)
         self.commission_rate = commission_rate
         self.slippage_enabled = slippage_config.get("ENABLED", False)
         self.impact_coefficient = slippage_config.get("IMPACT_COEFFICIENT", 0.1)
+        self.fill_log: List[Dict[str, Any]] | None = [] if record_fills else None
 
     def _simulate_slippage(self, ideal_price: float, quantity: int, direction: TradeDirection, candle_volume: int) -> float:
         """
@@ -38,8 +46,7 @@ class SimulatedExecutionHandler(BaseExecutionHandler):
         volume_ratio = min(quantity / candle_volume, 1.0)
         slippage_percent = self.impact_coefficient * (volume_ratio ** 0.5)
 
-        MAX_SLIPPAGE_PERCENT = 0.20  # 20%
-        slippage_percent = min(slippage_percent, MAX_SLIPPAGE_PERCENT)
+        slippage_percent = min(slippage_percent, self.MAX_SLIPPAGE_PERCENT)
 
         if direction == TradeDirection.BUY:
             return ideal_price * (1 + slippage_percent)
@@ -78,6 +85,18 @@ class SimulatedExecutionHandler(BaseExecutionHandler):
         # Здесь мы считаем комиссию только за ТЕКУЩУЮ операцию.
         commission = execution_price * event.quantity * self.commission_rate
 
+        if self.fill_log is not None:
+            self.fill_log.append({
+                "timestamp": event.timestamp,
+                "direction": event.direction,
+                "quantity": event.quantity,
+                "ideal_price": ideal_price,
+                "candle_volume": last_candle['volume'],
+                "trigger_reason": event.trigger_reason,
+                "price": execution_price,
+                "commission": commission,
+            })
+
         # 4. Создаем FillEvent с фактическими данными
         fill_event = FillEvent(
             timestamp=event.timestamp,
@@ -1,8 +1,9 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.shared.events import FillEvent
 from app.core.portfolio.state import PortfolioState
+from app.core.analysis.metrics import OnlineMetricsAccumulator
 from app.infrastructure.storage.file_io import save_trade_log
 from app.shared.primitives import TradeDirection, Position
 
@@ -17,6 +18,7 @@ class FillProcessor:
     - Обновление состояния портфеля (капитал, открытые/закрытые позиции).
     - Расчет PnL по закрытым сделкам.
     - Логирование завершенных сделок.
+    - Потоковое обновление метрик (если передан накопитель).
     """
     def __init__(self,
                  trade_log_file: str | None,
@@ -24,7 +26,8 @@ class FillProcessor:
                  interval: str,
                  strategy_name: str,
                  risk_manager_name: str,
-                 risk_manager_params: Dict[str, Any]):
+                 risk_manager_params: Dict[str, Any],
+                 metrics_accumulator: Optional[OnlineMetricsAccumulator] = None):
         """
         Инициализируется только необходимыми для логирования метаданными.
 
@@ -34,6 +37,7 @@ class FillProcessor:
         :param strategy_name: Имя используемой стратегии.
         :param risk_manager_name: Имя класса используемого риск-менеджера.
         :param risk_manager_params: Параметры риск-менеджера.
+        :param metrics_accumulator: Опциональный накопитель метрик, обновляемый по каждой сделке.
         """
         self.trade_log_file = trade_log_file
         self.exchange = exchange
@@ -41,6 +45,7 @@ class FillProcessor:
         self.strategy_name = strategy_name
         self.risk_manager_name = risk_manager_name
         self.risk_manager_params = risk_manager_params
+        self.metrics_accumulator = metrics_accumulator
 
     def process_fill(self, event: FillEvent, state: PortfolioState):
         """
@@ -114,6 +119,9 @@ class FillProcessor:
             'exit_timestamp_utc': event.timestamp
         })
 
+        if self.metrics_accumulator is not None:
+            self.metrics_accumulator.update(pnl, position.entry_timestamp, event.timestamp)
+
         del state.positions[event.instrument]
 
         logger.info(
@@ -0,0 +1,132 @@
+import math
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from app.core.portfolio.state import PortfolioState
+from app.shared.primitives import TradeDirection
+
+
+class EquityCurveRecorder:
+    """
+    Побарная (mark-to-market) кривая капитала портфеля.
+
+    Хранит время, оценку капитала и экспозицию в заранее выделенных массивах NumPy,
+    поэтому запись одного бара сводится к нескольким присваиваниям по индексу.
+    Для очень длинных прогонов (годы минутных свечей) поддерживает прореживание:
+    сохраняется каждый N-й бар, а пиковый капитал и максимальная просадка
+    считаются по ВСЕМ барам, поэтому остаются точными.
+    """
+
+    def __init__(self, n_bars: int, max_points: int = 0):
+        """
+        Инициализирует хранилище кривой.
+
+        :param n_bars: Ожидаемое количество баров в прогоне (размер предаллокации).
+        :param max_points: Максимальное число сохраняемых точек. 0 — без прореживания.
+        """
+        n_bars = max(int(n_bars), 1)
+        if max_points and n_bars > max_points:
+            self.stride = math.ceil(n_bars / max_points)
+        else:
+            self.stride = 1
+
+        # +1 — резерв под последний бар, который сохраняется всегда
+        capacity = math.ceil(n_bars / self.stride) + 1
+        self._time = np.empty(capacity, dtype=np.int64)
+        self._equity = np.empty(capacity, dtype=np.float64)
+        self._exposure = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+        self._bars_seen = 0
+        self._last_point = None
+
+        self.peak_equity: float = -np.inf
+        """Максимальный капитал (High Water Mark) по всем барам."""
+
+        self.max_drawdown: float = 0.0
+        """Максимальная просадка (доля от пика) по всем барам, без учета прореживания."""
+
+        self.last_equity: float = np.nan
+        """Оценка капитала на последнем обработанном баре."""
+
+    def record(self, timestamp: pd.Timestamp, state: PortfolioState, prices: Dict[str, float]) -> None:
+        """
+        Фиксирует оценку портфеля на закрытии бара.
+
+        :param timestamp: Время бара.
+        :param state: Текущее состояние портфеля.
+        :param prices: Словарь {инструмент: цена закрытия} для переоценки позиций.
+        """
+        equity = state.current_capital
+        gross_exposure = 0.0
+
+        for instrument, position in state.positions.items():
+            price = prices.get(instrument, position.entry_price)
+            if position.direction == TradeDirection.BUY:
+                unrealized = (price - position.entry_price) * position.quantity
+            else:
+                unrealized = (position.entry_price - price) * position.quantity
+            equity += unrealized - position.entry_commission
+            gross_exposure += price * position.quantity
+
+        exposure = gross_exposure / equity if equity > 0 else 0.0
+
+        if equity > self.peak_equity:
+            self.peak_equity = equity
+        elif self.peak_equity > 0:
+            drawdown = (self.peak_equity - equity) / self.peak_equity
+            if drawdown > self.max_drawdown:
+                self.max_drawdown = drawdown
+        self.last_equity = equity
+
+        point = (timestamp.value, equity, exposure)
+        if self._bars_seen % self.stride == 0:
+            self._store(point)
+            self._last_point = None
+        else:
+            self._last_point = point
+        self._bars_seen += 1
+
+    def finalize(self) -> None:
+        """Дописывает последний бар, если он был пропущен из-за прореживания."""
+        if self._last_point is not None:
+            self._store(self._last_point)
+            self._last_point = None
+
+    def _store(self, point) -> None:
+        i = self._size
+        self._time[i], self._equity[i], self._exposure[i] = point
+        self._size += 1
+
+    @property
+    def equity(self) -> np.ndarray:
+        """Массив сохраненных значений капитала (без копирования)."""
+        return self._equity[:self._size]
+
+    @property
+    def exposure(self) -> np.ndarray:
+        """Массив сохраненных значений экспозиции (доля капитала в рынке)."""
+        return self._exposure[:self._size]
+
+    def summary(self) -> Dict[str, float]:
+        """Сводные метрики по переоценке портфеля (в формате PortfolioMetricsCalculator)."""
+        return {
+            'mtm_max_drawdown': float(self.max_drawdown),
+            'avg_exposure': float(self.exposure.mean()) if self._size else 0.0,
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Преобразует сохраненные точки в DataFrame с колонками time, equity, exposure.
+        Точные пиковые значения по всем барам доступны через `DataFrame.attrs`.
+        """
+        self.finalize()
+        frame = pd.DataFrame({
+            "time": pd.to_datetime(self._time[:self._size], utc=True),
+            "equity": self.equity,
+            "exposure": self.exposure,
+        })
+        frame.attrs["max_drawdown"] = float(self.max_drawdown)
+        frame.attrs["stride"] = self.stride
+        return frame
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from app.shared.primitives import ExchangeType
 
@@ -84,6 +84,42 @@ class AppConfig(BaseSettings):
     bt_max_exposure: float = 0.25
     bt_slippage_enabled: bool = True
     bt_slippage_impact: float = 0.1
+    bt_equity_curve_max_points: int = 100_000
+    bt_profiling_enabled: bool = False
+    bt_copy_on_write: bool = True
+    bt_float32_features: bool = False
+    bt_wfo_parallel_steps: int = 1
+    bt_wfo_max_workers: int = 0
+    bt_wfo_warm_start_top_k: int = 0
+    bt_wfo_warm_start_n_trials: int = 0
+    bt_wfo_precompute_features: bool = True
+    bt_signal_cache_size: int = 32
+    bt_wfo_fidelity_rungs: List[float] = []
+    bt_wfo_fidelity_mode: str = "window"
+    bt_wfo_fidelity_reduction: int = 3
+    bt_abort_max_drawdown: float = 0.0
+    bt_abort_capital_floor: float = 0.0
+    bt_abort_min_trades: int = 0
+    bt_abort_min_trades_deadline: float = 0.5
+    bt_cv_test_groups: int = 2
+    bt_cv_purge_pct: float = 0.01
+    bt_cv_embargo_pct: float = 0.01
+    bt_wfo_warmup_bars: int = 300
+    bt_wfo_study_storage: str = ""
+    bt_mc_simulations: int = 0
+    bt_mc_method: str = "bootstrap"
+    bt_mc_confidence: float = 0.9
+    bt_mc_max_chunk_elements: int = 2_000_000
+    bt_mc_workers: int = 1
+    bt_mc_seed: int = 0
+    bt_rolling_window: Union[int, str] = 50
+    bt_excel_constant_memory: bool = False
+    bt_excel_trades_sheet: bool = False
+    bt_excel_chunk_rows: int = 10_000
+    bt_report_companion_format: str = ""
+    bt_chart_max_points: int = 4000
+    bt_chart_max_candles: int = 2000
+    bt_chart_downsample_method: str = "minmax"
 
     @property
     def BACKTEST_CONFIG(self) -> Dict[str, Any]:
@@ -94,6 +130,83 @@ class AppConfig(BaseSettings):
             "SLIPPAGE_CONFIG": {
                 "ENABLED": self.bt_slippage_enabled,
                 "IMPACT_COEFFICIENT": self.bt_slippage_impact
+            },
+            # Лимит точек побарной кривой капитала (0 — хранить каждый бар)
+            "EQUITY_CURVE_MAX_POINTS": self.bt_equity_curve_max_points,
+            # Сбор таймингов по фазам BacktestEngine (см. engine/backtest/profiling.py)
+            "PROFILING_ENABLED": self.bt_profiling_enabled,
+            # Copy-on-Write в pandas на время BacktestEngine.run: срезы данных не копируются до первой записи
+            "COPY_ON_WRITE": self.bt_copy_on_write,
+            # Хранить рассчитанные индикаторы в float32 (OHLCV остаются float64)
+            "FLOAT32_FEATURES": self.bt_float32_features,
+            # Сколько шагов WFO выполнять одновременно в пуле процессов (1 — последовательно)
+            "WFO_PARALLEL_STEPS": self.bt_wfo_parallel_steps,
+            # Общий бюджет воркеров на шаги и trials WFO (0 — по числу ядер)
+            "WFO_MAX_WORKERS": self.bt_wfo_max_workers,
+            # Сколько лучших наборов параметров предыдущего шага WFO ставить в очередь следующего (0 — выкл.)
+            "WFO_WARM_START_TOP_K": self.bt_wfo_warm_start_top_k,
+            # Бюджет trials для шагов с прогревом (0 — как у первого шага)
+            "WFO_WARM_START_N_TRIALS": self.bt_wfo_warm_start_n_trials,
+            # Предрасчет всех достижимых индикаторов на обучающем срезе WFO (см. IndicatorSpace)
+            "WFO_PRECOMPUTE_FEATURES": self.bt_wfo_precompute_features,
+            # Сколько срезов с сигналами стратегии хранить для trials, меняющих только rm_* (0 — выкл.)
+            "SIGNAL_CACHE_SIZE": self.bt_signal_cache_size,
+            # Доли точности для successive halving, например [0.1, 0.3] (пусто — trials сразу на полном срезе)
+            "WFO_FIDELITY_RUNGS": self.bt_wfo_fidelity_rungs,
+            # Чем урезается точность: 'window' (последняя доля окна) или 'instruments' (часть портфеля)
+            "WFO_FIDELITY_MODE": self.bt_wfo_fidelity_mode,
+            # Во сколько раз сокращается число trials на каждом следующем уровне
+            "WFO_FIDELITY_REDUCTION": self.bt_wfo_fidelity_reduction,
+            # CPCV: сколько групп (периодов) тестируется в одном разбиении
+            "CV_TEST_GROUPS": self.bt_cv_test_groups,
+            # Доля строк инструмента, удаляемая из обучения перед тестовой группой (purging)
+            "CV_PURGE_PCT": self.bt_cv_purge_pct,
+            # Доля строк инструмента, удаляемая из обучения после тестовой группы (embargo)
+            "CV_EMBARGO_PCT": self.bt_cv_embargo_pct,
+            # Anchored WFO: сколько строк перед тестовым окном отдается стратегии как история (без торговли)
+            "WFO_WARMUP_BARS": self.bt_wfo_warmup_bars,
+            # Хранилище исследований Optuna (например, sqlite:///optuna.db) для продолжения шагов WFO (пусто — в памяти)
+            "WFO_STUDY_STORAGE": self.bt_wfo_study_storage,
+            # Досрочная остановка безнадежных trials при оптимизации (0 — критерий выключен)
+            "EARLY_ABORT": {
+                "max_drawdown": self.bt_abort_max_drawdown,
+                "capital_floor": self.bt_abort_capital_floor,
+                "min_trades": self.bt_abort_min_trades,
+                "min_trades_deadline": self.bt_abort_min_trades_deadline
+            },
+            # Окно скользящих метрик: число сделок (50) или длительность ('30D', '12h')
+            "ROLLING_WINDOW": self.bt_rolling_window,
+            # Excel-отчет пакетного теста (см. analysis/reports/excel_report.py)
+            "EXCEL_REPORT": {
+                # Потоковая запись xlsxwriter: память не растет с числом строк отчета
+                "CONSTANT_MEMORY": self.bt_excel_constant_memory,
+                # Лист со всеми сделками портфеля (при переполнении — несколько листов)
+                "TRADES_SHEET": self.bt_excel_trades_sheet,
+                # Сколько строк переводить из pandas в xlsxwriter за одну пачку
+                "CHUNK_ROWS": self.bt_excel_chunk_rows,
+                # Сопутствующая выгрузка таблиц рядом с отчетом: 'parquet', 'csv' или '' (выкл.)
+                "COMPANION_FORMAT": self.bt_report_companion_format,
+            },
+            # Прореживание длинных рядов на графиках (см. analysis/downsample.py)
+            "CHARTS": {
+                # Точек на одну линию графика (0 — рисовать все точки)
+                "MAX_POINTS": self.bt_chart_max_points,
+                # Свечей на графике сделок: соседние бары укрупняются (0 — без укрупнения)
+                "MAX_CANDLES": self.bt_chart_max_candles,
+                # 'minmax' (экстремумы по корзинам) или 'lttb' (Largest-Triangle-Three-Buckets)
+                "METHOD": self.bt_chart_downsample_method,
+            },
+            # Монте-Карло по сделкам для отчетов (SIMULATIONS=0 — выкл., см. analysis/monte_carlo.py)
+            "MONTE_CARLO": {
+                "SIMULATIONS": self.bt_mc_simulations,
+                # 'bootstrap' (выборка сделок с возвращением) или 'shuffle' (перестановка)
+                "METHOD": self.bt_mc_method,
+                "CONFIDENCE": self.bt_mc_confidence,
+                # Лимит элементов матрицы траекторий в одной пачке (ограничивает память)
+                "MAX_CHUNK_ELEMENTS": self.bt_mc_max_chunk_elements,
+                "WORKERS": self.bt_mc_workers,
+                # Зерно генератора: одинаковые сделки дают одинаковые интервалы при каждом запуске
+                "SEED": self.bt_mc_seed
             }
         }
 
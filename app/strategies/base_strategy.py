@@ -4,6 +4,7 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
 from app.core.calculations.indicators import FeatureEngine
+from app.core.calculations.indicator_space import FeatureMatrix
 from app.core.interfaces import IDataFeed
 from app.shared.schemas import StrategyConfigModel
 
@@ -59,14 +60,16 @@ class BaseStrategy(ABC):
                 current_requirements.append(atr_requirement)
             self.required_indicators = current_requirements
 
-    def process_data(self, data: pd.DataFrame) -> pd.DataFrame:
+    def process_data(self, data: pd.DataFrame, precomputed: Optional[FeatureMatrix] = None) -> pd.DataFrame:
         """
         Используется ТОЛЬКО для Бэктеста.
+
+        :param precomputed: Предрасчитанные индикаторы среза (при оптимизации), см. IndicatorSpace.
         """
         original_columns = set(data.columns)
 
         # 1. Стандартные индикаторы
-        enriched_data = self.feature_engine.add_required_features(data, self.required_indicators)
+        enriched_data = self.feature_engine.add_required_features(data, self.required_indicators, precomputed)
 
         # 2. Кастомные индикаторы
         final_data = self._prepare_custom_features(enriched_data)
@@ -76,11 +79,16 @@ class BaseStrategy(ABC):
         new_columns = list(current_columns - original_columns)
 
         if new_columns:
-            final_data.dropna(subset=new_columns, inplace=True)
-
-        final_data.reset_index(drop=True, inplace=True)
-
-        return final_data
+            valid_rows = final_data[new_columns].notna().all(axis=1).to_numpy()
+            first_valid = int(valid_rows.argmax()) if valid_rows.any() else len(valid_rows)
+            if valid_rows[first_valid:].all():
+                # Типичный случай: NaN только в начале (период разогрева индикаторов).
+                # Срез по позициям не копирует данные, в отличие от dropna.
+                final_data = final_data.iloc[first_valid:]
+            else:
+                final_data = final_data[valid_rows]
+
+        return final_data.reset_index(drop=True)
 
     def _prepare_custom_features(self, data: pd.DataFrame) -> pd.DataFrame:
         """Метод-заглушка для уникальных индикаторов (Z-Score и т.д.)."""
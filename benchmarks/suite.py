@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import os
+import platform
+import queue
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_ohlcv, generate_universe, write_universe
+from app.core.analysis.metrics import PortfolioMetricsCalculator
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.core.engine.optimization.engine import OptimizationEngine
+from app.infrastructure.feeds.unified import UnifiedDataFeed
+from app.strategies import AVAILABLE_STRATEGIES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "baseline.json")
+
+# Размеры нагрузки для разных профилей запуска
+SUITE_SIZES: Dict[str, Dict[str, int]] = {
+    "quick": {"bars": 5_000, "instruments": 2, "feed_candles": 200, "trades": 2_000,
+              "wfo_bars": 3_000, "wfo_trials": 4},
+    "full": {"bars": 50_000, "instruments": 4, "feed_candles": 1_000, "trades": 50_000,
+             "wfo_bars": 20_000, "wfo_trials": 20},
+}
+
+# Типичный набор индикаторов, покрывающий все калькуляторы FeatureEngine
+FEATURE_SET: List[Dict[str, Any]] = [
+    {"name": "sma", "params": {"period": 20}},
+    {"name": "sma", "params": {"period": 50}},
+    {"name": "ema", "params": {"period": 12}},
+    {"name": "ema", "params": {"period": 26}},
+    {"name": "atr", "params": {"period": 14}},
+    {"name": "bbands", "params": {"period": 20, "std": 2.0}},
+    {"name": "donchian", "params": {"lower_period": 20, "upper_period": 20}},
+    {"name": "adx", "params": {"period": 14}},
+]
+
+EXCHANGE = "bybit"
+INTERVAL = "5min"
+
+# Кейс: (функция одного прогона, число обработанных единиц, название единиц)
+BenchmarkCase = Tuple[Callable[[], Any], int, str]
+
+
+def _backtest_settings(strategy_name: str, data: pd.DataFrame, data_dir: str) -> Dict[str, Any]:
+    return {
+        "strategy_class": AVAILABLE_STRATEGIES[strategy_name],
+        "exchange": EXCHANGE,
+        "instrument": "SYN00",
+        "interval": INTERVAL,
+        "risk_manager_type": "FIXED",
+        "initial_capital": 100_000.0,
+        "commission_rate": 0.0005,
+        "strategy_params": None,
+        "risk_manager_params": None,
+        "data_slice": data,
+        "data_dir": data_dir,
+        "trade_log_path": None,
+    }
+
+
+def build_cases(size: str, work_dir: str) -> Dict[str, BenchmarkCase]:
+    """
+    Собирает набор кейсов для профиля нагрузки.
+
+    :param size: 'quick' или 'full'.
+    :param work_dir: Временная папка для синтетических данных (WFO читает их с диска).
+    """
+    params = SUITE_SIZES[size]
+    feature_engine = FeatureEngine()
+    data = generate_ohlcv(n_bars=params["bars"], interval=INTERVAL, seed=1,
+                          regimes=[1.0, 2.5, 0.6], gap_probability=0.01, missing_bar_probability=0.002)
+    cases: Dict[str, BenchmarkCase] = {}
+
+    # --- FeatureEngine ---
+    def run_features():
+        feature_engine.add_required_features(data.copy(), FEATURE_SET)
+
+    cases["feature_engine"] = (run_features, len(data), "bars")
+
+    # --- BacktestEngine по каждой стратегии (кроме отладочных live-стратегий) ---
+    for strategy_name in AVAILABLE_STRATEGIES:
+        if "debug" in strategy_name:
+            continue
+        settings = _backtest_settings(strategy_name, data, work_dir)
+
+        def run_backtest(settings=settings):
+            results = BacktestEngine(settings, queue.Queue(), feature_engine).run()
+            if results["status"] != "success":
+                raise RuntimeError(results.get("message"))
+
+        cases[f"backtest/{strategy_name}"] = (run_backtest, len(data), "bars")
+
+    # --- UnifiedDataFeed.process_candle (live-путь) ---
+    warmup = data.iloc[:1000]
+    live_candles = [row for _, row in data.iloc[1000:1000 + params["feed_candles"]].iterrows()]
+
+    def run_feed():
+        feed = UnifiedDataFeed(client=None, exchange=EXCHANGE, instrument="SYN00", interval=INTERVAL,
+                               feature_engine=feature_engine, required_indicators=FEATURE_SET[:5])
+        feed._buffer = warmup.to_dict('records')
+
+        async def consume():
+            for candle in live_candles:
+                await feed.process_candle(candle)
+
+        asyncio.run(consume())
+
+    cases["unified_feed/process_candle"] = (run_feed, len(live_candles), "candles")
+
+    # --- PortfolioMetricsCalculator ---
+    rng = np.random.default_rng(7)
+    entry_times = pd.date_range("2023-01-02", periods=params["trades"], freq="2h", tz="UTC")
+    trades_df = pd.DataFrame({
+        "pnl": rng.normal(10.0, 300.0, params["trades"]),
+        "entry_timestamp_utc": entry_times,
+        "exit_timestamp_utc": entry_times + pd.Timedelta(minutes=45),
+    })
+
+    def run_metrics():
+        PortfolioMetricsCalculator(trades_df, 100_000.0, 365).calculate_all()
+
+    cases["metrics/calculate_all"] = (run_metrics, len(trades_df), "trades")
+
+    # --- Небольшой WFO (чтение с диска, Optuna, OOS) ---
+    universe = generate_universe(params["instruments"], seed=3, n_bars=params["wfo_bars"],
+                                 interval=INTERVAL, regimes=[1.0, 2.0])
+    portfolio_path = write_universe(universe, work_dir, EXCHANGE, INTERVAL)
+    wfo_settings = {
+        "strategy": "simple_sma_cross",
+        "exchange": EXCHANGE,
+        "interval": INTERVAL,
+        "rm": "FIXED",
+        "metrics": ["calmar_ratio"],
+        "n_trials": params["wfo_trials"],
+        "total_periods": 4,
+        "train_periods": 2,
+        "test_periods": 1,
+        "portfolio_path": portfolio_path,
+        "data_dir": work_dir,
+    }
+
+    def run_wfo():
+        OptimizationEngine(dict(wfo_settings), feature_engine).run_walk_forward()
+
+    total_wfo_bars = sum(len(df) for df in universe.values())
+    cases["wfo/small"] = (run_wfo, total_wfo_bars, "bars")
+
+    return cases
+
+
+def _time_case(func: Callable[[], Any], repeats: int) -> List[float]:
+    func()  # Прогрев: импорты, кэши pandas_ta, JIT numba
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_suite(size: str = "quick", repeats: int = 3, case_filter: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Прогоняет все кейсы и возвращает результаты в формате, пригодном для сохранения в JSON.
+
+    :param size: Профиль нагрузки ('quick' или 'full').
+    :param repeats: Количество замеров на кейс (после одного прогревочного прогона).
+    :param case_filter: Подстрока для отбора кейсов по имени.
+    """
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="market_bots_bench_") as work_dir:
+        cases = build_cases(size, work_dir)
+        for name, (func, units, unit_name) in cases.items():
+            if case_filter and case_filter not in name:
+                continue
+            logger.info(f"Бенчмарк '{name}'...")
+            timings = _time_case(func, repeats)
+            best = min(timings)
+            results[name] = {
+                "min_s": best,
+                "median_s": statistics.median(timings),
+                "units": units,
+                "unit_name": unit_name,
+                "throughput": units / best if best > 0 else 0.0,
+            }
+            logger.info(f"  min {best:.4f} с | {results[name]['throughput']:,.0f} {unit_name}/с")
+
+    return {
+        "meta": {
+            "size": size,
+            "repeats": repeats,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+
+
+def save_baseline(report: Dict[str, Any], path: str = DEFAULT_BASELINE_PATH) -> None:
+    """Сохраняет результаты прогона как JSON-бейзлайн."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def load_baseline(path: str = DEFAULT_BASELINE_PATH) -> Optional[Dict[str, Any]]:
+    """Загружает JSON-бейзлайн или возвращает None, если файла нет."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Сравнивает минимальное время каждого кейса с бейзлайном.
+
+    :param threshold: Допустимое относительное замедление (0.2 = +20%).
+    :return: Список строк сравнения с флагом 'regression'.
+    """
+    rows = []
+    if baseline.get("meta", {}).get("size") != report["meta"]["size"]:
+        logger.warning("Профиль нагрузки бейзлайна отличается от текущего, сравнение некорректно.")
+
+    for name, current in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            rows.append({"case": name, "baseline_s": None, "current_s": current["min_s"],
+                         "change_pct": None, "regression": False})
+            continue
+        change = current["min_s"] / base["min_s"] - 1 if base["min_s"] > 0 else 0.0
+        rows.append({
+            "case": name,
+            "baseline_s": base["min_s"],
+            "current_s": current["min_s"],
+            "change_pct": change * 100,
+            "regression": change > threshold,
+        })
+    return rows
@@ -0,0 +1,120 @@
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Соответствие интервалов проекта частотам pandas
+INTERVAL_TO_FREQ = {
+    '1min': '1min', '2min': '2min', '3min': '3min', '5min': '5min', '10min': '10min',
+    '15min': '15min', '30min': '30min', '1hour': '1h', '2hour': '2h', '4hour': '4h', '1day': 'D',
+}
+
+
+def generate_ohlcv(n_bars: int = 10_000,
+                   interval: str = '5min',
+                   start: str = '2023-01-02',
+                   seed: int = 0,
+                   start_price: float = 100.0,
+                   drift: float = 0.0,
+                   volatility: float = 0.004,
+                   regimes: Optional[Sequence[float]] = None,
+                   regime_length: int = 500,
+                   gap_probability: float = 0.0,
+                   gap_scale: float = 0.01,
+                   missing_bar_probability: float = 0.0,
+                   base_volume: float = 50_000.0) -> pd.DataFrame:
+    """
+    Генерирует детерминированный синтетический ряд OHLCV в формате локальных данных проекта.
+
+    Цена — геометрическое случайное блуждание. Волатильность может переключаться между
+    режимами, открытие бара может идти с гэпом относительно предыдущего закрытия,
+    а часть баров может отсутствовать (разрывы во времени).
+
+    :param n_bars: Количество свечей в результате.
+    :param interval: Таймфрейм ('1min', '5min', '1hour', ...).
+    :param start: Время первой свечи (UTC).
+    :param seed: Зерно генератора. Одинаковые параметры и зерно дают идентичный результат.
+    :param start_price: Начальная цена.
+    :param drift: Средняя лог-доходность одного бара.
+    :param volatility: Базовое СКО лог-доходности одного бара.
+    :param regimes: Множители волатильности, которые циклически сменяют друг друга.
+    :param regime_length: Длина одного режима волатильности в барах.
+    :param gap_probability: Вероятность ценового гэпа на открытии бара.
+    :param gap_scale: СКО лог-доходности гэпа.
+    :param missing_bar_probability: Вероятность пропуска (разрыва во времени) перед баром.
+    :param base_volume: Средний объем бара.
+    :return: DataFrame с колонками time, open, high, low, close, volume.
+    """
+    if interval not in INTERVAL_TO_FREQ:
+        raise ValueError(f"Неизвестный интервал для генерации: {interval}")
+
+    rng = np.random.default_rng(seed)
+
+    if regimes:
+        vol = np.resize(np.repeat(np.asarray(regimes, dtype=float), regime_length), n_bars) * volatility
+    else:
+        vol = np.full(n_bars, volatility)
+
+    bar_returns = drift + rng.standard_normal(n_bars) * vol
+    gap_mask = rng.random(n_bars) < gap_probability
+    gap_returns = np.where(gap_mask, rng.standard_normal(n_bars) * gap_scale, 0.0)
+    gap_returns[0] = 0.0
+
+    close = start_price * np.exp(np.cumsum(gap_returns + bar_returns))
+    open_ = np.r_[start_price, close[:-1]] * np.exp(gap_returns)
+
+    wick_up = np.abs(rng.standard_normal(n_bars)) * vol * 0.5
+    wick_down = np.abs(rng.standard_normal(n_bars)) * vol * 0.5
+    high = np.maximum(open_, close) * (1 + wick_up)
+    low = np.minimum(open_, close) * (1 - wick_down)
+
+    # Объем растет вместе с волатильностью режима
+    volume = base_volume * np.exp(rng.standard_normal(n_bars) * 0.5) * (vol / volatility)
+
+    # Разрывы во времени: перед баром пропускается от 1 до 10 интервалов
+    skipped = np.where(rng.random(n_bars) < missing_bar_probability, rng.integers(1, 11, n_bars), 0)
+    skipped[0] = 0
+    steps = np.cumsum(1 + skipped) - 1
+    freq = pd.Timedelta(pd.tseries.frequencies.to_offset(INTERVAL_TO_FREQ[interval]))
+    time = pd.Timestamp(start, tz='UTC') + steps * freq
+
+    return pd.DataFrame({
+        'time': pd.DatetimeIndex(time),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': np.round(volume).astype(np.int64),
+    })
+
+
+def generate_universe(n_instruments: int = 5, seed: int = 0, prefix: str = 'SYN', **kwargs) -> Dict[str, pd.DataFrame]:
+    """
+    Генерирует набор независимых инструментов с детерминированными, но разными зернами.
+
+    :param n_instruments: Количество инструментов.
+    :param seed: Базовое зерно набора.
+    :param prefix: Префикс тикеров (SYN00, SYN01, ...).
+    :param kwargs: Параметры, передаваемые в generate_ohlcv.
+    :return: Словарь {тикер: DataFrame}.
+    """
+    children = np.random.SeedSequence(seed).spawn(n_instruments)
+    return {
+        f"{prefix}{i:02d}": generate_ohlcv(seed=int(child.generate_state(1)[0]), **kwargs)
+        for i, child in enumerate(children)
+    }
+
+
+def write_universe(universe: Dict[str, pd.DataFrame], data_dir: str, exchange: str, interval: str) -> str:
+    """
+    Сохраняет набор инструментов в структуру локальных данных (data_dir/exchange/interval/TICKER.parquet),
+    чтобы его можно было прогнать через HistoricLocalDataHandler и WFO.
+
+    :return: Путь к папке интервала.
+    """
+    interval_dir = os.path.join(data_dir, exchange, interval)
+    os.makedirs(interval_dir, exist_ok=True)
+    for ticker, df in universe.items():
+        df.to_parquet(os.path.join(interval_dir, f"{ticker.upper()}.parquet"), index=False)
+    return interval_dir
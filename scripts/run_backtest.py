@@ -25,6 +25,12 @@ def main():
     parser.add_argument("--instrument", type=str, required=True)
     parser.add_argument("--interval", type=str, required=True)
     parser.add_argument("--rm", dest="risk_manager_type", type=str, default="FIXED", choices=list(AVAILABLE_RISK_MANAGERS.keys()))
+    parser.add_argument("--monte-carlo", dest="monte_carlo", type=int, default=None,
+                        help="Число симуляций Монте-Карло по сделкам (0 — выкл.). По умолчанию: из конфига.")
+    parser.add_argument("--mc-method", type=str, default=None, choices=["bootstrap", "shuffle"],
+                        help="Метод Монте-Карло: выборка сделок с возвращением или перестановка.")
+    parser.add_argument("--mc-seed", type=int, default=None,
+                        help="Зерно генератора Монте-Карло. По умолчанию: из конфига.")
     args = parser.parse_args()
 
     # Конвертируем Namespace от argparse в словарь
@@ -0,0 +1,68 @@
+import argparse
+import logging
+import sys
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.suite import (
+    run_suite, save_baseline, load_baseline, compare_with_baseline, DEFAULT_BASELINE_PATH, SUITE_SIZES
+)
+from app.shared.logging_setup import setup_global_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """
+    Точка входа для запуска набора бенчмарков производительности.
+    Сравнивает результаты с JSON-бейзлайном и завершается с кодом 1 при регрессии.
+    """
+    setup_global_logging(mode='default', log_level=logging.INFO)
+    # Логи движка внутри замеров только мешают и искажают тайминги
+    logging.getLogger('backtester').setLevel(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description="Бенчмарки производительности движка на синтетических данных.")
+    parser.add_argument("--size", type=str, default="quick", choices=list(SUITE_SIZES.keys()),
+                        help="Профиль нагрузки.")
+    parser.add_argument("--repeats", type=int, default=3, help="Количество замеров на кейс.")
+    parser.add_argument("--cases", type=str, default=None, help="Подстрока для отбора кейсов по имени.")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE_PATH, help="Путь к JSON-бейзлайну.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Допустимое замедление относительно бейзлайна (0.2 = +20%%).")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить результаты как новый бейзлайн.")
+    args = parser.parse_args()
+
+    report = run_suite(size=args.size, repeats=args.repeats, case_filter=args.cases)
+
+    if args.save_baseline:
+        save_baseline(report, args.baseline)
+        logger.info(f"Бейзлайн сохранен в {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        logger.warning(f"Бейзлайн не найден ({args.baseline}). Запустите с --save-baseline.")
+        return
+
+    rows = compare_with_baseline(report, baseline, args.threshold)
+
+    table = Table(title=f"Сравнение с бейзлайном (порог +{args.threshold:.0%})")
+    table.add_column("Кейс")
+    table.add_column("Бейзлайн, с", justify="right")
+    table.add_column("Сейчас, с", justify="right")
+    table.add_column("Изменение", justify="right")
+    for row in rows:
+        change = "—" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        style = "red" if row["regression"] else None
+        baseline_s = "—" if row["baseline_s"] is None else f"{row['baseline_s']:.4f}"
+        table.add_row(row["case"], baseline_s, f"{row['current_s']:.4f}", change, style=style)
+    Console().print(table)
+
+    if any(row["regression"] for row in rows):
+        logger.error("Обнаружена регрессия производительности.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import logging
+
+from rich.console import Console
+from rich.table import Table
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.cost_sweep import CostSensitivitySweep
+from app.strategies import AVAILABLE_STRATEGIES
+from app.core.risk.manager import AVAILABLE_RISK_MANAGERS
+from app.shared.logging_setup import setup_global_logging
+from app.shared.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """
+    Точка входа для анализа чувствительности бэктеста к комиссии и проскальзыванию.
+    Печатает таблицу метрик по сетке издержек и при необходимости сохраняет ее в CSV.
+    """
+    setup_global_logging(mode='default', log_level=logging.INFO)
+    logging.getLogger('backtester').setLevel(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description="Чувствительность результата бэктеста к издержкам.")
+    parser.add_argument("--strategy", type=str, required=True, choices=list(AVAILABLE_STRATEGIES.keys()))
+    parser.add_argument("--exchange", type=str, required=True, choices=['tinkoff', 'bybit'])
+    parser.add_argument("--instrument", type=str, required=True)
+    parser.add_argument("--interval", type=str, required=True)
+    parser.add_argument("--rm", dest="risk_manager_type", type=str, default="FIXED",
+                        choices=list(AVAILABLE_RISK_MANAGERS.keys()))
+    parser.add_argument("--commissions", type=float, nargs='+', default=[0.0, 0.0005, 0.001, 0.002],
+                        help="Значения комиссии для сетки.")
+    parser.add_argument("--impacts", type=float, nargs='+', default=[0.0, 0.05, 0.1, 0.2],
+                        help="Значения коэффициента проскальзывания для сетки.")
+    parser.add_argument("--exact", action="store_true",
+                        help="Полный бэктест в каждой точке сетки вместо пересчета по журналу исполнений.")
+    parser.add_argument("--output", type=str, default=None, help="Путь для сохранения таблицы в CSV.")
+    args = parser.parse_args()
+
+    engine_settings = {
+        "strategy_class": AVAILABLE_STRATEGIES[args.strategy],
+        "exchange": args.exchange,
+        "instrument": args.instrument,
+        "interval": args.interval,
+        "risk_manager_type": args.risk_manager_type,
+        "initial_capital": config.BACKTEST_CONFIG["INITIAL_CAPITAL"],
+        "commission_rate": config.BACKTEST_CONFIG["COMMISSION_RATE"],
+        "data_dir": config.PATH_CONFIG["DATA_DIR"],
+        "trade_log_path": None,
+        "strategy_params": None,
+        "risk_manager_params": None
+    }
+
+    sweep = CostSensitivitySweep(engine_settings, FeatureEngine())
+    table_df = sweep.sweep(args.commissions, args.impacts, mode="exact" if args.exact else "approx")
+
+    title = "Чувствительность к издержкам" + (" (приближенно)" if table_df.attrs['approximate'] else "")
+    table = Table(title=title)
+    for column in ["Комиссия", "Проскальзывание", "PnL, %", "Сделок", "Max DD", "Sharpe", "Profit Factor"]:
+        table.add_column(column, justify="right")
+    for _, row in table_df.iterrows():
+        table.add_row(f"{row['commission_rate']:.4%}", f"{row['impact_coefficient']:.3f}",
+                      f"{row['pnl_pct']:.2f}", f"{row['total_trades']:.0f}", f"{row['max_drawdown']:.2%}",
+                      f"{row['sharpe_ratio']:.2f}", f"{row['profit_factor']:.2f}")
+    Console().print(table)
+
+    if table_df.attrs['approximate']:
+        logger.info("Моменты сделок зафиксированы по базовому прогону. Для точного результата используйте --exact.")
+
+    if args.output:
+        table_df.to_csv(args.output, index=False)
+        logger.info(f"Таблица сохранена в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,10 +46,62 @@ def main():
     parser.add_argument("--n_trials", type=int, default=100, help="Количество итераций Optuna на каждом шаге WFO.")
 
     parser.add_argument("--total_periods", type=int, required=True, help="На сколько равных частей разделить весь датасет.")
-    parser.add_argument("--train_periods", type=int, required=True, help="Сколько частей использовать для обучения (In-Sample).")
+    parser.add_argument("--train_periods", type=int, default=None,
+                        help="Сколько частей использовать для обучения (In-Sample). Обязателен для WFO.")
     parser.add_argument("--test_periods", type=int, default=1, help="Сколько частей использовать для теста (Out-of-Sample).")
 
+    parser.add_argument("--validation", dest="validation_mode", type=str, default="wfo", choices=['wfo', 'anchored', 'kfold', 'cpcv'],
+                        help="Схема проверки: скользящее окно WFO, расширяющееся окно (anchored), "
+                             "purged k-fold или combinatorial purged CV по периодам.")
+    parser.add_argument("--cv-test-groups", dest="cv_test_groups", type=int, default=None,
+                        help="CPCV: сколько периодов тестируется в одном разбиении (по умолчанию из конфига).")
+    parser.add_argument("--purge-pct", dest="purge_pct", type=float, default=None,
+                        help="CV: доля строк, удаляемая из обучения перед каждым тестовым периодом.")
+    parser.add_argument("--embargo-pct", dest="embargo_pct", type=float, default=None,
+                        help="CV: доля строк, удаляемая из обучения после каждого тестового периода.")
+
+    parser.add_argument("--warmup-bars", dest="warmup_bars", type=int, default=None,
+                        help="Anchored WFO: строк истории перед тестовым окном для разогрева стратегии (по умолчанию из конфига).")
+
+    parser.add_argument("--parallel-steps", type=int, default=None,
+                        help="Сколько шагов WFO выполнять одновременно в пуле процессов (по умолчанию из конфига).")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Общий бюджет воркеров на шаги и trials (по умолчанию — число ядер).")
+
+    parser.add_argument("--warm-start-top-k", type=int, default=None,
+                        help="Сколько лучших наборов параметров прошлого шага проверять первыми на следующем.")
+    parser.add_argument("--warm-start-trials", dest="warm_start_n_trials", type=int, default=None,
+                        help="Бюджет trials для шагов с прогревом (по умолчанию — как --n_trials).")
+
+    parser.add_argument("--fidelity-rungs", dest="fidelity_rungs", type=float, nargs='+', default=None,
+                        help="Доли точности для отбора trials, например 0.1 0.3 (полный срез оценивается всегда).")
+    parser.add_argument("--fidelity-mode", dest="fidelity_mode", type=str, default=None, choices=['window', 'instruments'],
+                        help="Урезать окно ('window') или набор инструментов портфеля ('instruments').")
+    parser.add_argument("--fidelity-reduction", dest="fidelity_reduction", type=int, default=None,
+                        help="Во сколько раз сокращается число trials на следующем уровне точности.")
+
+    parser.add_argument("--abort-max-dd", dest="abort_max_drawdown", type=float, default=None,
+                        help="Досрочно останавливать trial при просадке выше этой доли (например, 0.5).")
+    parser.add_argument("--abort-capital-floor", dest="abort_capital_floor", type=float, default=None,
+                        help="Досрочно останавливать trial, если капитал упал ниже этой доли от начального.")
+    parser.add_argument("--abort-min-trades", dest="abort_min_trades", type=int, default=None,
+                        help="Минимум закрытых сделок к контрольной точке, иначе trial останавливается.")
+    parser.add_argument("--abort-deadline", dest="abort_min_trades_deadline", type=float, default=None,
+                        help="Контрольная точка для --abort-min-trades как доля баров окна (по умолчанию 0.5).")
+
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Зерно сэмплера Optuna на шаг WFO (trials воспроизводимы, если внутри шага один поток).")
+
+    parser.add_argument("--storage", dest="study_storage", type=str, default=None,
+                        help="Хранилище Optuna (например, sqlite:///optuna.db): шаги продолжают сохраненные исследования.")
+    parser.add_argument("--study-name", dest="study_name", type=str, default=None,
+                        help="Префикс имен исследований в хранилище (по умолчанию — стратегия, биржа, интервал и RM).")
+
+    parser.add_argument("--profile", action="store_true", help="Собирать тайминги фаз BacktestEngine и выводить сводку по шагам.")
+
     args = parser.parse_args()
+    if args.validation_mode in ('wfo', 'anchored') and args.train_periods is None:
+        parser.error("для WFO необходимо указать --train_periods")
 
     # 5. Преобразуем аргументы в словарь и вызываем flow с обработкой ошибок
     try:
@@ -0,0 +1,72 @@
+import argparse
+import logging
+
+from rich.console import Console
+from rich.table import Table
+
+from app.core.analysis.constants import METRIC_CONFIG
+from app.core.engine.backtest.permutation import PermutationTest
+from app.strategies import AVAILABLE_STRATEGIES
+from app.core.risk.manager import AVAILABLE_RISK_MANAGERS
+from app.shared.logging_setup import setup_global_logging
+from app.shared.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """
+    Точка входа для перестановочного теста значимости стратегии.
+    Печатает p-value по метрикам и при необходимости сохраняет распределение в CSV.
+    """
+    setup_global_logging(mode='default', log_level=logging.INFO)
+    logging.getLogger('backtester').setLevel(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description="Перестановочный тест значимости стратегии.")
+    parser.add_argument("--strategy", type=str, required=True, choices=list(AVAILABLE_STRATEGIES.keys()))
+    parser.add_argument("--exchange", type=str, required=True, choices=['tinkoff', 'bybit'])
+    parser.add_argument("--instrument", type=str, required=True)
+    parser.add_argument("--interval", type=str, required=True)
+    parser.add_argument("--rm", dest="risk_manager_type", type=str, default="FIXED",
+                        choices=list(AVAILABLE_RISK_MANAGERS.keys()))
+    parser.add_argument("--permutations", type=int, default=200, help="Количество перестановок.")
+    parser.add_argument("--workers", type=int, default=None, help="Число процессов (по умолчанию — все ядра).")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно для воспроизводимости.")
+    parser.add_argument("--output", type=str, default=None, help="Путь для сохранения распределения в CSV.")
+    args = parser.parse_args()
+
+    engine_settings = {
+        "strategy_class": AVAILABLE_STRATEGIES[args.strategy],
+        "exchange": args.exchange,
+        "instrument": args.instrument,
+        "interval": args.interval,
+        "risk_manager_type": args.risk_manager_type,
+        "initial_capital": config.BACKTEST_CONFIG["INITIAL_CAPITAL"],
+        "commission_rate": config.BACKTEST_CONFIG["COMMISSION_RATE"],
+        "data_dir": config.PATH_CONFIG["DATA_DIR"],
+        "strategy_params": None,
+        "risk_manager_params": None
+    }
+
+    test = PermutationTest(engine_settings, n_permutations=args.permutations,
+                           n_workers=args.workers, seed=args.seed)
+    table_df = test.run()
+
+    table = Table(title=f"Перестановочный тест: {args.permutations} перестановок (seed={args.seed})")
+    for column in ["Метрика", "Факт", "Среднее (перест.)", "СКО (перест.)", "p-value"]:
+        table.add_column(column, justify="right")
+    for metric, row in table_df.iterrows():
+        p_value_str = f"{row['p_value']:.4f}"
+        if row['p_value'] <= 0.05:
+            p_value_str = f"[green]{p_value_str}[/green]"
+        table.add_row(METRIC_CONFIG[metric]['name'], f"{row['observed']:.4f}", f"{row['permuted_mean']:.4f}",
+                      f"{row['permuted_std']:.4f}", p_value_str)
+    Console().print(table)
+
+    if args.output:
+        test.distribution.to_csv(args.output, index=False)
+        logger.info(f"Распределение метрик по перестановкам сохранено в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
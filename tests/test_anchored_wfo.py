@@ -0,0 +1,65 @@
+import queue
+
+import pandas as pd
+
+from app.core.calculations.indicator_space import IndicatorSpace
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.core.engine.optimization.engine import _anchored_step_inputs
+from app.core.engine.optimization.splitter import PeriodSplit
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+
+def test_anchored_step_reuses_full_history_features():
+    """
+    Проверяет, что обучающее окно anchored-шага начинается с первой строки, а срез матрицы,
+    построенной по всей истории, совпадает с матрицей, рассчитанной заново по окну.
+    """
+    # Arrange
+    feature_engine = FeatureEngine()
+    data = generate_ohlcv(n_bars=2000, seed=6)
+    periods = PeriodSplit(data, 5)
+    space = IndicatorSpace(AVAILABLE_STRATEGIES["simple_sma_cross"], "ATR")
+    full_matrix = space.build(data, feature_engine)
+    settings = {"train_periods": 2, "test_periods": 1, "warmup_bars": 100}
+
+    # Act
+    inputs = _anchored_step_inputs(settings, {"SYN": periods}, {"SYN": full_matrix}, step_num=2)
+
+    # Assert
+    train_slice = inputs["train_slices"]["SYN"]
+    test_slice = inputs["test_slices"]["SYN"]
+    assert train_slice.index[0] == 0 and len(train_slice) == periods.bounds[3]
+    assert test_slice.index[0] == periods.bounds[3] - 100 and test_slice.index[-1] == periods.bounds[4] - 1
+    assert inputs["oos_settings"]["SYN"]["trade_start_time"] == data['time'].iloc[periods.bounds[3]]
+
+    fresh = space.build(train_slice, feature_engine)
+    sliced = inputs["train_feature_matrices"]["SYN"]
+    assert sliced.matches(train_slice)
+    pd.testing.assert_frame_equal(sliced.frame, fresh.frame)
+
+
+def test_warmup_bars_are_history_only(tmp_path):
+    """Проверяет, что до 'trade_start_time' нет сделок, а кривая капитала и данные начинаются с него."""
+    # Arrange
+    data = generate_ohlcv(n_bars=3000, seed=4, regimes=[1.0, 2.5])
+    trade_start_time = data['time'].iloc[1500]
+    settings = {
+        "strategy_class": AVAILABLE_STRATEGIES["simple_sma_cross"],
+        "exchange": "bybit", "instrument": "SYN", "interval": "5min",
+        "risk_manager_type": "FIXED", "initial_capital": 100_000.0, "commission_rate": 0.0005,
+        "strategy_params": None, "risk_manager_params": None,
+        "data_slice": data, "data_dir": str(tmp_path), "trade_log_path": None,
+        "trade_start_time": trade_start_time,
+    }
+
+    # Act
+    results = BacktestEngine(settings, queue.Queue(), FeatureEngine()).run()
+
+    # Assert
+    assert results["status"] == "success"
+    assert not results["trades_df"].empty
+    assert (results["trades_df"]["entry_timestamp_utc"] > trade_start_time).all()
+    assert results["enriched_data"]['time'].iloc[0] == trade_start_time
+    assert len(results["equity_curve"]) == 1500
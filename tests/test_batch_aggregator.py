@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+
+from app.core.analysis.batch_aggregator import BatchResultsAggregator
+
+
+def test_aggregator_keeps_only_scalars_and_spills_trades(tmp_path):
+    """
+    Проверяет, что агрегатор оставляет в сводке только скалярные метрики,
+    а сделки сбрасывает на диск с колонкой инструмента.
+    """
+    # Arrange
+    aggregator = BatchResultsAggregator(spill_dir=str(tmp_path))
+    trades = pd.DataFrame({"pnl": [10.0, -5.0], "direction": ["BUY", "SELL"]})
+    result = {
+        "pnl_pct": 1.5,
+        "total_trades": 2,
+        "trades_df": trades,
+        "equity_curve": pd.DataFrame({"equity": [1.0, 2.0]}),
+        "initial_capital": 1000.0,
+    }
+
+    # Act
+    aggregator.add("SBER", result)
+    aggregator.add("GAZP", {"pnl_pct": 0.0, "total_trades": 0, "trades_df": pd.DataFrame()})
+    summary = aggregator.summary_df()
+    spilled = list(aggregator.iter_trades())
+
+    # Assert
+    assert len(aggregator) == 2
+    assert set(summary.columns) == {"pnl_pct", "total_trades", "initial_capital", "instrument"}
+    assert summary["instrument"].tolist() == ["SBER", "GAZP"]
+    assert len(spilled) == 1
+    assert spilled[0]["instrument"].tolist() == ["SBER", "SBER"]
+    assert spilled[0]["pnl"].tolist() == [10.0, -5.0]
+
+
+def test_aggregator_cleans_own_temp_dir():
+    """Проверяет, что временная папка, созданная агрегатором, удаляется в cleanup()."""
+    # Arrange
+    aggregator = BatchResultsAggregator()
+    aggregator.add("SBER", {"pnl_pct": 1.0, "trades_df": pd.DataFrame({"pnl": [1.0]})})
+
+    # Act
+    aggregator.cleanup()
+
+    # Assert
+    assert not os.path.exists(aggregator.trades_dir)
@@ -0,0 +1,48 @@
+import queue
+
+import pandas as pd
+import pytest
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+
+class _InPlaceStrategy(AVAILABLE_STRATEGIES["simple_sma_cross"]):
+    """Стратегия, которая при подготовке данных пишет в существующую колонку своей копии."""
+
+    def _prepare_custom_features(self, data: pd.DataFrame) -> pd.DataFrame:
+        data.loc[data.index[0], 'close'] = -1.0
+        return data
+
+
+@pytest.mark.parametrize("copy_on_write", [True, False])
+def test_data_preparation_leaves_caller_slice_untouched(tmp_path, copy_on_write):
+    """
+    Проверяет, что запись стратегии в свою копию данных не доходит до переданного среза
+    ни с Copy-on-Write, ни без него, а глобальная опция pandas после прогона остается прежней.
+    """
+    # Arrange
+    data = generate_ohlcv(n_bars=2000, seed=8)
+    snapshot = data.copy(deep=True)
+    settings = {
+        "strategy_class": _InPlaceStrategy,
+        "exchange": "bybit", "instrument": "SYN", "interval": "5min",
+        "risk_manager_type": "FIXED", "initial_capital": 100_000.0, "commission_rate": 0.0005,
+        "strategy_params": None, "risk_manager_params": None,
+        "data_slice": data, "data_dir": str(tmp_path), "trade_log_path": None,
+        "copy_on_write": copy_on_write,
+    }
+
+    # Act
+    # pandas_ta включает CoW глобально при импорте, поэтому исходное значение фиксируется явно
+    with pd.option_context("mode.copy_on_write", False):
+        results = BacktestEngine(settings, queue.Queue(), FeatureEngine()).run()
+        option_after_run = pd.options.mode.copy_on_write
+
+    # Assert
+    assert results["status"] == "success"
+    assert len(results["enriched_data"].columns) > len(data.columns)
+    pd.testing.assert_frame_equal(data, snapshot)
+    assert option_after_run is False
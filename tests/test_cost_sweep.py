@@ -0,0 +1,33 @@
+import numpy as np
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.cost_sweep import CostSensitivitySweep
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+
+def test_grid_point_with_base_costs_reproduces_backtest(tmp_path):
+    """
+    Проверяет, что векторный пересчет в точке с базовыми издержками дает те же PnL,
+    что и сам бэктест, а рост комиссии монотонно уменьшает итоговый результат.
+    """
+    # Arrange
+    settings = {
+        "strategy_class": AVAILABLE_STRATEGIES["mean_reversion"],
+        "exchange": "bybit", "instrument": "SYN", "interval": "5min",
+        "risk_manager_type": "FIXED", "initial_capital": 100_000.0, "commission_rate": 0.0005,
+        "strategy_params": None, "risk_manager_params": None,
+        "data_slice": generate_ohlcv(n_bars=3000, seed=4), "data_dir": str(tmp_path), "trade_log_path": None,
+        "slippage_config": {"ENABLED": True, "IMPACT_COEFFICIENT": 0.1},
+    }
+    sweep = CostSensitivitySweep(settings, FeatureEngine())
+
+    # Act
+    pnl = sweep.pnl_grid([0.0005], [0.1])
+    table = sweep.sweep([0.0, 0.0005, 0.001], [0.1])
+
+    # Assert
+    assert len(sweep.base_trades_df) > 0
+    np.testing.assert_allclose(pnl[0, 0], sweep.base_trades_df["pnl"].to_numpy(), rtol=1e-9, atol=1e-9)
+    assert table.attrs["approximate"]
+    assert table["pnl_abs"].is_monotonic_decreasing
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.analysis.downsample import aggregate_ohlc, downsample_indices
+from benchmarks.synthetic import generate_ohlcv
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+def test_downsample_keeps_extremes_and_forced_points(method):
+    """Проверяет, что прореженный ряд ограничен по размеру и содержит экстремумы и обязательные точки."""
+    # Arrange
+    rng = np.random.default_rng(3)
+    y = 100_000 + np.cumsum(rng.normal(0, 50, 200_000))
+    keep = rng.choice(len(y), 300, replace=False)
+
+    # Act
+    indices = downsample_indices(y, 2000, method, keep=keep)
+
+    # Assert
+    assert len(indices) <= 2000 + len(keep) + 2
+    assert np.all(np.diff(indices) > 0)
+    assert {0, len(y) - 1, int(np.argmin(y)), int(np.argmax(y))} <= set(indices.tolist())
+    assert set(keep.tolist()) <= set(indices.tolist())
+
+
+def test_aggregate_ohlc_preserves_price_range():
+    """Проверяет, что укрупненные свечи сохраняют открытие, закрытие и экстремумы цены за период."""
+    # Arrange
+    data = generate_ohlcv(n_bars=10_001, seed=5)
+
+    # Act
+    candles = aggregate_ohlc(data, 1000)
+
+    # Assert
+    assert len(candles) <= 1000
+    assert candles['time'].iloc[0] == data['time'].iloc[0]
+    assert candles['open'].iloc[0] == data['open'].iloc[0]
+    assert candles['close'].iloc[-1] == data['close'].iloc[-1]
+    assert candles['high'].max() == data['high'].max()
+    assert candles['low'].min() == data['low'].min()
+    assert pd.Series(candles['time']).is_monotonic_increasing
@@ -0,0 +1,53 @@
+import queue
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+
+def _run(data, tmp_path, early_abort=None):
+    settings = {
+        "strategy_class": AVAILABLE_STRATEGIES["simple_sma_cross"],
+        "exchange": "bybit", "instrument": "SYN", "interval": "5min",
+        "risk_manager_type": "FIXED", "initial_capital": 100_000.0, "commission_rate": 0.0005,
+        "strategy_params": None, "risk_manager_params": None,
+        "data_slice": data, "data_dir": str(tmp_path), "trade_log_path": None,
+        "early_abort": early_abort,
+    }
+    return BacktestEngine(settings, queue.Queue(), FeatureEngine()).run()
+
+
+def test_unreachable_min_trades_stops_loop_at_deadline(tmp_path):
+    """
+    Проверяет, что при недостижимом минимуме сделок цикл останавливается
+    на контрольной точке, а результат помечается как досрочно остановленный.
+    """
+    # Arrange
+    data = generate_ohlcv(n_bars=3000, seed=4, regimes=[1.0, 2.5])
+    rules = {"min_trades": 10_000, "min_trades_deadline": 0.25}
+
+    # Act
+    full = _run(data, tmp_path)
+    aborted = _run(data, tmp_path, rules)
+
+    # Assert
+    assert full["status"] == "success" and full["abort_reason"] is None
+    assert aborted["status"] == "aborted"
+    assert "trades" in aborted["abort_reason"]
+    assert len(aborted["equity_curve"]) < len(full["equity_curve"]) / 2
+
+
+def test_disabled_rules_keep_results_identical(tmp_path):
+    """Проверяет, что выключенные (нулевые) критерии не меняют результат бэктеста."""
+    # Arrange
+    data = generate_ohlcv(n_bars=2000, seed=7)
+    rules = {"max_drawdown": 0.0, "capital_floor": 0.0, "min_trades": 0, "min_trades_deadline": 0.5}
+
+    # Act
+    reference = _run(data, tmp_path)
+    with_rules = _run(data, tmp_path, rules)
+
+    # Assert
+    assert with_rules["status"] == "success"
+    assert with_rules["metrics"] == reference["metrics"]
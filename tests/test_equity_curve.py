@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from app.core.portfolio.equity import EquityCurveRecorder
+from app.core.portfolio.state import PortfolioState
+from app.shared.primitives import Position, TradeDirection
+
+
+def _ts(i: int) -> pd.Timestamp:
+    return pd.Timestamp(datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i))
+
+
+def test_mark_to_market_includes_open_position():
+    """
+    Проверяет, что побарная кривая учитывает нереализованный PnL открытой позиции
+    и комиссию входа, а просадка внутри позиции попадает в max_drawdown.
+    """
+    # Arrange
+    state = PortfolioState(initial_capital=1000.0)
+    recorder = EquityCurveRecorder(n_bars=3)
+
+    # Act
+    recorder.record(_ts(0), state, {"TEST": 10.0})
+    state.positions["TEST"] = Position(
+        instrument="TEST", quantity=10, entry_price=10.0, entry_timestamp=_ts(1),
+        direction=TradeDirection.BUY, stop_loss=5.0, take_profit=20.0, entry_commission=1.0
+    )
+    recorder.record(_ts(1), state, {"TEST": 8.0})
+    del state.positions["TEST"]
+    recorder.record(_ts(2), state, {"TEST": 8.0})
+    frame = recorder.to_frame()
+
+    # Assert
+    assert list(frame['equity']) == [1000.0, 979.0, 1000.0]
+    assert frame['exposure'].iloc[1] == pytest.approx(80.0 / 979.0)
+    assert recorder.max_drawdown == pytest.approx(0.021)
+    assert frame.attrs['max_drawdown'] == pytest.approx(0.021)
+
+
+def test_downsampling_bounds_memory_but_keeps_exact_drawdown():
+    """
+    Проверяет, что при прореживании сохраняется не больше max_points (+ последний бар),
+    а максимальная просадка считается по всем барам, включая пропущенные.
+    """
+    # Arrange
+    n_bars = 1000
+    state = PortfolioState(initial_capital=1000.0)
+    recorder = EquityCurveRecorder(n_bars=n_bars, max_points=100)
+
+    # Act
+    for i in range(n_bars):
+        # Единственный провал капитала приходится на бар, который не попадет в выборку
+        state.current_capital = 500.0 if i == 333 else 1000.0 + i
+        recorder.record(_ts(i), state, {})
+    frame = recorder.to_frame()
+
+    # Assert
+    assert len(frame) <= 101
+    assert frame['time'].iloc[-1] == _ts(n_bars - 1)
+    assert 500.0 not in frame['equity'].values
+    assert recorder.max_drawdown == pytest.approx(1 - 500.0 / 1332.0)
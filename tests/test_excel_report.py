@@ -0,0 +1,61 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from app.core.analysis.reports import excel_report
+from app.core.analysis.reports.excel_report import ExcelReportGenerator
+
+
+def _results(n_instruments: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "instrument": [f"SYN{i}" for i in range(n_instruments)],
+        "pnl_pct": rng.normal(0, 5, n_instruments),
+        "pnl_abs": rng.normal(0, 5000, n_instruments),
+        "pnl_bh_pct": rng.normal(0, 5, n_instruments),
+        "total_trades": np.arange(n_instruments),
+        "win_rate": rng.uniform(0, 1, n_instruments),
+        "profit_factor": np.r_[np.inf, rng.uniform(0, 3, n_instruments - 1)],
+        "max_drawdown": rng.uniform(0, 0.5, n_instruments),
+        "sharpe_ratio": rng.normal(0, 1, n_instruments),
+        "calmar_ratio": rng.normal(0, 1, n_instruments),
+    })
+
+
+def _trades_source():
+    for i in range(3):
+        exits = pd.date_range("2024-01-01", periods=40, freq="h", tz="UTC")
+        yield pd.DataFrame({"instrument": f"SYN{i}", "pnl": np.arange(40.0) - i,
+                            "entry_timestamp_utc": exits - pd.Timedelta(minutes=5), "exit_timestamp_utc": exits})
+
+
+def test_streaming_report_splits_trades_and_writes_companion(tmp_path, monkeypatch):
+    """
+    Проверяет потоковый отчет: сделки переносятся на новые листы при переполнении,
+    а сопутствующая выгрузка содержит все сделки и векторно посчитанный средний PnL сделки.
+    """
+    # Arrange
+    monkeypatch.setattr(excel_report, "EXCEL_MAX_ROWS", 51)
+    results = _results(6)
+    output_path = tmp_path / "report.xlsx"
+    generator = ExcelReportGenerator(results, "sma", "5min", "FIXED", trades_source=_trades_source,
+                                     trades_sheet=True, constant_memory=True, companion_format="parquet",
+                                     chunk_rows=7)
+
+    # Act
+    generator.generate(str(output_path))
+
+    # Assert
+    with zipfile.ZipFile(output_path) as archive:
+        workbook_xml = archive.read("xl/workbook.xml").decode("utf-8")
+    for sheet in ("Сводка", "Детализация", "Сделки", "Сделки 2", "Сделки 3"):
+        assert f'name="{sheet}"' in workbook_xml
+    assert 'name="Сделки 4"' not in workbook_xml
+
+    trades = pd.read_parquet(tmp_path / "report_trades.parquet")
+    assert len(trades) == 120
+    summary = pd.read_parquet(tmp_path / "report_summary.parquet").set_index("instrument")
+    expected = np.where(results["total_trades"] > 0, results["pnl_abs"] / results["total_trades"].clip(lower=1), 0.0)
+    np.testing.assert_allclose(summary.loc[results["instrument"], "avg_trade_pnl"], expected)
+    assert summary["pnl_pct"].is_monotonic_decreasing
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from app.core.calculations.indicator_space import IndicatorSpace
+from app.core.calculations.indicators import FeatureEngine
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+
+def test_space_covers_optimizable_periods():
+    """Проверяет, что пространство содержит SMA для всего диапазона sma_period и ATR риск-менеджера."""
+    # Act
+    space = IndicatorSpace(AVAILABLE_STRATEGIES["simple_sma_cross"], "ATR")
+
+    # Assert
+    sma_periods = sorted(r["params"]["period"] for r in space.requirements if r["name"] == "sma")
+    assert sma_periods == list(range(10, 101))
+    assert {"name": "atr", "params": {"period": 14}} in space.requirements
+
+
+def test_precomputed_columns_match_direct_calculation():
+    """
+    Проверяет, что индикаторы, скопированные из матрицы, совпадают
+    с рассчитанными напрямую через FeatureEngine, а отсутствующие в матрице рассчитываются.
+    """
+    # Arrange
+    feature_engine = FeatureEngine()
+    data = generate_ohlcv(n_bars=1500, seed=3)
+    space = IndicatorSpace(AVAILABLE_STRATEGIES["triple_filter"], "FIXED")
+    matrix = space.build(data, feature_engine)
+    requirements = [{"name": "ema", "params": {"period": 15}},
+                    {"name": "sma", "params": {"period": 20, "column": "volume"}},
+                    {"name": "ema", "params": {"period": 3}}]
+
+    # Act
+    from_matrix = feature_engine.add_required_features(data.copy(), requirements, precomputed=matrix)
+    direct = feature_engine.add_required_features(data.copy(), requirements)
+
+    # Assert
+    pd.testing.assert_frame_equal(from_matrix, direct)
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.analysis.metrics import (
+    PortfolioMetricsCalculator, OnlineMetricsAccumulator, BenchmarkCache, calculate_batch_metrics
+)
+from benchmarks.synthetic import generate_ohlcv
+
+
+@pytest.fixture
+def random_trades_df() -> pd.DataFrame:
+    """Случайный набор сделок с прибылями и убытками, упорядоченный по времени выхода."""
+    rng = np.random.default_rng(42)
+    n = 250
+    entry = pd.date_range("2023-01-01", periods=n, freq="7h", tz="UTC")
+    return pd.DataFrame({
+        'pnl': rng.normal(15.0, 400.0, n),
+        'entry_timestamp_utc': entry,
+        'exit_timestamp_utc': entry + pd.Timedelta(hours=3),
+    })
+
+
+def test_online_accumulator_matches_calculator(random_trades_df):
+    """
+    Проверяет, что метрики, накопленные потоково по каждой сделке,
+    совпадают с метриками PortfolioMetricsCalculator по готовому DataFrame.
+    """
+    # Arrange
+    calculator = PortfolioMetricsCalculator(random_trades_df, 100000.0, 365)
+    accumulator = OnlineMetricsAccumulator(100000.0, 365)
+
+    # Act
+    for row in random_trades_df.itertuples(index=False):
+        accumulator.update(row.pnl, row.entry_timestamp_utc, row.exit_timestamp_utc)
+    expected = calculator.calculate_all()
+    actual = accumulator.calculate_all()
+
+    # Assert
+    assert list(actual.keys()) == list(expected.keys())
+    for key, value in expected.items():
+        assert actual[key] == pytest.approx(value, rel=1e-9), key
+
+
+def test_online_accumulator_invalid_with_single_trade():
+    """Проверяет, что при одной сделке накопитель, как и калькулятор, возвращает нулевые метрики."""
+    # Arrange
+    accumulator = OnlineMetricsAccumulator(1000.0)
+    ts = pd.Timestamp("2024-01-01", tz="UTC")
+
+    # Act
+    accumulator.update(50.0, ts, ts)
+
+    # Assert
+    assert not accumulator.is_valid
+    assert accumulator.calculate_all()['total_trades'] == 0
+
+
+def test_calculator_matches_pandas_reference_exactly(random_trades_df):
+    """
+    Проверяет, что агрегаты numpy-ядра побитно совпадают с расчетом через операции pandas
+    (cumsum, pct_change, cummax, std), на которых калькулятор был построен изначально.
+    """
+    # Arrange
+    initial_capital = 100000.0
+    pnl = random_trades_df['pnl']
+    equity = initial_capital + pnl.cumsum()
+    returns = equity.pct_change().dropna()
+    high_water_mark = equity.cummax()
+
+    # Act
+    calculator = PortfolioMetricsCalculator(random_trades_df, initial_capital, 365)
+    aggregates = calculator._aggregates
+
+    # Assert
+    assert aggregates['total_pnl'] == pnl.sum()
+    assert aggregates['pnl_std'] == pnl.std()
+    assert aggregates['returns_mean'] == returns.mean()
+    assert aggregates['returns_std'] == returns.std()
+    assert aggregates['downside_std'] == returns[returns < 0].std()
+    assert aggregates['gross_loss'] == abs(pnl[pnl < 0].sum())
+    assert aggregates['max_drawdown'] == abs(((equity - high_water_mark) / high_water_mark).min())
+    pd.testing.assert_series_equal(calculator.trades['equity_curve'], equity, check_names=False)
+
+
+def test_batch_metrics_match_per_run_calculator(random_trades_df):
+    """
+    Проверяет, что пакетный расчет по длинной таблице дает те же метрики, что и
+    отдельный PortfolioMetricsCalculator на каждый прогон, а прогон с одной сделкой — нулевые.
+    """
+    # Arrange
+    runs = {
+        "a": random_trades_df.iloc[:120],
+        "b": random_trades_df.iloc[120:],
+        "single": random_trades_df.iloc[:1],
+    }
+    long_df = pd.concat([df.assign(run_id=run_id) for run_id, df in runs.items()], ignore_index=True)
+
+    # Act
+    batch = calculate_batch_metrics(long_df, 100000.0, 365)
+
+    # Assert
+    assert list(batch.index) == ["a", "b", "single"]
+    for run_id in ("a", "b"):
+        expected = PortfolioMetricsCalculator(runs[run_id], 100000.0, 365).calculate_all()
+        for key, value in expected.items():
+            assert batch.loc[run_id, key] == pytest.approx(value, rel=1e-9), (run_id, key)
+    assert batch.loc["single", "total_trades"] == 0
+
+
+def test_benchmark_cache_reuses_metrics_for_same_prices():
+    """
+    Проверяет, что метрики Buy & Hold считаются один раз на набор цен и капитал
+    и совпадают с расчетом через кривую капитала pandas.
+    """
+    # Arrange
+    data = generate_ohlcv(n_bars=1500, seed=9)
+    cache = BenchmarkCache()
+    equity = data['close'] * (100000.0 / data['open'].iloc[0])
+    returns = equity.pct_change().dropna()
+
+    # Act
+    first = cache.get_metrics(data, 100000.0, 365)
+    second = cache.get_metrics(data.copy(), 100000.0, 365)
+    other_capital = cache.get_metrics(data, 50000.0, 365)
+
+    # Assert
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert first == second
+    assert other_capital['pnl_abs'] == pytest.approx(first['pnl_abs'] / 2)
+    assert first['sharpe_ratio'] == (returns.mean() / returns.std()) * np.sqrt(365)
+    assert first['max_drawdown'] == abs(((equity - equity.cummax()) / equity.cummax()).min())
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.analysis.metrics import PortfolioMetricsCalculator
+from app.core.analysis.monte_carlo import MonteCarloSimulator, run_monte_carlo
+from app.shared.config import config
+
+
+def _make_trades(n_trades: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    exits = pd.date_range("2024-01-01", periods=n_trades, freq="D", tz="UTC")
+    return pd.DataFrame({
+        "pnl": rng.normal(50, 400, n_trades),
+        "entry_timestamp_utc": exits - pd.Timedelta(hours=5),
+        "exit_timestamp_utc": exits,
+    })
+
+
+def test_shuffle_keeps_final_pnl_and_observed_matches_calculator():
+    """
+    Проверяет, что перестановка сделок не меняет итоговый PnL, а метрики фактической
+    последовательности совпадают с PortfolioMetricsCalculator.
+    """
+    # Arrange
+    trades = _make_trades(60, seed=3)
+    simulator = MonteCarloSimulator.from_trades(trades, 100_000.0, n_simulations=500, method="shuffle", seed=1)
+
+    # Act
+    distribution = simulator.run()
+    observed = simulator.observed()
+    metrics = PortfolioMetricsCalculator(trades, 100_000.0, 252).calculate_all()
+
+    # Assert
+    assert len(distribution) == 500
+    np.testing.assert_allclose(distribution["final_pnl"], trades["pnl"].sum(), rtol=1e-9)
+    assert distribution["max_drawdown"].std() > 0
+    assert np.isclose(observed["max_drawdown"], metrics["max_drawdown"])
+    assert np.isclose(observed["sharpe_ratio"], metrics["sharpe_ratio"])
+
+
+def test_observed_iid_returns_fall_inside_own_shuffle_band():
+    """
+    Проверяет, что для сделок с независимыми одинаково распределенными доходностями
+    (размер позиции пропорционален капиталу) наблюдаемые метрики лежат внутри полосы перестановок.
+    """
+    # Arrange
+    rng = np.random.default_rng(5)
+    returns = rng.normal(-0.004, 0.01, 400)
+    equity = 100_000.0 * np.cumprod(1 + returns)
+    pnl = np.diff(np.concatenate(([100_000.0], equity)))
+    simulator = MonteCarloSimulator(pnl, 100_000.0, n_simulations=2000, method="shuffle", seed=3)
+
+    # Act
+    summary = simulator.summary(confidence=0.9)
+
+    # Assert
+    np.testing.assert_allclose(simulator.returns, returns, rtol=1e-9)
+    for metric in ("sharpe_ratio", "max_drawdown"):
+        assert summary.loc[metric, "lower"] <= summary.loc[metric, "observed"] <= summary.loc[metric, "upper"]
+    assert np.isclose(summary.loc["final_pnl", "median"], pnl.sum())
+
+
+@pytest.mark.parametrize("method", ["bootstrap", "shuffle"])
+def test_seeded_run_does_not_depend_on_chunking(method):
+    """Проверяет, что при одном зерне результат не зависит от размера пачек и числа воркеров."""
+    # Arrange
+    trades = _make_trades(40, seed=7)
+    common = dict(n_simulations=1000, method=method, seed=42)
+    single = MonteCarloSimulator.from_trades(trades, 50_000.0, max_chunk_elements=40 * 300, **common)
+    larger_chunks = MonteCarloSimulator.from_trades(trades, 50_000.0, max_chunk_elements=40 * 1000, **common)
+    parallel = MonteCarloSimulator.from_trades(trades, 50_000.0, max_chunk_elements=40 * 64, n_workers=2, **common)
+
+    # Act
+    summary = single.summary(confidence=0.9)
+    distribution = single.run()
+
+    # Assert
+    pd.testing.assert_frame_equal(larger_chunks.run(), distribution)
+    pd.testing.assert_frame_equal(parallel.run(), distribution)
+    assert summary.loc["max_drawdown", "lower"] < summary.loc["max_drawdown", "median"] < summary.loc["max_drawdown", "upper"]
+    assert 0.0 <= summary.attrs["probability_of_loss"] <= 1.0
+
+
+def test_run_monte_carlo_uses_config_seed(monkeypatch):
+    """Проверяет, что без явного зерна отчетный запуск берет SEED из конфига и повторяется от запуска к запуску."""
+    # Arrange
+    trades = _make_trades(50, seed=9)
+    monkeypatch.setattr(config, "bt_mc_seed", 11)
+
+    # Act
+    first = run_monte_carlo(trades, 100_000.0, n_simulations=300)
+    second = run_monte_carlo(trades, 100_000.0, n_simulations=300)
+    explicit = run_monte_carlo(trades, 100_000.0, n_simulations=300, seed=11)
+    other = run_monte_carlo(trades, 100_000.0, n_simulations=300, seed=12)
+
+    # Assert
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, explicit)
+    assert not first["median"].equals(other["median"])
@@ -0,0 +1,56 @@
+import optuna
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.optimization.objective import Objective
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv, generate_universe
+
+PARAMS = {"sma_period": 30, "rm_risk_percent_long": 1.0, "rm_risk_percent_short": 1.0, "rm_tp_ratio": 2.0}
+
+
+def _objective(slices, **kwargs):
+    return Objective(AVAILABLE_STRATEGIES["simple_sma_cross"], "bybit", "5min", "FIXED", slices,
+                     ["sharpe_ratio"], FeatureEngine(), precompute_features=False, early_abort={}, **kwargs)
+
+
+def test_fidelity_slices_by_window_and_instruments():
+    """
+    Проверяет срезы уровней точности: в режиме 'window' берется конец окна,
+    в режиме 'instruments' — часть портфеля, а уровень, совпавший с полным срезом, отбрасывается.
+    """
+    # Arrange
+    universe = generate_universe(3, seed=1, n_bars=400)
+
+    # Act
+    by_window = _objective(universe, fidelity_rungs=[0.25], fidelity_mode="window")
+    by_instruments = _objective(universe, fidelity_rungs=[0.34, 0.67, 0.99, 1.0], fidelity_mode="instruments")
+
+    # Assert
+    window_slices = by_window.fidelity_levels[0][0]
+    assert len(window_slices["SYN00"]) == 100
+    assert window_slices["SYN00"]["time"].iloc[-1] == universe["SYN00"]["time"].iloc[-1]
+    assert by_instruments.fidelity_rungs == [0.34, 0.67]
+    assert [list(level[0]) for level in by_instruments.fidelity_levels] == [["SYN00"], ["SYN00", "SYN01"]]
+
+
+def test_promoted_trial_gets_full_slice_value():
+    """
+    Проверяет, что trial, прошедший все уровни, получает то же значение, что и без уровней точности,
+    а промежуточные значения сообщаются на шагах reduction**k.
+    """
+    # Arrange
+    slices = {"SYN": generate_ohlcv(n_bars=3000, seed=3)}
+    results = {}
+
+    # Act
+    for rungs in ([], [0.1, 0.3]):
+        objective = _objective(slices, fidelity_rungs=rungs, fidelity_reduction=3)
+        study = optuna.create_study(direction="maximize", pruner=objective.build_pruner())
+        study.enqueue_trial(PARAMS)
+        study.optimize(objective, n_trials=1)
+        results[len(rungs)] = study.trials[0]
+
+    # Assert
+    assert results[2].state == optuna.trial.TrialState.COMPLETE
+    assert set(results[2].intermediate_values) == {1, 3}
+    assert results[2].value == results[0].value
@@ -0,0 +1,87 @@
+import optuna
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.optimization.objective import Objective
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+PARAMS = {"sma_period": 30, "rm_risk_percent_long": 1.0, "rm_risk_percent_short": 1.0, "rm_tp_ratio": 2.0}
+
+
+def _objective(data):
+    return Objective(AVAILABLE_STRATEGIES["simple_sma_cross"], "bybit", "5min", "FIXED", {"SYN": data},
+                     ["sharpe_ratio"], FeatureEngine(), precompute_features=False, early_abort={})
+
+
+def _count_backtests(objective, monkeypatch, result=None):
+    """Подменяет прогон бэктестов счетчиком (result=None — настоящий прогон)."""
+    calls = []
+    original = objective._run_backtests
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        if isinstance(result, Exception):
+            raise result
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(objective, "_run_backtests", counted)
+    return calls
+
+
+def test_repeated_params_reuse_cached_metrics(monkeypatch):
+    """Проверяет, что повтор комбинации параметров берет метрики из кэша без бэктеста."""
+    # Arrange
+    objective = _objective(generate_ohlcv(n_bars=3000, seed=3))
+    calls = _count_backtests(objective, monkeypatch)
+    study = optuna.create_study(direction="maximize")
+    study.enqueue_trial(PARAMS)
+    study.enqueue_trial(PARAMS)
+
+    # Act
+    study.optimize(objective, n_trials=2)
+
+    # Assert
+    first, second = study.trials
+    assert len(calls) == 1 and objective.cache_hits == 1
+    assert second.state == optuna.trial.TrialState.COMPLETE
+    assert second.value == first.value
+    assert second.user_attrs == first.user_attrs
+
+
+def test_cached_pruned_trial_is_pruned_again(monkeypatch):
+    """Проверяет, что повтор отброшенной комбинации снова отбрасывается без бэктеста."""
+    # Arrange
+    objective = _objective(generate_ohlcv(n_bars=500, seed=1))
+    calls = _count_backtests(objective, monkeypatch, result=optuna.TrialPruned("нет сделок"))
+    study = optuna.create_study(direction="maximize")
+    study.enqueue_trial(PARAMS)
+    study.enqueue_trial(PARAMS)
+
+    # Act
+    study.optimize(objective, n_trials=2)
+
+    # Assert
+    assert len(calls) == 1
+    assert [t.state for t in study.trials] == [optuna.trial.TrialState.PRUNED] * 2
+
+
+def test_cache_key_rounds_floats_and_depends_on_window():
+    """
+    Проверяет, что ключ не различает float, отличающиеся шумом округления, но различает
+    реально разные значения, порядок параметров не важен, а другое обучающее окно дает другой ключ.
+    """
+    # Arrange
+    data = generate_ohlcv(n_bars=600, seed=2)
+    objective = _objective(data)
+    other_window = _objective(data.iloc[100:])
+
+    # Act
+    noisy = objective._cache_key({"rm_tp_ratio": 0.1 + 0.2, "sma_period": 30})
+    exact = objective._cache_key({"sma_period": 30, "rm_tp_ratio": 0.3})
+    different = objective._cache_key({"sma_period": 30, "rm_tp_ratio": 0.3001})
+
+    # Assert
+    assert noisy == exact
+    assert different != exact
+    assert other_window._cache_key({"sma_period": 30, "rm_tp_ratio": 0.3}) != exact
+    assert other_window.window_key != objective.window_key
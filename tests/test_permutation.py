@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from app.core.engine.backtest import permutation
+from app.core.engine.backtest.permutation import PermutationTest, permute_ohlcv
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+
+def test_permuted_series_keeps_endpoints_and_candle_shape():
+    """
+    Проверяет, что перестановка сохраняет первый бар, итоговую цену и корректность свечей,
+    но меняет путь цены.
+    """
+    # Arrange
+    data = generate_ohlcv(n_bars=1000, seed=5, gap_probability=0.1)
+
+    # Act
+    permuted = permute_ohlcv(data, np.random.default_rng(0))
+
+    # Assert
+    pd.testing.assert_series_equal(permuted['time'], data['time'])
+    pd.testing.assert_series_equal(permuted.iloc[0], data.iloc[0])
+    assert np.isclose(permuted['close'].iloc[-1], data['close'].iloc[-1])
+    assert (permuted['high'] >= permuted[['open', 'close']].max(axis=1) * (1 - 1e-12)).all()
+    assert (permuted['low'] <= permuted[['open', 'close']].min(axis=1) * (1 + 1e-12)).all()
+    assert not np.allclose(permuted['close'], data['close'])
+    assert sorted(permuted['volume']) == sorted(data['volume'])
+
+
+def test_seeded_test_is_reproducible_across_workers(tmp_path):
+    """
+    Проверяет, что при одном зерне распределение не зависит от числа процессов, p-value в (0, 1],
+    а последовательный прогон не оставляет состояние воркера в текущем процессе.
+    """
+    # Arrange
+    settings = {
+        "strategy_class": AVAILABLE_STRATEGIES["simple_sma_cross"],
+        "exchange": "bybit", "instrument": "SYN", "interval": "5min",
+        "risk_manager_type": "FIXED", "initial_capital": 100_000.0, "commission_rate": 0.0005,
+        "strategy_params": None, "risk_manager_params": None,
+        "data_slice": generate_ohlcv(n_bars=1500, seed=2), "data_dir": str(tmp_path),
+    }
+
+    # Act
+    sequential = PermutationTest(settings, n_permutations=6, n_workers=1, seed=3)
+    summary = sequential.run()
+    sequential_state = dict(permutation._WORKER_STATE)
+    parallel = PermutationTest(settings, n_permutations=6, n_workers=2, seed=3)
+    parallel.run()
+
+    # Assert
+    pd.testing.assert_frame_equal(sequential.distribution, parallel.distribution)
+    assert summary['p_value'].between(1 / 7, 1.0).all()
+    assert summary.attrs['n_permutations'] == 6
+    assert sequential_state == {}
@@ -0,0 +1,71 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.core.engine.backtest.profiling import ProfileAggregator
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+PHASES = {"prepare_data", "event_loop", "process_queue", "update_market_price", "strategy_on_candle",
+          "mark_to_market"}
+
+
+def _run(tmp_path, profile: bool) -> dict:
+    settings = {
+        "strategy_class": AVAILABLE_STRATEGIES["simple_sma_cross"],
+        "exchange": "bybit", "instrument": "SYN", "interval": "5min",
+        "risk_manager_type": "FIXED", "initial_capital": 100_000.0, "commission_rate": 0.0005,
+        "strategy_params": None, "risk_manager_params": None,
+        "data_slice": generate_ohlcv(n_bars=2000, seed=5), "data_dir": str(tmp_path), "trade_log_path": None,
+        "profile": profile,
+    }
+    return BacktestEngine(settings, queue.Queue(), FeatureEngine()).run()
+
+
+@pytest.mark.parametrize("profile", [False, True])
+def test_run_reports_profile_only_when_enabled(tmp_path, profile):
+    """Проверяет, что без профилирования профиль пуст, а с ним содержит фазы, бары/с и события/с."""
+    # Act
+    results = _run(tmp_path, profile)
+
+    # Assert
+    assert results["status"] == "success"
+    if not profile:
+        assert not results["profile"]
+        return
+    report = results["profile"]
+    assert PHASES <= set(report["phases"])
+    assert report["phases"]["event_loop"]["calls"] == 1
+    assert report["counters"]["bars"] == len(results["enriched_data"])
+    assert report["counters"]["events"] > 0
+    loop_s = report["phases"]["event_loop"]["total_s"]
+    assert report["bars_per_sec"] == pytest.approx(report["counters"]["bars"] / loop_s)
+    assert report["events_per_sec"] == pytest.approx(report["counters"]["events"] / loop_s)
+
+
+def test_aggregator_sums_runs_from_threads():
+    """Проверяет, что агрегатор точно суммирует профили, добавленные из нескольких потоков, и пропускает пустые."""
+    # Arrange
+    profile = {
+        "phases": {"event_loop": {"total_s": 0.5, "calls": 1, "avg_us": 5e5},
+                   "process_queue": {"total_s": 0.25, "calls": 40, "avg_us": 6250.0}},
+        "counters": {"bars": 100, "events": 40},
+    }
+    aggregator = ProfileAggregator()
+
+    # Act
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(aggregator.add, [profile] * 400 + [{}] * 50 + [None] * 50))
+    summary = aggregator.summary()
+
+    # Assert
+    assert summary["runs"] == 400
+    assert summary["phases"]["event_loop"] == {"total_s": 200.0, "calls": 400, "avg_us": 5e5}
+    assert summary["phases"]["process_queue"]["calls"] == 16_000
+    assert summary["phases"]["process_queue"]["total_s"] == pytest.approx(100.0)
+    assert summary["counters"] == {"bars": 40_000, "events": 16_000}
+    assert summary["bars_per_sec"] == pytest.approx(200.0)
+    assert summary["events_per_sec"] == pytest.approx(80.0)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from app.core.analysis.metrics import trade_aggregates, _metrics_from_aggregates
+from app.core.analysis.rolling import rolling_trade_metrics
+
+
+def _make_trades(n_trades: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Неравномерные интервалы между сделками, чтобы окно по времени содержало разное число сделок
+    exits = pd.Timestamp("2024-01-01", tz="UTC") + pd.to_timedelta(np.cumsum(rng.integers(1, 240, n_trades)), unit="min")
+    return pd.DataFrame({
+        "pnl": rng.normal(20, 300, n_trades),
+        "entry_timestamp_utc": exits - pd.Timedelta(minutes=1),
+        "exit_timestamp_utc": exits,
+    })
+
+
+def test_trade_window_matches_metrics_on_window_slice():
+    """
+    Проверяет, что скользящий Sharpe совпадает с Sharpe калькулятора на срезе сделок окна,
+    а просадка и win rate — с прямым расчетом по окну.
+    """
+    # Arrange
+    trades = _make_trades(400, seed=1)
+    pnl = trades["pnl"].to_numpy()
+    equity = 100_000.0 + np.cumsum(pnl)
+    window = 30
+
+    # Act
+    rolling = rolling_trade_metrics(trades, 100_000.0, window=window, annualization_factor=252)
+
+    # Assert
+    assert rolling["sharpe_ratio"].iloc[:2].isna().all()
+    for i in (2, 29, 30, 123, 399):
+        start = max(0, i - window + 1)
+        capital = 100_000.0 if start == 0 else equity[start - 1]
+        agg = trade_aggregates(pnl[start:i + 1], trades["entry_timestamp_utc"].iloc[start],
+                               trades["exit_timestamp_utc"].iloc[i], capital)
+        expected_sharpe = _metrics_from_aggregates(agg, capital, 252)["sharpe_ratio"]
+        window_equity = equity[start:i + 1]
+        assert np.isclose(rolling["sharpe_ratio"].iloc[i], expected_sharpe, rtol=1e-8)
+        assert np.isclose(rolling["drawdown"].iloc[i], 1 - window_equity[-1] / window_equity.max())
+        assert np.isclose(rolling["win_rate"].iloc[i], (pnl[start:i + 1] > 0).mean())
+        assert rolling["n_trades"].iloc[i] == i - start + 1
+
+
+def test_time_window_matches_pandas_rolling():
+    """Проверяет, что окно по времени совпадает с pandas rolling('1D') по win rate и числу сделок."""
+    # Arrange
+    trades = _make_trades(2000, seed=2)
+    by_exit = trades.set_index("exit_timestamp_utc")["pnl"]
+
+    # Act
+    rolling = rolling_trade_metrics(trades, 50_000.0, window="1D")
+
+    # Assert
+    np.testing.assert_allclose(rolling["win_rate"], (by_exit > 0).astype(float).rolling("1D").mean())
+    np.testing.assert_array_equal(rolling["n_trades"], by_exit.rolling("1D").count().astype(int))
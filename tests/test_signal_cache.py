@@ -0,0 +1,43 @@
+import queue
+
+import pandas as pd
+
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.backtest.loop import BacktestEngine
+from app.core.engine.backtest.signal_cache import SignalCache
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+
+def _run(data, rm_params, tmp_path, signal_cache=None):
+    settings = {
+        "strategy_class": AVAILABLE_STRATEGIES["simple_sma_cross"],
+        "exchange": "bybit", "instrument": "SYN", "interval": "5min",
+        "risk_manager_type": "FIXED", "initial_capital": 100_000.0, "commission_rate": 0.0005,
+        "strategy_params": None, "risk_manager_params": rm_params,
+        "data_slice": data, "data_dir": str(tmp_path), "trade_log_path": None,
+        "signal_cache": signal_cache,
+    }
+    return BacktestEngine(settings, queue.Queue(), FeatureEngine()).run()
+
+
+def test_replayed_signals_give_identical_results(tmp_path):
+    """
+    Проверяет, что trial с другими параметрами риск-менеджера, проигранный по кэшированным
+    сигналам, дает те же сделки, что и полный прогон стратегии.
+    """
+    # Arrange
+    data = generate_ohlcv(n_bars=3000, seed=4, regimes=[1.0, 2.5])
+    cache = SignalCache()
+    _run(data, {"risk_percent_long": 2.0, "risk_percent_short": 2.0, "tp_ratio": 2.0}, tmp_path, cache)
+    rm_params = {"risk_percent_long": 1.0, "risk_percent_short": 1.0, "tp_ratio": 3.0}
+
+    # Act
+    replayed = _run(data, rm_params, tmp_path, cache)
+    reference = _run(data, rm_params, tmp_path)
+
+    # Assert
+    assert cache.hits == 1
+    assert not reference["trades_df"].empty
+    pd.testing.assert_frame_equal(replayed["trades_df"], reference["trades_df"])
+    assert replayed["metrics"] == reference["metrics"]
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from app.core.engine.optimization.splitter import (
+    PeriodSplit, combinatorial_splits, contiguous_segments, cpcv_paths, purged_train_indices,
+    split_data_by_periods, walk_forward_generator
+)
+
+
+def test_period_split_matches_array_split_concat():
+    """
+    Проверяет, что окна PeriodSplit совпадают с прежней схемой
+    (np.array_split + pd.concat периодов), включая неравные по длине периоды.
+    """
+    # Arrange
+    data = pd.DataFrame({"close": np.arange(103, dtype=float), "volume": np.arange(103)})
+    legacy_periods = split_data_by_periods(data, 10)
+
+    # Act
+    periods = PeriodSplit(data, 10)
+
+    # Assert
+    assert len(periods) == 10
+    for start, end in [(0, 4), (4, 5), (6, 10)]:
+        expected = pd.concat(legacy_periods[start:end])
+        pd.testing.assert_frame_equal(periods.slice(start, end), expected)
+
+
+def test_walk_forward_generator_yields_adjacent_windows():
+    """Проверяет, что тестовое окно каждого шага начинается сразу после обучающего."""
+    # Arrange
+    data = pd.DataFrame({"close": np.arange(100, dtype=float)})
+
+    # Act
+    windows = list(walk_forward_generator(PeriodSplit(data, 10), train_periods=3, test_periods=1))
+
+    # Assert
+    assert len(windows) == 7
+    train_df, test_df, step = windows[-1]
+    assert step == 7
+    assert train_df["close"].iloc[0] == 60.0
+    assert test_df["close"].iloc[0] == train_df["close"].iloc[-1] + 1
+
+
+def test_purged_kfold_train_segments_skip_test_and_buffers():
+    """
+    Проверяет, что обучающие отрезки purged k-fold не пересекаются с тестовой группой,
+    не содержат строк очистки и эмбарго и не склеиваются через разрыв.
+    """
+    # Arrange
+    data = pd.DataFrame({"close": np.arange(100, dtype=float)})
+    periods = PeriodSplit(data, 5)
+
+    # Act
+    train_indices = purged_train_indices(periods.bounds, test_groups=[2], purge_bars=3, embargo_bars=2)
+    segments = periods.segments(train_indices)
+
+    # Assert
+    assert [(s["close"].iloc[0], s["close"].iloc[-1]) for s in segments] == [(0.0, 36.0), (62.0, 99.0)]
+    assert contiguous_segments(np.array([0, 1, 2, 5, 6, 9])) == [(0, 3), (5, 7), (9, 10)]
+
+
+def test_cpcv_paths_cover_every_group_once():
+    """Проверяет, что каждый путь CPCV берет каждую группу из разбиения, где она тестовая, и пути различны."""
+    # Act
+    splits = combinatorial_splits(6, 2)
+    paths = cpcv_paths(6, 2)
+
+    # Assert
+    assert len(splits) == 15
+    assert len(paths) == 5
+    for path in paths:
+        assert all(group in splits[split] for group, split in enumerate(path))
+    assert len({tuple(p) for p in paths}) == 5
+    assert cpcv_paths(4, 1) == [[0, 1, 2, 3]]
@@ -0,0 +1,239 @@
+import numpy as np
+import optuna
+import pandas as pd
+import pytest
+
+from app.core.analysis.metrics import PortfolioMetricsCalculator
+from app.core.calculations.indicators import FeatureEngine
+from app.core.engine.optimization import engine as engine_module
+from app.core.engine.optimization.engine import OptimizationEngine
+from app.core.engine.optimization.objective import Objective
+from app.core.engine.optimization.splitter import PeriodSplit, combinatorial_splits, cpcv_paths
+from app.core.engine.optimization.step_runner import WFOStepRunner, select_top_params
+from app.shared.config import config
+from app.strategies import AVAILABLE_STRATEGIES
+from benchmarks.synthetic import generate_ohlcv
+
+PARAMS = {"sma_period": 30, "rm_risk_percent_long": 1.0, "rm_risk_percent_short": 1.0, "rm_tp_ratio": 2.0}
+SETTINGS = {"strategy": "simple_sma_cross", "exchange": "bybit", "interval": "5min", "rm": "FIXED",
+            "metrics": ["sharpe_ratio"], "n_trials": 1, "n_jobs": 1, "show_progress_bar": False}
+
+
+def _objective(data):
+    return Objective(AVAILABLE_STRATEGIES["simple_sma_cross"], "bybit", "5min", "FIXED", {"SYN": data},
+                     ["sharpe_ratio"], FeatureEngine(), precompute_features=False, early_abort={})
+
+
+def test_resumed_study_seeds_cache_only_for_same_window(tmp_path):
+    """
+    Проверяет, что продолженное из хранилища исследование того же окна отдает trials в кэш Objective
+    (повтор не запускает бэктест), а исследование другого окна кэш не заполняет.
+    """
+    # Arrange
+    data = generate_ohlcv(n_bars=3000, seed=3)
+    settings = {**SETTINGS, "study_storage": f"sqlite:///{tmp_path / 'optuna.db'}"}
+    runner = WFOStepRunner(settings, 1, {"SYN": data}, {"SYN": data}, FeatureEngine())
+    first = _objective(data)
+    study = runner._create_study(["maximize"], first)
+    study.enqueue_trial(PARAMS)
+    study.optimize(first, n_trials=1)
+
+    # Act
+    resumed = _objective(data)
+    resumed_study = runner._create_study(["maximize"], resumed)
+    resumed_study.enqueue_trial(PARAMS, skip_if_exists=False)
+    resumed_study.optimize(resumed, n_trials=1)
+    other_window = _objective(data.iloc[500:])
+    runner._create_study(["maximize"], other_window)
+
+    # Assert
+    assert len(resumed_study.trials) == 2
+    assert resumed.cache_hits == 1
+    assert resumed_study.trials[1].value == study.trials[0].value
+    assert other_window._trial_cache == {}
+
+
+def _engine(**settings):
+    return OptimizationEngine({**SETTINGS, "instrument": "SYN", "train_periods": 2, "test_periods": 1,
+                               "warm_start_top_k": 0, **settings}, FeatureEngine())
+
+
+def test_parallel_steps_merge_like_sequential_run():
+    """Проверяет, что параллельные шаги WFO дают те же OOS-сделки и сводки в порядке шагов, что и последовательные."""
+    # Arrange
+    periods = {"SYN": PeriodSplit(generate_ohlcv(n_bars=5000, seed=11), 5)}
+    sequential = _engine(n_trials=3, seed=7, parallel_steps=1, max_workers=1)
+    parallel = _engine(n_trials=3, seed=7, parallel_steps=2, max_workers=2)
+
+    # Act
+    sequential_trades, sequential_steps, _ = sequential._run_steps(periods, 3, {})
+    parallel_trades, parallel_steps, last_study = parallel._run_steps(periods, 3, {})
+
+    # Assert
+    assert [step["step"] for step in parallel_steps] == [1, 2, 3]
+    pd.testing.assert_frame_equal(pd.DataFrame(parallel_steps), pd.DataFrame(sequential_steps))
+    assert len(parallel_trades) == len(sequential_trades) > 0
+    for parallel_df, sequential_df in zip(parallel_trades, sequential_trades):
+        pd.testing.assert_frame_equal(parallel_df, sequential_df)
+    assert len(last_study.trials) == 3
+
+
+@pytest.mark.parametrize("settings, num_steps, expected", [
+    ({"parallel_steps": 1, "max_workers": 0}, 5, (1, -1)),
+    ({"parallel_steps": 1, "max_workers": 6}, 5, (1, 6)),
+    ({"parallel_steps": 2, "max_workers": 8}, 5, (2, 4)),
+    ({"parallel_steps": 8, "max_workers": 4}, 3, (3, 1)),
+    ({"parallel_steps": 4, "max_workers": 0}, 10, (4, 2)),
+    ({"validation_mode": "kfold", "max_workers": 0}, 10, (8, 1)),
+    ({"validation_mode": "cpcv", "max_workers": 0}, 3, (3, 2)),
+    ({"validation_mode": "cpcv", "parallel_steps": 1, "max_workers": 0}, 3, (1, -1)),
+])
+def test_resolve_parallelism_splits_worker_budget(monkeypatch, settings, num_steps, expected):
+    """
+    Проверяет распределение бюджета воркеров между шагами и trials, включая
+    параллельные по умолчанию разбиения CV (по числу ядер).
+    """
+    # Arrange
+    monkeypatch.setattr(engine_module.os, "cpu_count", lambda: 8)
+    engine = _engine(**settings)
+
+    # Act
+    resolved = engine._resolve_parallelism(num_steps)
+
+    # Assert
+    assert resolved == expected
+
+
+def _study_with_values(directions, values):
+    study = optuna.create_study(directions=directions)
+    distribution = optuna.distributions.IntDistribution(10, 100)
+    for period, value in values:
+        study.add_trial(optuna.trial.create_trial(
+            params={"sma_period": period}, distributions={"sma_period": distribution},
+            values=value if isinstance(value, list) else [value]
+        ))
+    return study
+
+
+@pytest.mark.parametrize("direction, expected", [("maximize", [30, 50]), ("minimize", [20, 40])])
+def test_select_top_params_orders_by_direction(direction, expected):
+    """Проверяет, что лучшие trials выбираются с учетом направления оптимизации."""
+    # Arrange
+    study = _study_with_values([direction], [(20, -1.0), (30, 3.0), (40, 0.5), (50, 2.0)])
+
+    # Act
+    top = select_top_params(study, 2)
+
+    # Assert
+    assert top == [{"sma_period": period} for period in expected]
+
+
+def test_select_top_params_returns_pareto_front_for_several_metrics():
+    """Проверяет, что для нескольких метрик возвращаются решения фронта Парето."""
+    # Arrange
+    study = _study_with_values(["maximize", "minimize"],
+                               [(20, [1.0, 0.1]), (30, [2.0, 0.3]), (40, [0.5, 0.5]), (50, [1.5, 0.2])])
+
+    # Act
+    top = select_top_params(study, 10)
+
+    # Assert
+    assert sorted(p["sma_period"] for p in top) == [20, 30, 50]
+    assert select_top_params(study, 0) == []
+
+
+def test_warm_start_enqueues_params_and_overrides_trial_budget():
+    """Проверяет, что шаг с прогревом начинает с переданных наборов и использует бюджет warm_start_n_trials."""
+    # Arrange
+    data = generate_ohlcv(n_bars=3000, seed=3)
+    warm_start = [PARAMS, {**PARAMS, "sma_period": 45}]
+    settings = {**SETTINGS, "n_trials": 10, "warm_start_n_trials": 3}
+    runner = WFOStepRunner(settings, 2, {"SYN": data}, {"SYN": data}, FeatureEngine(),
+                           warm_start_params=warm_start)
+
+    # Act
+    study = runner._run_in_sample_optimization()
+
+    # Assert
+    assert len(study.trials) == 3
+    assert [t.params for t in study.trials[:2]] == warm_start
+
+
+@pytest.mark.parametrize("validation_mode, expected", [("wfo", [[], [PARAMS], [PARAMS]]), ("cpcv", [[], [], []])])
+def test_sequential_cv_disables_warm_start(monkeypatch, validation_mode, expected):
+    """
+    Проверяет, что в последовательном режиме прогрев передает параметры следующему шагу WFO,
+    но не передает их между разбиениями CV, где обучение одного разбиения видит тест другого.
+    """
+    # Arrange
+    received = []
+
+    class _RecordingRunner:
+        def __init__(self, settings, step_num, feature_engine=None, warm_start_params=None, **inputs):
+            received.append(list(warm_start_params))
+
+        def run(self):
+            return pd.DataFrame(), {}, optuna.create_study()
+
+    monkeypatch.setattr(engine_module, "WFOStepRunner", _RecordingRunner)
+    monkeypatch.setattr(engine_module, "select_top_params", lambda study, top_k: [PARAMS][:top_k])
+    engine = _engine(validation_mode=validation_mode, cv_test_groups=2, warm_start_top_k=1,
+                     parallel_steps=1, max_workers=1)
+    periods = {"SYN": PeriodSplit(generate_ohlcv(n_bars=2000, seed=4), 5)}
+
+    # Act
+    engine._run_steps(periods, 3, {})
+
+    # Assert
+    assert received == expected
+
+
+def _cv_split_trades(n_groups, n_test_groups, trades_per_group=6):
+    """Заглушки OOS-сделок разбиений CPCV: у каждого разбиения свои сделки во времени своих тестовых групп."""
+    rng = np.random.default_rng(8)
+    start = pd.Timestamp("2024-01-01", tz="UTC")
+    split_trades = []
+    for split_num, test_groups in enumerate(combinatorial_splits(n_groups, n_test_groups), start=1):
+        frames = []
+        for segment, group in enumerate(test_groups):
+            entry = start + pd.Timedelta(days=10 * group) + pd.to_timedelta(np.arange(trades_per_group), unit="h")
+            frames.append(pd.DataFrame({
+                "pnl": rng.normal(50.0, 400.0, trades_per_group),
+                "entry_timestamp_utc": entry,
+                "exit_timestamp_utc": entry + pd.Timedelta(minutes=30),
+                "oos_split": split_num,
+                "oos_segment": segment,
+            }))
+        split_trades.append(pd.concat(frames, ignore_index=True))
+    return split_trades
+
+
+def test_cv_paths_take_each_group_from_its_split():
+    """
+    Проверяет, что каждый OOS-путь CPCV берет сделки группы из разбиения, заданного `cpcv_paths`,
+    а метрики путей совпадают с PortfolioMetricsCalculator по сделкам пути.
+    """
+    # Arrange
+    n_groups, n_test_groups = 5, 2
+    split_trades = _cv_split_trades(n_groups, n_test_groups)
+    splits = combinatorial_splits(n_groups, n_test_groups)
+    paths = cpcv_paths(n_groups, n_test_groups)
+    engine = _engine(validation_mode="cpcv", cv_test_groups=n_test_groups)
+    capital = config.BACKTEST_CONFIG["INITIAL_CAPITAL"]
+    factor = config.EXCHANGE_SPECIFIC_CONFIG["bybit"]["SHARPE_ANNUALIZATION_FACTOR"]
+
+    # Act
+    first_path = engine._assemble_cv_paths(split_trades, n_groups)
+
+    # Assert
+    assert [frame["oos_group"].unique().tolist() for frame in first_path] == [[g] for g in range(n_groups)]
+    assert [frame["oos_split"].unique().tolist() for frame in first_path] == [[s + 1] for s in paths[0]]
+    assert list(engine.path_metrics.index) == list(range(len(paths)))
+    for path, path_splits in enumerate(paths):
+        expected_trades = pd.concat([
+            split_trades[split][split_trades[split]["oos_segment"] == splits[split].index(group)]
+            for group, split in enumerate(path_splits)
+        ], ignore_index=True).sort_values("exit_timestamp_utc", kind="stable")
+        expected = PortfolioMetricsCalculator(expected_trades, capital, factor).calculate_all()
+        for key, value in expected.items():
+            assert engine.path_metrics.loc[path, key] == pytest.approx(value, rel=1e-9), (path, key)